@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class AdminAccountConfig(AppConfig):
     name = 'account'
+
+    def ready(self):
+        from .permissions import connect_signals
+        connect_signals()
@@ -1,5 +1,4 @@
 import uuid
-from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth.models import (
     AbstractBaseUser,
     BaseUserManager,
@@ -24,6 +23,7 @@ from core.models import (
     ExportModel
 )
 from refs.models import Country
+from .permissions import get_snapshot
 
 PERMISSIONS_FOR = [UserType.ADMIN.value]
 
@@ -101,54 +101,18 @@ class User(PermissionsMixin, AbstractBaseUser):
                 'impersonate_users', pgettext_lazy(
                     'Permission description', 'Impersonate customers.')))
 
+    def get_permission_snapshot(self):
+        """Groups and roles of the user, computed once per request"""
+        return get_snapshot(self)
+
     def has_role(self, roles, user_status=Status.ACTIVE.value):
-        for role in roles:
-            try:
-                user_role = self.roles.get(user_type=role)
-                if user_role:
-                    status = ''
-                    role_model = self.get_role_model(role)
-                    if role_model:
-                        if hasattr(role_model, 'status'):
-                            status = role_model.status
-                    if user_status:
-                        if status == Status.ACTIVE.value:
-                            return True
-                    else:
-                        return True
-            except ObjectDoesNotExist:
-                pass
-        return False;
+        return self.get_permission_snapshot().has_role(roles, user_status)
 
     def has_super_perms(self, perm):
-        exist = False
-        for role in self.roles.all().values_list('user_type', flat=True):
-            is_super = False
-            role_model = self.get_role_model(role)
-            if role_model:
-                if hasattr(role_model, 'is_super'):
-                    is_super = role_model.is_super
-            if is_super:
-                if isinstance(perm, list):
-                    for per in perm:
-                        group = Group.objects.get(name=per)
-                        exist = UserTypeGroup.objects.filter(user_type=role, group=group.id).exists()
-                        if exist:
-                            return exist
-                else:
-                    group = Group.objects.get(name=perm)
-                    exist = UserTypeGroup.objects.filter(user_type=role, group=group.id).exists()
-                    if exist:
-                        return exist
-        return exist
+        return self.get_permission_snapshot().has_super_perms(perm)
 
     def has_permission(self, perm):
-        if isinstance(perm, list):
-            return self.groups.filter(name__in=perm).exists() or (Group.objects.filter(name__in=perm).exists()
-                                                       and self.has_super_perms(perm))
-
-        return self.groups.filter(name=perm).exists() or (Group.objects.filter(name=perm).exists()
-                                                              and self.has_super_perms( perm))
+        return self.get_permission_snapshot().has_permission(perm)
 
     def get_role_model(self, role):
         model = None
@@ -10,6 +10,7 @@ from graphql_jwt import ObtainJSONWebToken
 from graphql_jwt.exceptions import JSONWebTokenError
 import graphene
 
+from core.utils.codes import CodeAllocator
 from core.utils.decorators import (
     permission_required,
     role_required
@@ -24,6 +25,8 @@ from . import models
 
 USER_TYPE_ADMIN = UserType.ADMIN.value
 
+user_codes = CodeAllocator('US', 'account.User', start=1001)
+
 class UserInput(graphene.InputObjectType):
     email = graphene.String(description='Email id  of a user')
     mobile = graphene.String(required=True, description='User mobile.')
@@ -50,22 +53,13 @@ class UserMixin:
         if instance.pk:
             code = instance.code
         else:
-            user = models.User.objects.last()
-            if user:
-                code = user.code
-                if 'US' in code:
-                    code = int(code.split('US')[1])
-                    code = code + 1
-                    code = 'US' + str(code)
-                else:
-                    code_int = user.id + 1001
-                    code = 'US'+str(code_int)
-                    if not code:
-                        cls.add_error(
-                            errors, 'code',
-                            'User code could not generate.')
-            else:
-                code = 'US1001'
+            try:
+                code = user_codes.next()
+            except DBError:
+                code = None
+                cls.add_error(
+                    errors, 'code',
+                    'User code could not generate.')
         if code_only:
             return code
         cleaned_input['code'] = code
@@ -0,0 +1,168 @@
+from django.core.exceptions import ObjectDoesNotExist
+
+from core.enums.enum import Status
+from core.utils.memcached import client, get_version, reset_version
+
+TIMEOUT = 1800
+GLOBAL_VERSION_KEY = 'permissions_version'
+USER_VERSION_KEY = 'permissions_version_%s'
+SNAPSHOT_KEY = 'permissions_%s_%s_%s'
+ROLE_MODEL_NAMES = (
+    'admin_user', 'store_user', 'sponsor_user', 'customer', 'delivery_boy', 'developer')
+
+
+class PermissionSnapshot:
+    """Immutable view of the groups and roles of a user.
+    `groups` holds the group names of the user, `super_groups` the groups
+    granted to its super roles and `roles` maps each role to the status of
+    its role model."""
+    __slots__ = ('groups', 'super_groups', 'roles')
+
+    def __init__(self, groups, super_groups, roles):
+        object.__setattr__(self, 'groups', frozenset(groups))
+        object.__setattr__(self, 'super_groups', frozenset(super_groups))
+        object.__setattr__(self, 'roles', tuple(sorted(roles.items())))
+
+    def __setattr__(self, name, value):
+        raise AttributeError('Permission snapshots are immutable')
+
+    def has_permission(self, perm):
+        return self.has_group_permission(perm) or self.has_super_perms(perm)
+
+    def has_group_permission(self, perm):
+        perms = perm if isinstance(perm, list) else [perm]
+        return not self.groups.isdisjoint(perms)
+
+    def has_super_perms(self, perm):
+        perms = perm if isinstance(perm, list) else [perm]
+        return not self.super_groups.isdisjoint(perms)
+
+    def has_role(self, roles, user_status=Status.ACTIVE.value):
+        statuses = dict(self.roles)
+        for role in roles:
+            if role not in statuses:
+                continue
+            if not user_status or statuses[role] == Status.ACTIVE.value:
+                return True
+        return False
+
+    def to_dict(self):
+        return {
+            'groups': sorted(self.groups),
+            'super_groups': sorted(self.super_groups),
+            'roles': dict(self.roles)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data['groups'], data['super_groups'], data['roles'])
+
+
+def build_snapshot(user):
+    from .models import UserTypeGroup
+
+    groups = set(user.groups.values_list('name', flat=True))
+    roles = {}
+    super_roles = []
+    for role in user.roles.values_list('user_type', flat=True):
+        try:
+            role_model = user.get_role_model(role)
+        except ObjectDoesNotExist:
+            continue
+        roles[role] = getattr(role_model, 'status', '')
+        if getattr(role_model, 'is_super', False):
+            super_roles.append(role)
+    super_groups = []
+    if super_roles:
+        super_groups = UserTypeGroup.objects.filter(
+            user_type__in=super_roles).values_list('group__name', flat=True)
+    return PermissionSnapshot(groups, super_groups, roles)
+
+
+def get_snapshot(user):
+    """Return the permission snapshot of a user.
+    The snapshot is kept on the user instance for the rest of the request and
+    in memcached under the current global and user versions, bumping either
+    version makes every cached snapshot it covers unreachable."""
+    snapshot = getattr(user, '_permission_snapshot', None)
+    if snapshot is not None:
+        return snapshot
+
+    user_version_key = USER_VERSION_KEY % user.pk
+    versions = client.get_many([GLOBAL_VERSION_KEY, user_version_key])
+    key = SNAPSHOT_KEY % (
+        user.pk,
+        get_version(GLOBAL_VERSION_KEY, versions),
+        get_version(user_version_key, versions))
+
+    data = client.get(key)
+    if data is not None:
+        snapshot = PermissionSnapshot.from_dict(data)
+    else:
+        snapshot = build_snapshot(user)
+        client.set(key, snapshot.to_dict(), TIMEOUT)
+    user._permission_snapshot = snapshot
+    return snapshot
+
+
+def invalidate_user(user_id):
+    reset_version(USER_VERSION_KEY % user_id)
+
+
+def invalidate_all():
+    reset_version(GLOBAL_VERSION_KEY)
+
+
+def invalidate_user_instance(sender, instance, **kwargs):
+    """Signal receiver for models with a `user` relation, like roles"""
+    user_id = getattr(instance, 'user_id', None)
+    if user_id:
+        invalidate_user(user_id)
+
+
+def invalidate_users_receiver(sender, pks=None, **kwargs):
+    """status_changed receiver for role models changed with one UPDATE"""
+    user_ids = sender._base_manager.filter(pk__in=pks or []).values_list('user_id', flat=True)
+    for user_id in set(user_ids):
+        invalidate_user(user_id)
+
+
+def invalidate_user_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    if not action.startswith('post_'):
+        return
+    if reverse:
+        # Users were added to or removed from a group
+        if pk_set is None:
+            invalidate_all()
+            return
+        for user_id in pk_set:
+            invalidate_user(user_id)
+    else:
+        invalidate_user(instance.pk)
+
+
+def invalidate_all_receiver(sender, **kwargs):
+    invalidate_all()
+
+
+def connect_signals():
+    from django.contrib.auth.models import Group
+    from django.db.models.signals import m2m_changed, post_delete, post_save
+
+    from core.models import status_changed
+    from .models import User, UserRole, UserTypeGroup
+
+    m2m_changed.connect(invalidate_user_groups, sender=User.groups.through)
+    for model in (Group, UserTypeGroup):
+        post_save.connect(invalidate_all_receiver, sender=model)
+        post_delete.connect(invalidate_all_receiver, sender=model)
+        status_changed.connect(invalidate_all_receiver, sender=model)
+
+    role_models = [UserRole] + [
+        relation.related_model for relation in User._meta.related_objects
+        if relation.one_to_one and relation.get_accessor_name() in ROLE_MODEL_NAMES
+    ]
+    for model in role_models:
+        post_save.connect(invalidate_user_instance, sender=model)
+        post_delete.connect(invalidate_user_instance, sender=model)
+        status_changed.connect(invalidate_users_receiver, sender=model)
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import pre_migrate
 from core.utils import add_history_ip_address
 from simple_history.tests.models import HistoricalPollWithExtraFields
 from simple_history.signals import (
@@ -11,6 +12,15 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
+        from core.models import status_changed
+        from core.utils.db_search import create_trigram_extension
+        from core.utils.documents import is_autosync_enabled, update_documents_receiver
+
+        pre_migrate.connect(create_trigram_extension, sender=self)
+
+        if is_autosync_enabled():
+            status_changed.connect(update_documents_receiver)
+
         pre_create_historical_record.connect(
             add_history_ip_address,
             sender=HistoricalPollWithExtraFields
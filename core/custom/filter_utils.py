@@ -1,6 +1,10 @@
+from core.utils.db_search import is_searchable, search_queryset
 from core.utils.utils import get_nodes
 
 from products import types as product_types
+from products.models import ProductBrandRelation, ProductCategoryRelation
+from products.utils.category_tree import get_category_tree
+from core.utils.cache_query import categories_cache
 from store_products import types as store_product_types
 from search.backend.search import (
     search_categories,
@@ -10,6 +14,8 @@ from search.backend.search import (
 
 def template_filter_search(qs, _, value):
     """Search a product template"""
+    if value and is_searchable(qs.model):
+        return search_queryset(qs, value, rank=False)
     # if value:
     #     products = seach_templates(value)
     #     qs &= products.distinct()
@@ -17,6 +23,8 @@ def template_filter_search(qs, _, value):
 
 def master_filter_search(qs, _, value):
     """Search a product master"""
+    if value and is_searchable(qs.model):
+        return search_queryset(qs, value, rank=False)
     # if value:
     #     products = search_masters(value)
     #     qs &= products.distinct()
@@ -24,6 +32,8 @@ def master_filter_search(qs, _, value):
 
 def category_filter_search(qs, _, value):
     """Search a category"""
+    if value and is_searchable(qs.model):
+        return search_queryset(qs, value, rank=False)
     if value:
         categories = search_categories(value)
         if isinstance(categories, tuple):
@@ -33,6 +43,8 @@ def category_filter_search(qs, _, value):
 
 def brand_filter_search(qs, _, value):
     """Search a brand"""
+    if value and is_searchable(qs.model):
+        return search_queryset(qs, value, rank=False)
     if value:
         brands = search_brands(value)
         if isinstance(brands, tuple):
@@ -42,6 +54,8 @@ def brand_filter_search(qs, _, value):
 
 def departments_filter_search(qs, _, value):
     """Search a department"""
+    if value and is_searchable(qs.model):
+        return search_queryset(qs, value, rank=False)
     if value:
         departments = search_departments(value)
         if isinstance(departments, tuple):
@@ -50,40 +64,51 @@ def departments_filter_search(qs, _, value):
     return qs
 
 
+def get_template_ids_query(value, relation_model, lookup, get_ids):
+    """Subquery of the templates related to the given global ids, so the
+    filtered rows are not repeated once per matching relation"""
+    ids = get_ids(value)
+    return relation_model.objects.filter(
+        **{lookup: ids}).values('product_template_id')
+
 def template_filter_by_categories(qs, _ , value):
     """Filter product template by list of categories"""
-    ids = get_category_ids(value)
-    qs = qs.filter(categories__category__id__in=ids)
+    if value:
+        qs = qs.filter(id__in=get_template_ids_query(
+            value, ProductCategoryRelation, 'category_id__in', get_category_ids))
     return qs
 
 def template_filter_by_brands(qs, _, value):
     """Filter product template by list of brands"""
-    ids = get_brand_ids(value)
-    qs = qs.filter(brands__brand__id__in=ids)
+    if value:
+        qs = qs.filter(id__in=get_template_ids_query(
+            value, ProductBrandRelation, 'brand_id__in', get_brand_ids))
     return qs
 
 def template_filter_by_departments(qs, _, value):
     """Filter product template by list of departments"""
-    ids = get_department_ids(value)
-    qs = qs.filter(categories__category__department__id__in=ids)
+    if value:
+        qs = qs.filter(id__in=get_template_ids_query(
+            value, ProductCategoryRelation, 'category__department_id__in', get_department_ids))
     return qs
 
 def master_filter_by_categories(qs, _, value):
-    """Filter product master by list of categories"""
-    ids = get_category_ids(value)
-    qs = qs.filter(product_template__categories__category__id__in=ids)
+    """Filter product master by list of categories, on the id arrays of
+    the master listing rows"""
+    if value:
+        qs = qs.filter(listing__category_ids__overlap=get_category_ids(value))
     return qs
 
 def master_filter_by_brands(qs, _, value):
     """Filter product master by list of brands"""
-    ids = get_brand_ids(value)
-    qs = qs.filter(product_template__brands__brand__id__in=ids)
+    if value:
+        qs = qs.filter(listing__brand_ids__overlap=get_brand_ids(value))
     return qs
 
-def master_filter_by_departments(qs, value):
+def master_filter_by_departments(qs, _, value):
     """Filter product master by list of departments"""
-    ids = get_department_ids(value)
-    qs = qs.filter(product_template__departments__department__id__in=ids)
+    if value:
+        qs = qs.filter(listing__department_ids__overlap=get_department_ids(value))
     return qs
 
 
@@ -94,10 +119,14 @@ def get_category_ids(value):
     if not value:
         return []
     categories = get_nodes(value, product_types.Category)
-    categories = [
-        category.get_descendants(include_self=True) for category in categories
-    ]
-    ids = [category.id for tree in categories for category in tree]
+    tree = get_category_tree()
+    ids = []
+    for category in categories:
+        if category.id in tree:
+            ids.extend(tree.get_descendants(category.id))
+        else:
+            # Created after the index was loaded
+            ids.extend(categories_cache(category))
     return ids
 
 def get_department_ids(value):
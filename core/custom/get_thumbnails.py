@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import re
 import warnings
@@ -6,6 +7,11 @@ from django import template
 from django.conf import settings
 from django.templatetags.static import static
 
+from core.tasks import warm_thumbnails
+from core.utils.memcached import client
+from .thumbnails import can_warm
+from .renditions import PENDING_KEY, PENDING_TIMEOUT, get_rendition_url
+
 logger = logging.getLogger(__name__)
 register = template.Library()
 
@@ -53,12 +59,13 @@ def get_available_sizes_by_method(method, rendition_key_set):
     return sizes
 
 
-def get_thumbnail_size(size, method, rendition_key_set):
+def get_thumbnail_size(size, method, rendition_key_set, on_demand=None):
     """ Return closest larger size if not more than 2 times larger, otherwise
     return closest smaller size
     """
-    on_demand = settings.VERSATILEIMAGEFIELD_SETTINGS[
-        'create_images_on_demand']
+    if on_demand is None:
+        on_demand = settings.VERSATILEIMAGEFIELD_SETTINGS[
+            'create_images_on_demand']
     if isinstance(size, int):
         size_str = '%sx%s' % (size, size)
     else:
@@ -82,18 +89,55 @@ def get_thumbnail_size(size, method, rendition_key_set):
     return None
 
 
+def request_warmup(image_file):
+    """Queue the renditions of a file missing from the manifest, at most
+    once per PENDING_TIMEOUT across processes"""
+    instance = getattr(image_file, 'instance', None)
+    field = getattr(image_file, 'field', None)
+    if instance is None or field is None or not can_warm():
+        return
+    key = PENDING_KEY % hashlib.sha1(image_file.name.encode('utf-8')).hexdigest()
+    if client.add(key, 1, PENDING_TIMEOUT, noreply=False):
+        warm_thumbnails.delay([(instance._meta.label, field.attname, image_file.name)])
+
+
+def get_stored_thumbnail(image_file, size, method, rendition_key_set):
+    """URL of a rendition from versatileimagefield, which creates it when
+    images are created on demand"""
+    used_size = get_thumbnail_size(size, method, rendition_key_set)
+    try:
+        thumbnail = getattr(image_file, method)[used_size]
+    except Exception:
+        logger.exception(
+            'Thumbnail fetch failed',
+            extra={'image_file': image_file, 'size': size})
+        return None
+    return thumbnail.url
+
+
 @register.simple_tag()
 def get_thumbnail(image_file, size, method, rendition_key_set='products'):
+    """URL of a rendition from the manifest written by the thumbnail warmer,
+    storage is never accessed. Renditions not created yet are queued and
+    the placeholder is returned meanwhile. Without a broker nothing warms
+    them, so they are read through versatileimagefield instead."""
     if image_file:
-        used_size = get_thumbnail_size(size, method, rendition_key_set)
-        try:
-            thumbnail = getattr(image_file, method)[used_size]
-        except Exception:
-            logger.exception(
-                'Thumbnail fetch failed',
-                extra={'image_file': image_file, 'size': size})
-        else:
-            return thumbnail.url
+        used_size = get_thumbnail_size(size, method, rendition_key_set, on_demand=False)
+        if used_size:
+            url = get_rendition_url(image_file.name, '%s__%s' % (method, used_size))
+            if url is not None:
+                return url
+        if not can_warm():
+            url = get_stored_thumbnail(image_file, size, method, rendition_key_set)
+            if url is not None:
+                return url
+        elif used_size:
+            try:
+                request_warmup(image_file)
+            except Exception:
+                logger.exception(
+                    'Thumbnail warm up failed',
+                    extra={'image_file': image_file, 'size': size})
     return static(choose_placeholder('%sx%s' % (size, size)))
 
 
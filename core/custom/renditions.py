@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from core.utils.memcached import client
+
+MANIFEST_KEY = 'rendition_%s'
+PENDING_KEY = 'rendition_pending_%s'
+TIMEOUT = 60 * 60 * 24 * 30
+# Seconds before a missing rendition may be queued again
+PENDING_TIMEOUT = 300
+LOCAL_SIZE = 20000
+
+
+def get_size_name(method, width, height):
+    return '%s__%sx%s' % (method, width, height)
+
+
+def get_manifest_key(name, size_name):
+    """Memcached key of a rendition, file names may not be valid keys"""
+    digest = hashlib.sha1(('%s|%s' % (name, size_name)).encode('utf-8')).hexdigest()
+    return MANIFEST_KEY % digest
+
+
+class LocalManifest:
+    """Least recently used rendition URLs of this process"""
+
+    def __init__(self, size=LOCAL_SIZE):
+        self.size = size
+        self.urls = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            url = self.urls.get(key)
+            if url is not None:
+                self.urls.move_to_end(key)
+            return url
+
+    def set_many(self, urls):
+        with self.lock:
+            for key, url in urls.items():
+                self.urls[key] = url
+                self.urls.move_to_end(key)
+            while len(self.urls) > self.size:
+                self.urls.popitem(last=False)
+
+
+local_manifest = LocalManifest()
+
+
+def get_rendition_url(name, size_name):
+    """URL of a created rendition from the manifest, None when the warmer
+    has not recorded it yet"""
+    key = get_manifest_key(name, size_name)
+    url = local_manifest.get(key)
+    if url is None:
+        url = client.get(key)
+        if url is None:
+            return None
+        if isinstance(url, bytes):
+            url = url.decode('utf-8')
+        local_manifest.set_many({key: url})
+    return url
+
+
+def set_rendition_urls(renditions):
+    """Record {(name, size name): url} of created renditions"""
+    urls = {
+        get_manifest_key(name, size_name): url
+        for (name, size_name), url in renditions.items()
+    }
+    if urls:
+        client.set_many(urls, TIMEOUT)
+        local_manifest.set_many(urls)
+
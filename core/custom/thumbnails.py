@@ -0,0 +1,146 @@
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from versatileimagefield.utils import get_resized_path
+
+from .renditions import get_size_name, set_rendition_urls
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 4
+
+
+def get_field_key_set(image_attr):
+    return settings.THUMBNAIL_FIELD_KEY_SETS.get(image_attr)
+
+
+def can_warm():
+    """Without a broker celery runs tasks inline, warming there would block
+    the request, the warm_thumbnails command creates the renditions instead"""
+    return not getattr(settings, 'CELERY_TASK_ALWAYS_EAGER', False)
+
+
+def get_rendition_sizes(key_set):
+    """Distinct (sizer, width, height) of a rendition key set"""
+    sizes = set()
+    for _, rendition in settings.VERSATILEIMAGEFIELD_RENDITION_KEY_SETS[key_set]:
+        method, size = rendition.split('__')
+        width, height = size.split('x')
+        sizes.add((method, int(width), int(height)))
+    # Largest first, every size is resized from the decoded source
+    return sorted(sizes, key=lambda size: (size[0], -size[1] * size[2]))
+
+
+def warm_file(model_label, image_attr, name, sizes):
+    """Create the missing renditions of one stored image, decoding the
+    source once for all sizes. Runs in pool workers, the field file is bound
+    to an unsaved instance so no query is needed.
+    Returns the URLs of the renditions available for the manifest."""
+    model = apps.get_model(model_label)
+    instance = model()
+    setattr(instance, image_attr, name)
+    field_file = getattr(instance, image_attr)
+    storage = field_file.storage
+
+    created, failed, renditions = 0, [], {}
+    source = None
+    for method, width, height in sizes:
+        try:
+            sizer = getattr(field_file, method)
+            path = get_resized_path(
+                path_to_image=name, width=width, height=height,
+                filename_key=sizer.get_filename_key(), storage=storage)
+            if storage.exists(path):
+                renditions[(name, get_size_name(method, width, height))] = storage.url(path)
+                continue
+            if source is None:
+                image, file_ext, image_format, mime_type = sizer.retrieve_image(name)
+                image, save_kwargs = sizer.preprocess(image, image_format)
+                source = image, file_ext, image_format, mime_type, save_kwargs
+            image, file_ext, image_format, mime_type, save_kwargs = source
+            imagefile = sizer.process_image(
+                image.copy(), image_format, save_kwargs, width, height)
+            sizer.save_image(imagefile, path, file_ext, mime_type)
+            renditions[(name, get_size_name(method, width, height))] = storage.url(path)
+            created += 1
+        except Exception:
+            logger.exception('Failed to create rendition of %s', name)
+            failed.append('%s %sx%s' % (name, width, height))
+    return created, failed, renditions
+
+
+class ThumbnailWarmer:
+    """Collects images of any model and creates the renditions of the key
+    set of their field in a batch. The same file requested several times, or
+    by several rows, is processed once. Batches run in a process pool unless the current process can not
+    have children, celery prefork workers are daemonic."""
+
+    def __init__(self, workers=DEFAULT_WORKERS):
+        self.workers = workers
+        self.pending = {}
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add_file(self, model_label, image_attr, name):
+        if name and name not in self.pending and get_field_key_set(image_attr):
+            self.pending[name] = (model_label, image_attr)
+
+    def add(self, instance, *image_attrs):
+        for image_attr in image_attrs:
+            image = getattr(instance, image_attr)
+            if image:
+                self.add_file(instance._meta.label, image_attr, image.name)
+
+    def add_queryset(self, queryset, image_attr):
+        if not get_field_key_set(image_attr):
+            return
+        names = queryset.exclude(**{image_attr: ''}).exclude(
+            **{'%s__isnull' % image_attr: True}).values_list(image_attr, flat=True).distinct()
+        for name in names.iterator():
+            self.add_file(queryset.model._meta.label, image_attr, name)
+
+    def use_pool(self):
+        return (
+            self.workers > 1 and len(self.pending) > 1
+            and not multiprocessing.current_process().daemon)
+
+    def warm(self):
+        """Process the pending images and record their renditions in the
+        manifest, returns the number created and the ones which failed"""
+        jobs = [
+            (model_label, image_attr, name, get_rendition_sizes(get_field_key_set(image_attr)))
+            for name, (model_label, image_attr) in self.pending.items()
+        ]
+        self.pending = {}
+        created, failed, renditions = 0, [], {}
+        if not jobs:
+            return created, failed
+
+        if self.use_pool():
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=self.workers) as executor:
+                results = executor.map(warm_file, *zip(*jobs), chunksize=8)
+                for job_created, job_failed, job_renditions in results:
+                    created += job_created
+                    failed.extend(job_failed)
+                    renditions.update(job_renditions)
+        else:
+            for job in jobs:
+                job_created, job_failed, job_renditions = warm_file(*job)
+                created += job_created
+                failed.extend(job_failed)
+                renditions.update(job_renditions)
+
+        set_rendition_urls(renditions)
+
+        if created:
+            logger.info('Created %d thumbnails', created)
+        if failed:
+            logger.error('Failed to generate thumbnails', extra={'paths': failed})
+        return created, failed
@@ -1,28 +1,162 @@
+from django.apps import apps
+from django.conf import settings
+from django.db import models
+from django.db.models.signals import post_delete, post_save
 from django.utils.translation import get_language
 
+from core.utils.dataloaders import DataLoader
+from core.utils.memcached import client
+
+TIMEOUT = 1800
+TRANSLATION_KEY = 'translation_%s_%s_%s'
+
+
+def get_translation_relation(model):
+    """Reverse `translations` relation of a model, None when it has none"""
+    for relation in model._meta.related_objects:
+        if relation.get_accessor_name() == 'translations':
+            return relation
+    return None
+
+
+def get_translated_fields(relation):
+    """Text fields of a translation model, the ones a bundle holds"""
+    return [
+        field.attname for field in relation.related_model._meta.concrete_fields
+        if isinstance(field, (models.CharField, models.TextField))
+        and field.attname != 'language_code'
+    ]
+
+
+def get_cache_key(model, pk, locale):
+    return TRANSLATION_KEY % (model._meta.label_lower, pk, locale)
+
+
+def is_default_locale(locale):
+    return not locale or locale == settings.LANGUAGE_CODE
+
+
+def prefetch_translations(instances, locale=None):
+    """Attach the translated fields of `instances` in `locale` to them.
+    Bundles come from memcached, the missing ones from a single query
+    filtered on `language_code`. Instances without a translation get an
+    empty bundle, which is cached too."""
+    locale = locale or get_language()
+    by_model = {}
+    for instance in instances:
+        if instance is None or locale in getattr(instance, '_translations', {}):
+            continue
+        by_model.setdefault(instance._meta.concrete_model, []).append(instance)
+
+    for model, model_instances in by_model.items():
+        relation = get_translation_relation(model)
+        if relation is None:
+            for instance in model_instances:
+                set_bundle(instance, locale, {})
+            continue
+
+        keys = {}
+        for instance in model_instances:
+            keys.setdefault(get_cache_key(model, instance.pk, locale), []).append(instance)
+        cached = client.get_many(list(keys))
+        missing = {}
+        for key, key_instances in keys.items():
+            if key in cached:
+                for instance in key_instances:
+                    set_bundle(instance, locale, cached[key])
+            else:
+                missing[key_instances[0].pk] = key_instances
+        if not missing:
+            continue
+
+        parent = relation.field.attname
+        rows = relation.related_model.objects.filter(**{
+            '%s__in' % parent: list(missing), 'language_code': locale
+        }).values(parent, *get_translated_fields(relation))
+        bundles = {pk: {} for pk in missing}
+        for row in rows:
+            bundles[row.pop(parent)] = row
+        client.set_many({
+            get_cache_key(model, pk, locale): bundle for pk, bundle in bundles.items()
+        }, TIMEOUT)
+        for pk, bundle in bundles.items():
+            for instance in missing[pk]:
+                set_bundle(instance, locale, bundle)
+    return instances
+
+
+def set_bundle(instance, locale, bundle):
+    if not hasattr(instance, '_translations'):
+        instance._translations = {}
+    instance._translations[locale] = bundle
+
+
+def get_bundle(instance, locale):
+    if locale not in getattr(instance, '_translations', {}):
+        prefetch_translations([instance], locale)
+    return instance._translations[locale]
+
+
+class TranslationLoader(DataLoader):
+    """Translation bundles of model instances in the active language,
+    batched over every instance a request resolves"""
+    context_key = 'translations'
+
+    def batch_load(self, keys):
+        locale = get_language()
+        prefetch_translations(keys, locale)
+        return [instance._translations[locale] for instance in keys]
+
+
+def translate(info, instance, field, default=None):
+    """Value of `field` in the active language, `default` or the value of
+    the instance when there is no translation"""
+    if default is None:
+        default = getattr(instance, field)
+    if is_default_locale(get_language()):
+        return default
+    return TranslationLoader(info.context).load(instance).then(
+        lambda bundle: bundle.get(field) or default)
+
 
 class TranslationWrapper:
     def __init__(self, instance, locale):
         self.instance = instance
-        self.translation = next((
-            t for t in instance.translations.all()
-            if t.lng == locale), None)
+        self.translation = get_bundle(instance, locale)
 
     def __getattr__(self, item):
-        if all([
-                item not in ['id', 'pk'],
-                self.translation is not None,
-                hasattr(self.translation, item)]):
-            return getattr(self.translation, item)
+        if item not in ['id', 'pk'] and self.translation.get(item):
+            return self.translation[item]
         return getattr(self.instance, item)
 
     def __str__(self):
-        instance = self.translation or self.instance
-        return str(instance)
+        return self.translation.get('name') or str(self.instance)
 
 
 class TranslationProxy:
 
     def __get__(self, instance, owner):
         locale = get_language()
-        return TranslationWrapper(instance, locale)
\ No newline at end of file
+        return TranslationWrapper(instance, locale)
+
+
+def invalidate_translation(sender, instance, **kwargs):
+    relation = _relations.get(sender)
+    if relation is None:
+        return
+    client.delete(get_cache_key(
+        relation.model, getattr(instance, relation.field.attname), instance.language_code))
+
+
+_relations = {}
+
+
+def connect_signals():
+    """Drop cached bundles when a translation row changes"""
+    for model in apps.get_models():
+        relation = get_translation_relation(model)
+        if relation is None:
+            continue
+        _relations[relation.related_model] = relation
+        post_save.connect(invalidate_translation, sender=relation.related_model)
+        post_delete.connect(invalidate_translation, sender=relation.related_model)
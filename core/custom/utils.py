@@ -2,12 +2,15 @@ from datetime import timedelta, date, datetime
 from django.utils import timezone
 import logging
 import calendar
-from versatileimagefield.image_warmer import VersatileImageFieldWarmer
 from simple_history.models import HistoricalRecords
 
+from .thumbnails import ThumbnailWarmer
+
 logger = logging.getLogger(__name__)
 
 def create_thumbnails(pk, model, size_set, image_attr=None):
+    """Create every rendition of an image field of a row, `size_set` is
+    kept for queued tasks, all rendition key set sizes are created"""
     instance = model.objects.get(pk=pk)
     if not image_attr:
         image_attr = 'image'
@@ -16,18 +19,10 @@ def create_thumbnails(pk, model, size_set, image_attr=None):
     if image_instance.name == '':
         # There is no file, skip processing
         return
-    warmer = VersatileImageFieldWarmer(
-        instance_or_queryset=instance,
-        rendition_key_set=size_set, image_attr=image_attr)
+    warmer = ThumbnailWarmer(workers=1)
+    warmer.add(instance, image_attr)
     logger.info('Creating thumbnails for  %s', pk)
-    num_created, failed_to_create = warmer.warm()
-    if num_created:
-
-        logger.info('Created %d thumbnails', num_created)
-    if failed_to_create:
-
-        logger.error('Failed to generate thumbnails',
-                     extra={'paths': failed_to_create})
+    warmer.warm()
 
 
 def add_history_ip_address(sender, **kwargs):
@@ -347,3 +347,13 @@ def get_status_integer(status):
 
 
 
+
+class ImportStatus(Enum):
+    PENDING = 'PENDING'
+    RUNNING = 'RUNNING'
+    COMPLETED = 'COMPLETED'
+    FAILED = 'FAILED'
+
+class ImportFormat(Enum):
+    JSONL = 'JSONL'
+    CSV = 'CSV'
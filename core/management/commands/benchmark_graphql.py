@@ -0,0 +1,62 @@
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from graphene_django.settings import graphene_settings
+
+from core.utils.benchmark import GraphQLBenchmark, load_operations
+from products.benchmarks import OPERATIONS, get_placeholders
+
+
+class Command(BaseCommand):
+    help = ('Replays GraphQL operations, reports latency percentiles and SQL '
+            'query counts and fails when an operation exceeds its query budget')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Mobile of the user running the operations')
+        parser.add_argument(
+            '--operations',
+            help='JSON file with a list of operations, the catalog operations by default')
+        parser.add_argument('--only', help='Comma separated operation names to run')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--output', help='Write the report as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(mobile=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError('User %s does not exist' % options['user'])
+
+        operations = OPERATIONS
+        if options['operations']:
+            operations = load_operations(options['operations'])
+        if options['only']:
+            names = options['only'].split(',')
+            operations = [operation for operation in operations if operation['name'] in names]
+
+        benchmark = GraphQLBenchmark(
+            graphene_settings.SCHEMA, user, iterations=options['iterations'], warmup=options['warmup'],
+            placeholders=get_placeholders())
+        results = benchmark.run(operations)
+        failed = [result for result in results if result.errors]
+        if failed:
+            raise CommandError('\n'.join(
+                '%s failed: %s' % (result.name, result.errors[0]) for result in failed))
+        report = [result.summary() for result in results]
+
+        self.stdout.write('%-22s %8s %8s %8s %8s %8s' % (
+            'operation', 'p50 ms', 'p95 ms', 'p99 ms', 'queries', 'budget'))
+        for summary in report:
+            self.stdout.write('%-22s %8s %8s %8s %8s %8s%s' % (
+                summary['name'], summary['p50_ms'], summary['p95_ms'], summary['p99_ms'],
+                summary['max_queries'], summary['budget'] if summary['budget'] is not None else '-',
+                ' OVER BUDGET' if summary['over_budget'] else ''))
+
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(report, output, indent=2)
+
+        over_budget = [summary['name'] for summary in report if summary['over_budget']]
+        if over_budget:
+            raise CommandError('Query budget exceeded by %s' % ', '.join(over_budget))
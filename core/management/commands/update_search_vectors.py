@@ -0,0 +1,29 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from core.models import SearchVectorModel
+from core.utils.db_search import update_search_vectors
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the database search vectors of every searchable model'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument(
+            '--model', action='append', dest='models',
+            help='app_label.ModelName to update, all searchable models by default')
+
+    def handle(self, *args, **options):
+        if options['models']:
+            models = [apps.get_model(label) for label in options['models']]
+        else:
+            models = [
+                model for model in apps.get_models() if issubclass(model, SearchVectorModel)
+            ]
+        chunk_size = options['chunk_size']
+        for model in models:
+            pks = list(model._base_manager.order_by('pk').values_list('pk', flat=True))
+            for start in range(0, len(pks), chunk_size):
+                update_search_vectors(model, pks[start:start + chunk_size])
+            self.stdout.write('%s: %s rows' % (model._meta.label, len(pks)))
@@ -1,7 +1,10 @@
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
 from django.db.models import F, Max, Q
 from django.db.models import ProtectedError
+from django.dispatch import Signal
 from django.db import Error as DBError, transaction
+from django.utils import timezone
 from simple_history.models import HistoricalRecords
 
 from core.enums.enum import Status
@@ -38,14 +41,40 @@ class ExportModel(models.Model):
     class Meta:
         abstract = True
 
+# Text search configuration of search vectors, no stemming as names are multilingual
+SEARCH_CONFIG = 'simple'
+
+class SearchVectorModel(models.Model):
+    """Keeps a weighted tsvector of `search_vector_fields` for database search.
+    `search_trigram_field` is also matched by trigram similarity, concrete
+    models add the GIN indexes of both. See core.utils.db_search."""
+    search_vector = SearchVectorField(blank=True, null=True, editable=False)
+
+    search_vector_fields = (('name', 'A'),)
+    search_trigram_field = 'name'
+    # Foreign key to the same model whose name is part of the vector
+    search_vector_parent_field = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def get_search_vector(cls):
+        vector = None
+        for field, weight in cls.search_vector_fields:
+            part = SearchVector(field, weight=weight, config=SEARCH_CONFIG)
+            vector = part if vector is None else vector + part
+        return vector
+
 
 
 class SoftDeleteQuerySet(models.QuerySet):
 
   @transaction.atomic
   def change_status(self, status=None):
-      for x in self:
-        x.change_status(status=status)
+      pks = bulk_change_status(self.model, self, status, ())
+      if pks:
+          cascade_status(self.model, pks, status)
 
   def get_queryset(self):
       self.get_queryset().all()
@@ -89,6 +118,9 @@ class SoftDeleteModel(CoreModel):
     active_records = SoftDeleteManager(active_records=True)
     deleted_objects = SoftDeleteManager(deleted_records=True)
 
+    # Foreign keys whose targets take over status changes of a row
+    status_cascade_parents = ()
+
     class Meta:
         abstract = True
 
@@ -133,29 +165,136 @@ class SoftDeleteModel(CoreModel):
 
 
     def _on_change_status(self, **kwargs):
+        cascade_status(self.__class__, [self.pk], self.status)
 
-        for relation in self._meta._relation_tree:
-            on_delete = getattr(relation.remote_field, 'on_delete', models.DO_NOTHING)
-            if on_delete in [None, models.DO_NOTHING]:
-                continue
 
-            filter = {relation.name: self}
-            related_queryset = relation.model.objects.filter(**filter)
+_cascade_relations = {}
 
-            if on_delete == models.CASCADE:
-                obj = relation.model.objects.filter(**filter)
-                if issubclass(relation.model, SoftDeleteModel):
-                    obj.change_status(self.status)
-                else:
-                    obj.delete(**kwargs)
-            elif on_delete == models.SET_NULL:
-                pass
 
-            elif on_delete == models.PROTECT:
-                if related_queryset.count() > 0:
-                    raise ProtectedError()
-            else:
-                raise (NotImplementedError())
+def get_cascade_relations(model):
+    """Relations followed when the status of a `model` row changes,
+    collected once per model"""
+    relations = _cascade_relations.get(model)
+    if relations is None:
+        relations = []
+        for relation in model._meta._relation_tree:
+            on_delete = getattr(relation.remote_field, 'on_delete', models.DO_NOTHING)
+            if on_delete in [None, models.DO_NOTHING, models.SET_NULL]:
+                continue
+            if on_delete not in [models.CASCADE, models.PROTECT]:
+                raise NotImplementedError()
+            relations.append((relation, on_delete))
+        _cascade_relations[model] = relations
+    return relations
+
+
+def get_history_request():
+    request = getattr(HistoricalRecords.thread, 'request', None)
+    if request is not None and request.user.is_authenticated:
+        return request
+    return None
+
+
+def bulk_history_update(model, instances, date, history_type='~'):
+    """Write one history row per instance in a single insert, `~` for
+    updates, `+` for bulk created rows"""
+    history_model = model.history.model
+    excluded_fields = history_model._history_excluded_fields
+    request = get_history_request()
+    extra = {}
+    if request is not None:
+        extra['history_user'] = request.user
+        # Only models registered with the IP address base have the field
+        if any(field.name == 'ip_address' for field in history_model._meta.fields):
+            extra['ip_address'] = request.META.get('REMOTE_ADDR') or '127.0.0.1'
+    history_model.objects.bulk_create([
+        history_model(
+            history_date=date,
+            history_type=history_type,
+            history_change_reason='',
+            **extra,
+            **{
+                field.attname: getattr(instance, field.attname)
+                for field in instance._meta.fields
+                if field.name not in excluded_fields
+            }
+        )
+        for instance in instances
+    ])
+
+
+# Sent after a set-based status change, which bypasses post_save
+status_changed = Signal(providing_args=['pks', 'status'])
+
+
+def bulk_change_status(model, queryset, status, exclude):
+    """Set the status of every row of `queryset` with one UPDATE and
+    return the primary keys of the changed rows"""
+    now = timezone.now()
+    queryset = queryset.exclude(pk__in=exclude)
+    has_history = hasattr(model, 'history')
+    if has_history:
+        instances = list(queryset)
+        pks = [instance.pk for instance in instances]
+    else:
+        pks = list(queryset.values_list('pk', flat=True))
+    if not pks:
+        return pks
+
+    model.all_objects.filter(pk__in=pks).update(status=status, updated=now)
+    if has_history:
+        for instance in instances:
+            instance.status = status
+            instance.updated = now
+        bulk_history_update(model, instances, now)
+    status_changed.send(sender=model, pks=pks, status=status)
+    return pks
+
+
+def cascade_status(model, pks, status):
+    """Apply a status change of `model` rows to their CASCADE relations, and
+    to the targets listed in `status_cascade_parents`, with one UPDATE per
+    relation and level instead of saving every row"""
+    changed = {model: set(pks)}
+
+    def change(target_model, queryset):
+        seen = changed.setdefault(target_model, set())
+        target_pks = bulk_change_status(target_model, queryset, status, seen)
+        if target_pks:
+            seen.update(target_pks)
+            next_level.append((target_model, target_pks))
+
+    level = [(model, pks)]
+    while level:
+        next_level = []
+        for parent_model, parent_pks in level:
+            for relation, on_delete in get_cascade_relations(parent_model):
+                if relation.target_field.primary_key:
+                    lookup = '%s__in' % relation.name
+                else:
+                    lookup = '%s__pk__in' % relation.name
+                child_model = relation.model
+                queryset = child_model.objects.filter(**{lookup: parent_pks})
+
+                if on_delete == models.PROTECT:
+                    protected = list(queryset[:1])
+                    if protected:
+                        raise ProtectedError(
+                            'Cannot change status of %s, it is referenced by %s' % (
+                                parent_model._meta.verbose_name,
+                                child_model._meta.verbose_name),
+                            protected)
+                elif issubclass(child_model, SoftDeleteModel):
+                    change(child_model, queryset)
+                else:
+                    queryset.delete()
+
+            for field_name in parent_model.status_cascade_parents:
+                field = parent_model._meta.get_field(field_name)
+                target_pks = parent_model.all_objects.filter(
+                    pk__in=parent_pks).values(field.attname)
+                change(field.related_model, field.related_model.objects.filter(pk__in=target_pks))
+        level = next_level
 
 
 class SoftDeleteHistoryModel(SoftDeleteModel, SimpleHistory):
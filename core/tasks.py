@@ -0,0 +1,13 @@
+from celery import task
+
+from .custom.thumbnails import ThumbnailWarmer
+
+
+@task
+def warm_thumbnails(files):
+    """Creates the renditions of a batch of (model label, image attribute,
+    file name) entries"""
+    warmer = ThumbnailWarmer()
+    for model_label, image_attr, name in files:
+        warmer.add_file(model_label, image_attr, name)
+    warmer.warm()
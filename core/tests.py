@@ -1,3 +1,230 @@
-from django.test import TestCase
+from django.db import ProgrammingError, connection, transaction
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from core.enums.enum import Status
+from core.models import status_changed
+from core.utils.codes import CodeAllocator
+from core.utils.fields import FilterInputConnectionField
+from core.utils.side_effects import defer_items
+from products.models import (
+    Brand,
+    Category,
+    ProductCategoryRelation,
+    ProductMaster,
+    ProductTemplate,
+    ProductTemplateDescription
+)
+from products.types import ProductMaster as ProductMasterType
+
+
+class KeysetPaginationTest(TestCase):
+
+    def setUp(self):
+        # Duplicated and missing names, so ties and NULLs cross page borders
+        for index, name in enumerate([None, 'b', 'a', None, 'b', 'c', None]):
+            ProductMaster.objects.create(
+                code='M%s' % index, name=name, status=Status.ACTIVE.value)
+        self.connection = ProductMasterType._meta.connection
+
+    def get_page(self, descending, **args):
+        return FilterInputConnectionField.resolve_keyset_connection(
+            self.connection, args, 'name', descending, ProductMaster.objects.all())
+
+    def walk(self, descending, backwards=False):
+        """Primary keys of every page of one row, followed by cursors"""
+        pks, cursor = [], None
+        while True:
+            if backwards:
+                page = self.get_page(descending, last=1, before=cursor)
+                pks[:0] = [edge.node.pk for edge in page.edges]
+                if not page.page_info.has_previous_page:
+                    return pks
+                cursor = page.page_info.start_cursor
+            else:
+                page = self.get_page(descending, first=1, after=cursor)
+                pks.extend(edge.node.pk for edge in page.edges)
+                if not page.page_info.has_next_page:
+                    return pks
+                cursor = page.page_info.end_cursor
+
+    def expected(self, descending):
+        # Postgres puts NULL last in ascending and first in descending order
+        if descending:
+            ordering = [F('name').desc(nulls_first=True), '-pk']
+        else:
+            ordering = [F('name').asc(nulls_last=True), 'pk']
+        return list(ProductMaster.objects.order_by(*ordering).values_list('pk', flat=True))
+
+    def test_ascending_pages_seek_past_ties_and_nulls(self):
+        self.assertEqual(self.walk(False), self.expected(False))
+
+    def test_descending_pages_seek_past_ties_and_nulls(self):
+        self.assertEqual(self.walk(True), self.expected(True))
+
+    def test_backward_pages_match_forward_pages(self):
+        self.assertEqual(self.walk(False, backwards=True), self.expected(False))
+        self.assertEqual(self.walk(True, backwards=True), self.expected(True))
+
+    def test_page_is_one_query(self):
+        page = self.get_page(False, first=3)
+        with self.assertNumQueries(1):
+            self.get_page(False, first=3, after=page.page_info.end_cursor)
+
+
+class SideEffectsTest(TransactionTestCase):
+
+    def setUp(self):
+        self.calls = []
+
+    def defer(self, *items):
+        defer_items(self.calls.append, items)
+
+    def test_autocommit_calls_at_once(self):
+        self.defer(1)
+        self.assertEqual(self.calls, [[1]])
+
+    def test_items_are_sent_once_after_commit(self):
+        with transaction.atomic():
+            self.defer(1, 2)
+            with transaction.atomic():
+                self.defer(2, 3)
+            self.defer(1, 4)
+            self.assertEqual(self.calls, [])
+        self.assertEqual(len(self.calls), 1)
+        self.assertCountEqual(self.calls[0], [1, 2, 3, 4])
+
+    def test_rolled_back_savepoints_are_not_sent(self):
+        with transaction.atomic():
+            self.defer(1)
+            try:
+                with transaction.atomic():
+                    self.defer(2)
+                    with transaction.atomic():
+                        self.defer(3)
+                    raise ValueError
+            except ValueError:
+                pass
+            with transaction.atomic():
+                self.defer(4)
+        self.assertEqual(self.calls, [[1, 4]])
+
+    def test_rolled_back_savepoint_before_any_other_item(self):
+        with transaction.atomic():
+            try:
+                with transaction.atomic():
+                    self.defer(1)
+                    raise ValueError
+            except ValueError:
+                pass
+            self.defer(2)
+        self.assertEqual(self.calls, [[2]])
+
+    def test_rolled_back_transaction_sends_nothing(self):
+        try:
+            with transaction.atomic():
+                self.defer(1)
+                raise ValueError
+        except ValueError:
+            pass
+        with transaction.atomic():
+            self.defer(2)
+        self.assertEqual(self.calls, [[2]])
+
+
+class StatusCascadeTest(TestCase):
+
+    def setUp(self):
+        self.count = 0
+        self.changes = []
+        status_changed.connect(self.receiver)
+        self.addCleanup(status_changed.disconnect, self.receiver)
+
+    def receiver(self, sender, pks, status, **kwargs):
+        self.changes.append((sender, sorted(pks), status))
+
+    def create_template(self, masters):
+        self.count += 1
+        template = ProductTemplate.objects.create(
+            name='Template %s' % self.count, slug='template-%s' % self.count,
+            code='T%s' % self.count, default_image='', status=Status.ACTIVE.value)
+        for index in range(masters):
+            ProductMaster.objects.create(
+                code='M%s-%s' % (self.count, index), product_template=template,
+                status=Status.ACTIVE.value)
+        category = Category.objects.create(
+            name='Category %s' % self.count, slug='category-%s' % self.count,
+            code='C%s' % self.count, default_image='', status=Status.ACTIVE.value)
+        ProductCategoryRelation.objects.create(product_template=template, category=category)
+        ProductTemplateDescription.objects.create(
+            product_template=template, title='Title', description='Description', sort_order=0)
+        return template
+
+    def test_cascade(self):
+        template = self.create_template(2)
+        deleted = template.masters.first()
+        deleted.status = Status.DELETED.value
+        deleted.save()
+        history_count = deleted.history.count()
+        self.changes.clear()
+
+        template.change_status(Status.DELETED.value)
+
+        masters = ProductMaster.all_objects.filter(product_template=template)
+        self.assertEqual({master.status for master in masters}, {Status.DELETED.value})
+        relation = ProductCategoryRelation.all_objects.get(product_template=template)
+        self.assertEqual(relation.status, Status.DELETED.value)
+        self.assertFalse(ProductTemplateDescription.objects.filter(product_template=template).exists())
+
+        # Rows already deleted are neither written nor reported again
+        self.assertEqual(deleted.history.count(), history_count)
+        changed = masters.exclude(pk=deleted.pk).get()
+        latest = changed.history.first()
+        self.assertEqual((latest.history_type, latest.status), ('~', Status.DELETED.value))
+        self.assertEqual(relation.history.first().status, Status.DELETED.value)
+        self.assertIn((ProductMaster, [changed.pk], Status.DELETED.value), self.changes)
+        self.assertIn((ProductCategoryRelation, [relation.pk], Status.DELETED.value), self.changes)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        counts = []
+        for masters in (2, 8):
+            template = self.create_template(masters)
+            with CaptureQueriesContext(connection) as queries:
+                template.change_status(Status.DELETED.value)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class CodeAllocatorTest(TransactionTestCase):
+    # Sequences outlive the test transactions, so every test uses its own prefix
+
+    def test_codes_follow_the_highest_stored_code(self):
+        for code in ['Z100000041', 'Z100000007', 'ZX1']:
+            Brand.objects.create(
+                name=code, slug=code.lower(), code=code, default_image='',
+                status=Status.ACTIVE.value)
+        codes = CodeAllocator('Z', 'products.Brand')
+        self.assertEqual(codes.allocate(0), [])
+        self.assertEqual(codes.allocate(3), ['Z100000042', 'Z100000043', 'Z100000044'])
+        self.assertEqual(codes.next(), 'Z100000045')
+
+    def test_block_is_one_query(self):
+        codes = CodeAllocator('Y', 'products.Brand')
+        codes.next()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(len(codes.allocate(50)), 50)
+        self.assertEqual(
+            len([query for query in queries if 'nextval' in query['sql']]), 1)
+
+    def test_sequence_rolled_back_with_its_transaction_is_created_again(self):
+        codes = CodeAllocator('X', 'products.Brand')
+        try:
+            with transaction.atomic():
+                self.assertEqual(codes.next(), 'X100000001')
+                raise ValueError
+        except ValueError:
+            pass
+        with self.assertRaises(ProgrammingError):
+            codes.next()
+        self.assertEqual(codes.next(), 'X100000001')
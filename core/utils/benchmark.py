@@ -0,0 +1,129 @@
+import json
+import math
+import time
+
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from .persisted_queries import DocumentCacheBackend
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    if not values:
+        return 0
+    index = max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)
+    return values[index]
+
+
+def format_variables(value, placeholders):
+    """Replace `{name}` placeholders inside string variables"""
+    if isinstance(value, str):
+        try:
+            return value.format(**placeholders)
+        except (KeyError, IndexError, ValueError):
+            return value
+    if isinstance(value, dict):
+        return {key: format_variables(item, placeholders) for key, item in value.items()}
+    if isinstance(value, list):
+        return [format_variables(item, placeholders) for item in value]
+    return value
+
+
+class OperationResult:
+
+    def __init__(self, operation):
+        self.operation = operation
+        self.timings = []
+        self.queries = []
+        self.errors = []
+
+    @property
+    def name(self):
+        return self.operation['name']
+
+    @property
+    def budget(self):
+        return self.operation.get('budget')
+
+    @property
+    def max_queries(self):
+        return max(self.queries) if self.queries else 0
+
+    @property
+    def over_budget(self):
+        return self.budget is not None and self.max_queries > self.budget
+
+    def summary(self):
+        return {
+            'name': self.name,
+            'iterations': len(self.timings),
+            'p50_ms': round(percentile(self.timings, 50) * 1000, 2),
+            'p95_ms': round(percentile(self.timings, 95) * 1000, 2),
+            'p99_ms': round(percentile(self.timings, 99) * 1000, 2),
+            'max_queries': self.max_queries,
+            'budget': self.budget,
+            'over_budget': self.over_budget,
+        }
+
+
+class GraphQLBenchmark:
+    """Replays GraphQL operations against a schema, like the view does, and
+    records latency and the number of SQL queries of every execution.
+    An operation is a dict with `name`, `query`, optional `variables` and an
+    optional `budget`, the maximum number of SQL queries it may run.
+    Every execution is rolled back."""
+
+    def __init__(self, schema, user, iterations=20, warmup=2, placeholders=None):
+        self.schema = schema
+        self.user = user
+        self.iterations = iterations
+        self.warmup = warmup
+        self.placeholders = placeholders or {}
+        self.backend = DocumentCacheBackend()
+        self.factory = RequestFactory()
+
+    def get_context(self):
+        # A new request per execution, data loaders live on the request
+        request = self.factory.post('/graphql/')
+        request.user = self.user
+        return request
+
+    def execute(self, operation, iteration):
+        """Run an operation in a transaction which is always rolled back, so
+        mutations leave the benchmarked data unchanged"""
+        placeholders = dict(self.placeholders, iteration=iteration)
+        with transaction.atomic():
+            execution = self.schema.execute(
+                operation['query'],
+                variables=format_variables(operation.get('variables') or {}, placeholders),
+                context_value=self.get_context(),
+                backend=self.backend)
+            transaction.set_rollback(True)
+        return execution
+
+    def run_operation(self, operation):
+        result = OperationResult(operation)
+        for iteration in range(self.warmup):
+            execution = self.execute(operation, 'warmup-%s' % iteration)
+            if execution.errors:
+                result.errors.extend(str(error) for error in execution.errors)
+
+        for iteration in range(self.iterations):
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                execution = self.execute(operation, iteration)
+                result.timings.append(time.perf_counter() - start)
+            result.queries.append(len(queries))
+            if execution.errors:
+                result.errors.extend(str(error) for error in execution.errors)
+        return result
+
+    def run(self, operations):
+        return [self.run_operation(operation) for operation in operations]
+
+
+def load_operations(path):
+    with open(path) as operations_file:
+        return json.load(operations_file)
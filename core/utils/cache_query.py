@@ -1,19 +1,61 @@
-from products.models import ProductMaster
+from django.db.models import Q
+
+from products.models import Category, ProductMaster
 from store_products.models import StoreProduct
-from .memcached import client
+from .memcached import client, get_version
 
 TIMEOUT = 1800
 
+CATEGORY_SUBTREE_KEY = 'category_subtree_%s_%s'
+
+
 def categories_cache(category):
-    category_list_key = 'category_list_' + str(category.id)
-    category_result = client.get(category_list_key)
-    ids = [category.id]
-    children = category.children.all().values_list('id', flat=True)
-    for child in children:
-        ids.append(child)
-    if category_result is None:
-        client.set(category_list_key, list(ids))
-    return ids
+    """Return the ids of a category and all its descendants, deleted
+    categories excluded.
+    Keys embed the category tree version, which category save, delete and
+    status change signals bump."""
+    return categories_subtree_cache([category])[0]
+
+
+def categories_subtree_cache(categories):
+    """Subtree ids of several categories or category ids, with one
+    memcached round-trip and one query for the subtrees missing from it"""
+    from products.utils.category_tree import VERSION_KEY
+
+    version = get_version(VERSION_KEY)
+    category_ids = [getattr(category, 'pk', category) for category in categories]
+    keys = [CATEGORY_SUBTREE_KEY % (category_id, version) for category_id in category_ids]
+    cached = client.get_many(keys)
+
+    missing = [
+        category_id for category_id, key in zip(category_ids, keys) if key not in cached
+    ]
+    if missing:
+        subtrees = load_category_subtrees(missing)
+        client.set_many({
+            CATEGORY_SUBTREE_KEY % (category_id, version): ids
+            for category_id, ids in subtrees.items()
+        }, TIMEOUT)
+        for category_id, ids in subtrees.items():
+            cached[CATEGORY_SUBTREE_KEY % (category_id, version)] = ids
+    return [cached.get(key, []) for key in keys]
+
+
+def load_category_subtrees(category_ids):
+    roots = Category.objects.filter(pk__in=category_ids).values_list(
+        'id', 'tree_id', 'lft', 'rght')
+    if not roots:
+        return {}
+    query = Q()
+    for _, tree_id, left, right in roots:
+        query |= Q(tree_id=tree_id, lft__gte=left, rght__lte=right)
+    nodes = Category.objects.filter(query).values_list('id', 'tree_id', 'lft')
+    subtrees = {category_id: [] for category_id, _, _, _ in roots}
+    for node_id, tree_id, left in nodes:
+        for category_id, root_tree_id, root_left, root_right in roots:
+            if tree_id == root_tree_id and root_left <= left <= root_right:
+                subtrees[category_id].append(node_id)
+    return subtrees
 
 def store_product_pack_cache(product, packs):
     product_result = client.get(product.code)
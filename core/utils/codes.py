@@ -0,0 +1,78 @@
+import re
+import threading
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, ProgrammingError, connections, transaction
+from django.db.models import BigIntegerField, Max
+from django.db.models.functions import Cast, Substr
+
+
+class CodeAllocator:
+    """Allocates business codes like `M100000001` from a database sequence
+    per prefix.
+    The sequence is created on first use, starting after the highest code
+    stored for the model, and a block of codes is reserved with a single
+    query. Codes of failed mutations are never reused, so gaps are expected."""
+
+    def __init__(self, prefix, model, start=100000001, using=DEFAULT_DB_ALIAS):
+        self.prefix = prefix
+        self.model = model
+        self.start = start
+        self.using = using
+        self.sequence_name = 'code_seq_%s' % prefix.lower()
+        self.sequence_ready = False
+        self.lock = threading.Lock()
+
+    def get_model(self):
+        if isinstance(self.model, str):
+            return apps.get_model(self.model)
+        return self.model
+
+    def get_start(self):
+        model = self.get_model()
+        manager = getattr(model, 'all_objects', model._default_manager)
+        result = manager.filter(
+            code__regex=r'^%s[0-9]+$' % re.escape(self.prefix)
+        ).annotate(
+            number=Cast(Substr('code', len(self.prefix) + 1), BigIntegerField())
+        ).aggregate(last=Max('number'))
+        if result['last'] is None:
+            return self.start
+        return max(result['last'] + 1, self.start)
+
+    def ensure_sequence(self, cursor):
+        if self.sequence_ready:
+            return
+        with self.lock:
+            if self.sequence_ready:
+                return
+            cursor.execute(
+                "SELECT 1 FROM pg_class WHERE relkind = 'S' AND relname = %s",
+                [self.sequence_name])
+            if cursor.fetchone() is None:
+                cursor.execute('CREATE SEQUENCE IF NOT EXISTS %s START WITH %d' % (
+                    connections[self.using].ops.quote_name(self.sequence_name),
+                    self.get_start()))
+            self.sequence_ready = True
+
+    def allocate(self, count=1):
+        """Reserve `count` codes in one round-trip.
+        Runs in a savepoint, so callers catching a database error can keep
+        using the transaction they are in."""
+        if count < 1:
+            return []
+        with transaction.atomic(using=self.using), connections[self.using].cursor() as cursor:
+            self.ensure_sequence(cursor)
+            try:
+                cursor.execute(
+                    'SELECT nextval(%s) FROM generate_series(1, %s)',
+                    [self.sequence_name, count])
+            except ProgrammingError:
+                # The sequence creation was rolled back with its transaction
+                self.sequence_ready = False
+                raise
+            values = sorted(row[0] for row in cursor.fetchall())
+        return ['%s%d' % (self.prefix, value) for value in values]
+
+    def next(self):
+        return self.allocate()[0]
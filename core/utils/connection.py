@@ -42,6 +42,9 @@ class CountableConnection(NonNullConnection):
 
     @staticmethod
     def resolve_total_count(root, *_args, **_kwargs):
+        # Connections keep a lazy count, it is only evaluated when selected
+        if callable(root.length):
+            return root.length()
         return root.length
 
 
@@ -50,9 +53,10 @@ class CountableDjangoObjectType(OptimizedDjangoObjectType):
         abstract = True
 
     @classmethod
-    def __init_subclass_with_meta__(cls, *args, **kwargs):
-        # Force it to use the countable connection
-        countable_conn = CountableConnection.create_type(
+    def __init_subclass_with_meta__(cls, *args, connection_class=None, **kwargs):
+        # Force it to use the countable connection, or a subclass of it
+        connection_class = connection_class or CountableConnection
+        countable_conn = connection_class.create_type(
             "{}CountableConnection".format(cls.__name__), node=cls
         )
         super().__init_subclass_with_meta__(*args, connection=countable_conn, **kwargs)
\ No newline at end of file
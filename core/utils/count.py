@@ -0,0 +1,78 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.exceptions import EmptyResultSet
+from django.db import connections
+
+from .memcached import client
+
+TIMEOUT = 1800
+DEFAULT_ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+class LazyCount:
+    """Total count of a connection, evaluated on first use and remembered.
+    `CountableConnection.resolve_total_count` only runs when the client selects
+    `totalCount`, so the COUNT query is skipped for every other request."""
+
+    def __init__(self, func):
+        self.func = func
+        self.value = None
+
+    def __call__(self):
+        if self.value is None:
+            self.value = self.func()
+        return self.value
+
+
+def get_sql(queryset):
+    """(sql, params) of a queryset, None when it can match no row"""
+    try:
+        return queryset.query.sql_with_params()
+    except EmptyResultSet:
+        return None
+
+
+def get_count_cache_key(queryset, sql, params):
+    """Key on the compiled query, so connections over different base
+    querysets never share a count"""
+    query = json.dumps([queryset.db, sql, params], default=str)
+    digest = hashlib.md5(query.encode('utf-8')).hexdigest()
+    return 'count_%s_%s' % (queryset.model._meta.label_lower, digest)
+
+
+def estimate_count(queryset, sql, params):
+    """Return the row estimate of the query planner for a queryset."""
+    with connections[queryset.db].cursor() as cursor:
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def get_total_count(queryset, estimated=False):
+    """Count a queryset.
+    With `estimated` the exact count only runs for small results, results
+    above `ESTIMATED_COUNT_THRESHOLD` use the planner estimate which is cached
+    per query."""
+    if not estimated:
+        return queryset.count()
+
+    query = get_sql(queryset)
+    if query is None:
+        return 0
+    sql, params = query
+    key = get_count_cache_key(queryset, sql, params)
+    count = client.get(key)
+    if count is not None:
+        return count
+
+    threshold = getattr(
+        settings, 'ESTIMATED_COUNT_THRESHOLD', DEFAULT_ESTIMATED_COUNT_THRESHOLD)
+    count = estimate_count(queryset, sql, params)
+    if count < threshold:
+        return queryset.count()
+    client.set(key, count, TIMEOUT)
+    return count
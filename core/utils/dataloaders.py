@@ -0,0 +1,52 @@
+from promise import Promise
+from promise.dataloader import DataLoader as BaseLoader
+
+
+class DataLoader(BaseLoader):
+    """Request scoped data loader.
+    Loaders are registered on `info.context.dataloaders` by `context_key`, so
+    every resolver of a request shares the same batch queue and cache.
+    Subclasses implement `batch_load(keys)` and return results in key order."""
+    context_key = None
+    context = None
+
+    def __new__(cls, context):
+        key = cls.context_key
+        if key is None:
+            raise TypeError("Data loader %s does not define a context key" % cls.__name__)
+        if not hasattr(context, "dataloaders"):
+            context.dataloaders = {}
+        if key not in context.dataloaders:
+            context.dataloaders[key] = super().__new__(cls)
+        loader = context.dataloaders[key]
+        loader.__init__(context)
+        return loader
+
+    def __init__(self, context):
+        if getattr(self, "context", None) != context:
+            self.context = context
+            super().__init__()
+
+    def batch_load_fn(self, keys):
+        results = self.batch_load(keys)
+        if not isinstance(results, Promise):
+            return Promise.resolve(results)
+        return results
+
+    def batch_load(self, keys):
+        raise NotImplementedError()
+
+
+def group_by_key(rows, keys, key_fn, value_fn):
+    """Group (key, value) pairs of `rows` into lists ordered by `keys`,
+    dropping duplicated values of a key."""
+    grouped = {key: [] for key in keys}
+    seen = set()
+    for row in rows:
+        key = key_fn(row)
+        value = value_fn(row)
+        if key not in grouped or (key, value.pk) in seen:
+            continue
+        seen.add((key, value.pk))
+        grouped[key].append(value)
+    return [grouped[key] for key in keys]
@@ -0,0 +1,82 @@
+import re
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import connections
+from django.db.models import F, Q
+
+from core.models import SEARCH_CONFIG, SearchVectorModel
+
+WORD_RE = re.compile(r'\w+')
+
+
+def is_searchable(model):
+    """Whether `model` is searched through its search vector"""
+    return getattr(settings, 'DB_SEARCH_ENABLED', False) and issubclass(model, SearchVectorModel)
+
+
+def get_search_query(value):
+    """Prefix query matching every word of `value`, None without words"""
+    words = WORD_RE.findall(value)
+    if not words:
+        return None
+    return SearchQuery(
+        ' & '.join('%s:*' % word for word in words), config=SEARCH_CONFIG, search_type='raw')
+
+
+def search_queryset(queryset, value, rank=True):
+    """Filter `queryset` on its search vector and on trigram similarity of
+    the model's trigram field, both served by GIN indexes.
+    With `rank` the rows are ordered by relevance."""
+    model = queryset.model
+    search_query = get_search_query(value)
+    trigram_field = model.search_trigram_field
+    condition = Q(**{'%s__trigram_similar' % trigram_field: value})
+    if search_query is not None:
+        condition |= Q(search_vector=search_query)
+    queryset = queryset.filter(condition)
+    if rank:
+        search_rank = TrigramSimilarity(trigram_field, value)
+        if search_query is not None:
+            search_rank = SearchRank(F('search_vector'), search_query) + search_rank
+        queryset = queryset.annotate(search_rank=search_rank).order_by('-search_rank', 'pk')
+    return queryset
+
+
+def order_by_rank(queryset, *fields):
+    """Order by relevance when `queryset` was searched with ranking, then
+    by `fields`"""
+    if 'search_rank' in queryset.query.annotations:
+        return queryset.order_by('-search_rank', *fields)
+    return queryset.order_by(*fields)
+
+
+def create_trigram_extension(sender, using, **kwargs):
+    """pre_migrate receiver creating the pg_trgm extension, which the
+    trigram indexes and lookups need, before any table is migrated"""
+    connection = connections[using]
+    if connection.vendor != 'postgresql':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+
+def update_search_vectors(model, pks=None):
+    """Recompute the search vector of the given rows with one UPDATE"""
+    queryset = model._base_manager.all()
+    if pks is not None:
+        queryset = queryset.filter(pk__in=list(pks))
+    return queryset.update(search_vector=model.get_search_vector())
+
+
+def update_search_vector_receiver(sender, instance, raw=False, **kwargs):
+    """post_save receiver keeping the search vector of a row current, and
+    those of its children for models whose vector holds the parent name"""
+    if raw:
+        return
+    pks = [instance.pk]
+    parent_field = sender.search_vector_parent_field
+    if parent_field:
+        pks.extend(sender._base_manager.filter(
+            **{parent_field: instance.pk}).values_list('pk', flat=True))
+    update_search_vectors(sender, pks)
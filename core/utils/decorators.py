@@ -20,7 +20,7 @@ def permission_required(permissions):
                 raise PermissionDenied(
                     'You have no permission to use %s' % info.field_name)
                 return func(*args, **kwargs)
-            if not user.has_permission(permissions):
+            if not user.get_permission_snapshot().has_permission(permissions):
                 raise PermissionDenied(
                     'You have no permission to use %s' % info.field_name)
             return func(*args, **kwargs)
@@ -43,7 +43,7 @@ def role_required(roles):
                 raise PermissionDenied(
                     'You have no permission to use %s' % info.field_name)
                 return func(*args, **kwargs)
-            if not user.has_role(roles):
+            if not user.get_permission_snapshot().has_role(roles):
                 raise PermissionDenied(
                     'You have no permission to use %s' % info.field_name)
             return func(*args, **kwargs)
@@ -0,0 +1,27 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+
+def is_autosync_enabled():
+    return (
+        'django_elasticsearch_dsl' in settings.INSTALLED_APPS
+        and getattr(settings, 'ELASTICSEARCH_DSL_AUTOSYNC', True))
+
+
+def update_documents(model, pks):
+    from django_elasticsearch_dsl.registries import registry
+
+    queryset = model._base_manager.filter(pk__in=pks)
+    for document in registry.get_documents([model]):
+        document().update(queryset)
+
+
+def update_documents_receiver(sender, pks=None, **kwargs):
+    """status_changed receiver, set-based status changes skip the post_save
+    handler which keeps the Elasticsearch documents in sync"""
+    from django_elasticsearch_dsl.registries import registry
+
+    if pks and sender in registry.get_models():
+        transaction.on_commit(partial(update_documents, sender, list(pks)))
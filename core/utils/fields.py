@@ -1,11 +1,22 @@
+import datetime
+import json
 from functools import partial
 import graphene
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
 from django.db.models.query import QuerySet
 from graphene.relay import PageInfo
 from graphene_django.fields import DjangoConnectionField
-from graphql_relay.connection.arrayconnection import connection_from_list_slice
+from graphql_relay.connection.arrayconnection import (
+    connection_from_list_slice,
+    get_offset_with_default
+)
+from graphql_relay.utils import base64, unbase64
 from promise import Promise
 
+from .count import LazyCount, get_total_count
+
+KEYSET_PREFIX = "keyset:"
 
 
 def patch_pagination_args(field: DjangoConnectionField):
@@ -29,6 +40,143 @@ def patch_pagination_args(field: DjangoConnectionField):
     field.args["limit"].description = "Return the last n elements from the list."
 
 
+def to_keyset_cursor(sort_field, value, pk):
+    """Encode the sort key and primary key of a node into a relay cursor."""
+    if isinstance(value, (datetime.date, datetime.time)):
+        # Keep microseconds, DjangoJSONEncoder truncates them to milliseconds
+        value = value.isoformat()
+    payload = json.dumps([sort_field, value, pk], cls=DjangoJSONEncoder)
+    return base64(KEYSET_PREFIX + payload)
+
+
+def from_keyset_cursor(cursor):
+    """Decode a keyset cursor, returns None for offset (array) cursors."""
+    if not cursor:
+        return None
+    try:
+        value = unbase64(cursor)
+    except Exception:
+        return None
+    if not value.startswith(KEYSET_PREFIX):
+        return None
+    try:
+        sort_field, key, pk = json.loads(value[len(KEYSET_PREFIX):])
+    except ValueError:
+        return None
+    return sort_field, key, pk
+
+
+def get_keyset_value(instance, sort_field):
+    """Read a sort field (which may span relations, eg. `product_template__name`)
+    from a model instance."""
+    value = instance
+    for attr in sort_field.split("__"):
+        if value is None:
+            return None
+        value = getattr(value, attr)
+    return value
+
+
+def keyset_filter(sort_field, descending, value, pk):
+    """Build the seek condition for rows coming after (value, pk).
+    Postgres sorts NULL last for ascending and first for descending order,
+    the conditions below follow that ordering."""
+    if sort_field == "pk":
+        return Q(pk__lt=pk) if descending else Q(pk__gt=pk)
+
+    is_null = Q(**{"%s__isnull" % sort_field: True})
+    if descending:
+        if value is None:
+            return (is_null & Q(pk__lt=pk)) | ~is_null
+        return Q(**{"%s__lt" % sort_field: value}) | Q(
+            **{sort_field: value, "pk__lt": pk})
+    if value is None:
+        return is_null & Q(pk__gt=pk)
+    return Q(**{"%s__gt" % sort_field: value}) | Q(
+        **{sort_field: value, "pk__gt": pk}) | is_null
+
+
+def get_connection_length(args, iterable, estimated_count=False):
+    """Return the total length for a connection.
+    A length precomputed by the resolver (`item_length`) is used as is, for
+    querysets a `LazyCount` is returned so the COUNT only runs for `totalCount`."""
+    item_length = args.get("item_length")
+    if item_length is not None:
+        return item_length
+    if isinstance(iterable, QuerySet):
+        return LazyCount(partial(get_total_count, iterable, estimated_count))
+    return len(iterable)
+
+
+def connection_from_iterable(connection, args, iterable, length):
+    """Build a connection for offset/limit or array cursor pagination.
+    When the total length is lazy only the rows of the page (plus one to
+    detect a next page) are fetched, instead of counting the whole queryset."""
+    if not isinstance(length, LazyCount):
+        return connection_from_list_slice(
+            iterable,
+            args,
+            slice_start=0,
+            list_length=length,
+            list_slice_length=length,
+            connection_type=connection,
+            edge_type=connection.Edge,
+            pageinfo_type=PageInfo,
+        )
+
+    offset = args.get("offset")
+    limit = args.get("limit")
+    first = args.get("first")
+    last = args.get("last")
+    before = args.get("before")
+
+    if offset is not None and limit:
+        rows = list(iterable[offset:offset + limit + 1])
+        page = rows[:limit]
+        return connection_from_list_slice(
+            page,
+            args,
+            slice_start=0,
+            list_length=len(rows),
+            list_slice_length=len(page),
+            connection_type=connection,
+            edge_type=connection.Edge,
+            pageinfo_type=PageInfo,
+        )
+
+    if isinstance(last, int) and not before:
+        # Counting from the end of the list needs the real length
+        return connection_from_list_slice(
+            iterable,
+            args,
+            slice_start=0,
+            list_length=length(),
+            list_slice_length=length(),
+            connection_type=connection,
+            edge_type=connection.Edge,
+            pageinfo_type=PageInfo,
+        )
+
+    start = get_offset_with_default(args.get("after"), -1) + 1
+    end = get_offset_with_default(before, None)
+    if isinstance(last, int) and end is not None:
+        start = max(start, end - last)
+    if isinstance(first, int):
+        probe = start + first + 1
+        end = probe if end is None else min(end, probe)
+    rows = list(iterable[start:end])
+    return connection_from_list_slice(
+        rows,
+        args,
+        slice_start=start,
+        list_length=start + len(rows),
+        list_slice_length=len(rows),
+        connection_type=connection,
+        edge_type=connection.Edge,
+        pageinfo_type=PageInfo,
+    )
+
+
 class BaseConnectionField(graphene.ConnectionField):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, offset=graphene.Int(), limit=graphene.Int(), **kwargs)
@@ -74,45 +222,25 @@ class PrefetchingConnectionField(BaseDjangoConnectionField):
         )
 
     @classmethod
-    def resolve_connection(cls, connection, args, iterable):
-
-        offset = args.get("offset")
-        limit = args.get("limit")
-        item_length = args.get("item_length")
-        filter = args.get("filter") or None
-        have_length = False
-
-        if item_length :
-            have_length = True
-
-        if have_length:
-            _len = item_length
-        elif isinstance(iterable, QuerySet):
-            _len = iterable.count()
-        else:
-            _len = len(iterable)
-
-        if offset is not None and limit and iterable and isinstance(iterable, QuerySet) and have_length is False:
-            iterable = iterable[offset:limit + offset]
-
-        connection = connection_from_list_slice(
-            iterable,
-            args,
-            slice_start=0,
-            list_length=_len,
-            list_slice_length=_len,
-            connection_type=connection,
-            edge_type=connection.Edge,
-            pageinfo_type=PageInfo,
-        )
+    def resolve_connection(cls, connection, args, iterable, max_limit=None):
+        length = get_connection_length(args, iterable)
+        connection = connection_from_iterable(connection, args, iterable, length)
         connection.iterable = iterable
-        connection.length = 50
+        connection.length = length
         return connection
 
 
 class FilterInputConnectionField(BaseDjangoConnectionField):
     def __init__(self, *args, **kwargs):
         self.filter_field_name = kwargs.pop("filter_field_name", "filter")
+        self.sort_field_name = kwargs.pop("sort_field_name", "sort_by")
+        self.keyset_sort_enum = kwargs.pop("keyset_sort_enum", None)
+        self.estimated_count = kwargs.pop("estimated_count", False)
+        if self.estimated_count:
+            # Estimates are opt-in per query, totals stay exact by default
+            kwargs.setdefault("estimate_count", graphene.Boolean(
+                default_value=False,
+                description="Use the query planner estimate for large total counts."))
         self.filter_input = kwargs.get(self.filter_field_name)
         self.filterset_class = None
         if self.filter_input:
@@ -120,41 +248,92 @@ class FilterInputConnectionField(BaseDjangoConnectionField):
         super().__init__(*args, **kwargs)
 
     @classmethod
-    def resolve_connection(cls, connection, args, iterable):
-
-        offset = args.get("offset")
-        limit = args.get("limit")
-        item_length = args.get("item_length")
-        filter = args.get("filter") or None
-        have_length = False
-
-        if item_length:
-            have_length = True
-
-        if have_length:
-            _len = item_length
-        elif isinstance(iterable, QuerySet):
-            _len = iterable.count()
+    def get_keyset_ordering(cls, args, sort_field_name, sort_enum):
+        """Return the (sort_field, descending) pair used for keyset pagination."""
+        sort_by = args.get(sort_field_name)
+        if not sort_by:
+            return "pk", False
+        if isinstance(sort_by, dict):
+            direction = sort_by.get("direction")
+            sorting_field = sort_by.get("field")
         else:
-            _len = len(iterable)
-
-        if offset is not None and limit and iterable and isinstance(iterable, QuerySet) and have_length is False:
-            iterable = iterable[offset:limit+offset]
+            direction = sort_by.direction
+            sorting_field = sort_by.field
+        if not sorting_field:
+            return "pk", False
+        values = [item.value for item in sort_enum._meta.enum]
+        assert sorting_field in values, (
+            "Sorting by `{}` is not supported for keyset pagination."
+        ).format(sorting_field)
+        return sorting_field, direction == "-"
 
-        connection = connection_from_list_slice(
-            iterable,
-            args,
-            slice_start=0,
-            list_length=_len,
-            list_slice_length=_len,
-            connection_type=connection,
-            edge_type=connection.Edge,
-            pageinfo_type=PageInfo,
+    @classmethod
+    def resolve_keyset_connection(
+            cls, connection, args, sort_field, descending, iterable, estimated_count=False):
+        """Paginate by seeking on (sort key, pk) instead of OFFSET, so every
+        page costs the same regardless of how deep the client scrolled."""
+        first = args.get("first")
+        last = args.get("last")
+        after = from_keyset_cursor(args.get("after"))
+        before = from_keyset_cursor(args.get("before"))
+        length = get_connection_length(args, iterable, estimated_count)
+
+        backwards = bool(last) and not first
+        page_size = last if backwards else first
+        cursor = before if backwards else after
+        # Walking backwards reverses the ordering and the result afterwards
+        seek_descending = descending != backwards
+
+        if cursor:
+            cursor_field, value, pk = cursor
+            assert cursor_field == sort_field, (
+                "The cursor was created with a different sorting of the `{}` "
+                "connection."
+            ).format(connection._meta.node._meta.name)
+            iterable = iterable.filter(
+                keyset_filter(sort_field, seek_descending, value, pk))
+
+        direction = "-" if seek_descending else ""
+        ordering = ["%spk" % direction]
+        if sort_field != "pk":
+            ordering.insert(0, "%s%s" % (direction, sort_field))
+        iterable = iterable.order_by(*ordering)
+
+        if page_size:
+            nodes = list(iterable[:page_size + 1])
+            has_more = len(nodes) > page_size
+            nodes = nodes[:page_size]
+        else:
+            nodes = list(iterable)
+            has_more = False
+        if backwards:
+            nodes.reverse()
+
+        edges = [
+            connection.Edge(
+                node=node,
+                cursor=to_keyset_cursor(
+                    sort_field, get_keyset_value(node, sort_field), node.pk))
+            for node in nodes
+        ]
+        page_info = PageInfo(
+            start_cursor=edges[0].cursor if edges else None,
+            end_cursor=edges[-1].cursor if edges else None,
+            has_previous_page=has_more if backwards else bool(cursor),
+            has_next_page=bool(cursor) if backwards else has_more,
         )
-        connection.iterable = iterable
-        connection.length = _len
+        connection = connection(edges=edges, page_info=page_info)
+        connection.iterable = nodes
+        connection.length = length
         return connection
 
+    @classmethod
+    def resolve_connection(cls, connection, args, iterable, estimated_count=False):
+        length = get_connection_length(args, iterable, estimated_count)
+        connection = connection_from_iterable(connection, args, iterable, length)
+        connection.iterable = iterable
+        connection.length = length
+        return connection
 
     @classmethod
     def connection_resolver(
@@ -167,6 +346,9 @@ class FilterInputConnectionField(BaseDjangoConnectionField):
         enforce_first_or_last,
         filterset_class,
         filters_name,
+        sort_field_name,
+        keyset_sort_enum,
+        estimated_count,
         root,
         info,
         **args,
@@ -218,7 +400,38 @@ class FilterInputConnectionField(BaseDjangoConnectionField):
         # but iterable might be promise
         iterable = queryset_resolver(connection, iterable, info, args)
 
-        on_resolve = partial(cls.resolve_connection, connection, args)
+        estimated_count = estimated_count and bool(args.get("estimate_count"))
+        on_resolve = partial(
+            cls.resolve_connection, connection, args, estimated_count=estimated_count)
+
+        # Keyset mode is used for relay style pagination (first/after), clients
+        # paging with offset/limit or with array cursors keep the offset mode,
+        # as do results already paginated by the search backend.
+        use_keyset = (
+            keyset_sort_enum is not None
+            and args.get("item_length") is None
+            and args.get("offset") is None
+            and args.get("limit") is None
+            and isinstance(iterable, QuerySet)
+            and not (args.get("after") and from_keyset_cursor(args["after"]) is None)
+            and not (args.get("before") and from_keyset_cursor(args["before"]) is None)
+        )
+        if use_keyset:
+            sort_field, descending = cls.get_keyset_ordering(
+                args, sort_field_name, keyset_sort_enum)
+            on_resolve = partial(
+                cls.resolve_keyset_connection, connection, args, sort_field, descending,
+                estimated_count=estimated_count)
+
+        resolve_page = on_resolve
+
+        def on_resolve(iterable):
+            # Filtered rows and arguments, for fields computed over the whole
+            # list. Results paginated by the search backend only hold a page.
+            connection = resolve_page(iterable)
+            connection.queryset = iterable if args["item_length"] is None else None
+            connection.args = args
+            return connection
 
         filter_input = args.get(filters_name)
 
@@ -236,4 +449,7 @@ class FilterInputConnectionField(BaseDjangoConnectionField):
             super().get_resolver(parent_resolver),
             self.filterset_class,
             self.filter_field_name,
+            self.sort_field_name,
+            self.keyset_sort_enum,
+            self.estimated_count,
         )
\ No newline at end of file
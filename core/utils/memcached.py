@@ -1,4 +1,6 @@
 import json
+import time
+
 from pymemcache.client.base import Client
 from config import (
     MEMCACHED_LOCATION
@@ -17,4 +19,34 @@ class JsonSerde(object):
            return json.loads(value)
        raise Exception("Unknown serialization format")
 
-client = Client(MEMCACHED_LOCATION, serde=JsonSerde(), connect_timeout=1000, timeout=1000)
\ No newline at end of file
+client = Client(MEMCACHED_LOCATION, serde=JsonSerde(), connect_timeout=1000, timeout=1000)
+
+
+def new_version():
+    return int(time.time() * 1000)
+
+
+def get_version(key, cached=None):
+    """Current value of a version key, created when missing. `cached` is
+    the result of a `get_many` which included the key."""
+    version = client.get(key) if cached is None else cached.get(key)
+    if version is None:
+        version = new_version()
+        if not client.add(key, version, noreply=False):
+            version = client.get(key) or version
+    return version
+
+
+def bump_version(key):
+    """Increment a version key and return the new version, None when the
+    key was missing and got a new start value"""
+    version = client.incr(key, 1, noreply=False)
+    if version is None:
+        reset_version(key)
+    return version
+
+
+def reset_version(key):
+    """Give a version key a new start value, which no incremented version
+    of the previous value reaches"""
+    client.set(key, new_version())
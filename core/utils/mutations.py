@@ -4,10 +4,13 @@ from textwrap import dedent
 import graphene
 from django.contrib.auth import get_user_model
 from django.core.exceptions import ImproperlyConfigured, ValidationError
+from django.db.models import Max
 from django.db.models.fields.files import FileField
+from django.utils import timezone
 from graphene.types.mutation import MutationOptions
 from graphene_django.registry import get_global_registry
 from graphql.error import GraphQLError
+from graphql_relay import from_global_id
 from graphql_jwt import ObtainJSONWebToken, Verify
 from graphql_jwt.exceptions import JSONWebTokenError, PermissionDenied
 
@@ -15,6 +18,7 @@ from django.db import Error as DBError, transaction
 
 from account import models
 from account.types import User
+from core.models import SortableModel, bulk_history_update
 from core.utils.utils import get_nodes
 from core.types import Error, Upload
 from core.utils.utils import snake_to_camel_case
@@ -100,6 +104,34 @@ class BaseMutation(graphene.Mutation):
                 cls.add_error(errors, field, message)
         return node
 
+    @classmethod
+    def resolve_global_ids(cls, global_ids, errors, field, model):
+        """{global id: instance} of `model` rows with one query. Rows are
+        looked up through `model.objects` like `Node.get_node_from_global_id`
+        does, so soft deleted rows are reported as not found."""
+        model_type = registry.get_type_for_model(model)
+        pks = {}
+        for global_id in set(global_ids):
+            try:
+                type_name, pk = from_global_id(global_id)
+            except Exception:
+                type_name, pk = None, None
+            if not pk or (model_type and type_name != str(model_type)):
+                cls.add_error(errors, field, "Couldn't resolve to a node: %s" % global_id)
+            else:
+                pks[global_id] = pk
+        nodes = {
+            str(pk): instance
+            for pk, instance in model.objects.in_bulk(list(pks.values())).items()
+        }
+        found = {}
+        for global_id, pk in pks.items():
+            if pk in nodes:
+                found[global_id] = nodes[pk]
+            else:
+                cls.add_error(errors, field, "Couldn't resolve to a node: %s" % global_id)
+        return found
+
     @classmethod
     def get_nodes_or_error(cls, ids, errors, field, only_type=None):
         instances = None
@@ -110,14 +142,14 @@ class BaseMutation(graphene.Mutation):
         return instances
 
     @classmethod
-    def clean_instance(cls, instance, errors):
+    def clean_instance(cls, instance, errors, exclude=None, validate_unique=True):
         """Clean the instance that was created using the input data.
         Once a instance is created, this method runs `full_clean()` to perform
         model fields' validation. Returns errors ready to be returned by
         the GraphQL response (if any occurred).
         """
         try:
-            instance.full_clean()
+            instance.full_clean(exclude=exclude, validate_unique=validate_unique)
         except ValidationError as validation_errors:
             message_dict = validation_errors.message_dict
             for field in message_dict:
@@ -411,6 +443,180 @@ class ModelStatusChangeMutation(ModelMutation):
         instance.id = db_id
         return cls.success_response(instance)
 
+
+def get_field_value(instance, field):
+    """Comparable value of a model field, file fields by their name"""
+    value = getattr(instance, field.attname)
+    if isinstance(field, FileField):
+        return value.name if value else None
+    return value
+
+
+def get_changed_fields(instance, original):
+    """Names of the fields of `instance` which differ from the `original`
+    values, new uploads are always changed"""
+    changed = []
+    for field in instance._meta.concrete_fields:
+        if field.primary_key or getattr(field, 'auto_now', False):
+            continue
+        if isinstance(field, FileField):
+            value = getattr(instance, field.attname)
+            if value and not getattr(value, '_committed', True):
+                changed.append(field.name)
+                continue
+        if get_field_value(instance, field) != original[field.attname]:
+            changed.append(field.name)
+    return changed
+
+
+class ModelCollectionMutation(ModelMutation):
+    """Creates, updates and removes rows of the mutation model from a list of
+    inputs and a list of IDs to remove. The global IDs of all items are
+    resolved with one query per field, rows are diffed against their stored
+    values and written with bulk statements. `input` is a list of an input
+    type with an optional `id` field."""
+
+    # Foreign key new rows are appended within when `sort_order` is not given,
+    # existing rows can only be changed through an item naming their parent,
+    # and only be removed along with items of their parent or on their own
+    parent_field = None
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def get_input_class(cls):
+        return cls.Arguments.input.of_type
+
+    @classmethod
+    def perform_collection_mutation(cls, info, input, remove_items):
+        """Clean and save the items, returns the saved instances in input
+        order and the errors. Nothing is written when there are errors."""
+        errors = []
+        model = cls._meta.model
+        input_cls = cls.get_input_class()
+        remove_items = remove_items or []
+
+        existing = cls.resolve_global_ids(
+            [item['id'] for item in input if item.get('id')] + list(remove_items),
+            errors, 'id', model)
+        related = {}
+        for name, field in input_cls._meta.fields.items():
+            if name != 'id' and field.type == graphene.ID:
+                related_model = model._meta.get_field(name).related_model
+                related[name] = cls.resolve_global_ids(
+                    [item[name] for item in input if item.get(name)], errors, name, related_model)
+        if cls.parent_field:
+            cls.clean_parents(input, existing, related.get(cls.parent_field, {}), errors)
+        if errors:
+            return [], errors
+
+        rows = []
+        for item in input:
+            instance = existing.get(item.get('id')) or model()
+            original = None
+            if instance.pk:
+                original = {
+                    field.attname: get_field_value(instance, field)
+                    for field in model._meta.concrete_fields
+                }
+            data = {key: value for key, value in item.items() if key != 'id' and key not in related}
+            cleaned_input = cls.clean_input(info, instance, data, errors, input_cls)
+            for name, nodes in related.items():
+                if name in item:
+                    cleaned_input[name] = nodes.get(item[name])
+            instance = cls.construct_instance(instance, cleaned_input)
+            if cleaned_input.get('sort_order') is not None:
+                instance.sort_order = cleaned_input['sort_order']
+            # Related rows are resolved above, unique constraints are left to the database
+            cls.clean_instance(instance, errors, exclude=list(related), validate_unique=False)
+            rows.append((instance, cleaned_input, original))
+        remove = [existing[global_id] for global_id in remove_items]
+        if errors:
+            return [], errors
+
+        cls.save_collection(info, rows, remove)
+        return [instance for instance, _, _ in rows], errors
+
+    @classmethod
+    def clean_parents(cls, input, existing, parents, errors):
+        """Drop and report rows of `existing` whose parent differs from the
+        parent of their item, or, when the input names parents, is not one of
+        them. Calls only removing rows name no parent and keep any row."""
+        attname = cls._meta.model._meta.get_field(cls.parent_field).attname
+        parent_ids = {parent.pk for parent in parents.values()}
+        item_parents = {
+            item['id']: parents.get(item.get(cls.parent_field))
+            for item in input if item.get('id')
+        }
+        for global_id, instance in list(existing.items()):
+            parent_id = getattr(instance, attname)
+            item_parent = item_parents.get(global_id)
+            if (parent_ids and parent_id not in parent_ids) or (
+                    item_parent and item_parent.pk != parent_id):
+                del existing[global_id]
+                cls.add_error(
+                    errors, 'id', '%s does not belong to the given %s.' % (
+                        global_id, cls.parent_field))
+
+    @classmethod
+    def assign_sort_order(cls, instances):
+        """Append new rows without a sort order after the rows of their parent"""
+        model = cls._meta.model
+        instances = [instance for instance in instances if instance.sort_order is None]
+        if not instances or not cls.parent_field or not issubclass(model, SortableModel):
+            return
+        attname = model._meta.get_field(cls.parent_field).attname
+        parent_ids = {getattr(instance, attname) for instance in instances}
+        last = dict(
+            model.objects.filter(**{'%s__in' % attname: parent_ids})
+            .values_list(attname).annotate(Max('sort_order')).order_by())
+        for instance in instances:
+            parent_id = getattr(instance, attname)
+            sort_order = last.get(parent_id)
+            instance.sort_order = 0 if sort_order is None else sort_order + 1
+            last[parent_id] = instance.sort_order
+
+    @classmethod
+    def save_collection(cls, info, rows, remove):
+        """Write the cleaned rows with one insert and one update, removed
+        rows with one delete"""
+        model = cls._meta.model
+        has_history = hasattr(model, 'history')
+        now = timezone.now()
+        created, updated, update_fields = [], [], set()
+        for instance, cleaned_input, original in rows:
+            if original is None:
+                created.append(instance)
+            else:
+                changed = get_changed_fields(instance, original)
+                if changed:
+                    updated.append(instance)
+                    update_fields.update(changed)
+
+        if created:
+            cls.assign_sort_order(created)
+            model.objects.bulk_create(created)
+            if has_history:
+                bulk_history_update(model, created, now, '+')
+
+        if updated:
+            fields = [
+                field for field in model._meta.concrete_fields
+                if field.name in update_fields or getattr(field, 'auto_now', False)
+            ]
+            for instance in updated:
+                # Sets auto_now values and stores new uploads
+                for field in fields:
+                    setattr(instance, field.attname, field.pre_save(instance, False))
+            model.objects.bulk_update(updated, [field.name for field in fields])
+            if has_history:
+                bulk_history_update(model, updated, now)
+
+        if remove:
+            model.objects.filter(pk__in=[instance.pk for instance in remove]).delete()
+
+
 class BaseBulkMutation(BaseMutation):
     count = graphene.Int(
         required=True, description="Returns how many objects were affected."
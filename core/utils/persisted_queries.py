@@ -0,0 +1,182 @@
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from graphql.backend.base import GraphQLDocument
+from graphql.backend.core import GraphQLCoreBackend
+from graphql.error import GraphQLError
+from graphql.execution import ExecutionResult, execute
+from graphql.language.parser import parse
+from graphql.validation import validate
+
+from .memcached import client
+
+MODE_DISABLED = 'disabled'
+MODE_AUTOMATIC = 'automatic'
+MODE_STRICT = 'strict'
+
+DEFAULT_SETTINGS = {
+    # disabled: ignore ids, automatic: register unknown queries by hash,
+    # strict: only execute queries found in the manifest or registry
+    'MODE': MODE_AUTOMATIC,
+    # JSON file of {sha256 hash: query} used as allow-list
+    'MANIFEST': None,
+    'DOCUMENT_CACHE_SIZE': 500,
+    'QUERY_CACHE_SIZE': 2000,
+}
+
+
+def get_setting(name):
+    options = getattr(settings, 'PERSISTED_QUERIES', None) or {}
+    return options.get(name, DEFAULT_SETTINGS[name])
+
+
+def get_query_hash(query):
+    return hashlib.sha256(query.encode('utf-8')).hexdigest()
+
+
+class LRUCache:
+    """Small thread safe least recently used cache"""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            value = self.items.get(key)
+            if value is not None:
+                self.items.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+class PersistedQueryRegistry:
+    """Maps query hashes to query text.
+    Lookups go through the allow-list manifest, a process local cache and
+    finally memcached, where automatically registered queries are shared
+    between processes."""
+    cache_prefix = 'persisted_query_'
+
+    def __init__(self):
+        self._manifest = None
+        self._queries = LRUCache(get_setting('QUERY_CACHE_SIZE'))
+        self._lock = threading.Lock()
+
+    @property
+    def manifest(self):
+        if self._manifest is None:
+            with self._lock:
+                if self._manifest is None:
+                    self._manifest = self.load_manifest()
+        return self._manifest
+
+    def load_manifest(self):
+        path = get_setting('MANIFEST')
+        if not path:
+            return {}
+        with open(path) as manifest_file:
+            return json.load(manifest_file)
+
+    def get(self, query_hash):
+        query = self.manifest.get(query_hash)
+        if query is not None:
+            return query
+        query = self._queries.get(query_hash)
+        if query is not None:
+            return query
+        if get_setting('MODE') == MODE_STRICT:
+            return None
+        stored = client.get(self.cache_prefix + query_hash)
+        if stored:
+            query = stored['query']
+            self._queries.set(query_hash, query)
+        return query
+
+    def register(self, query_hash, query):
+        if self.get(query_hash) is not None:
+            return
+        client.set(self.cache_prefix + query_hash, {'query': query})
+        self._queries.set(query_hash, query)
+
+    def resolve(self, query, query_id):
+        """Return the query text to execute for a request, registering new
+        queries in automatic mode and rejecting unknown ones in strict mode."""
+        mode = get_setting('MODE')
+        if mode == MODE_DISABLED:
+            return query
+
+        if query:
+            query_hash = get_query_hash(query)
+            if query_id and query_id != query_hash:
+                raise GraphQLError('Provided id does not match the query hash.')
+            if mode == MODE_STRICT:
+                if self.get(query_hash) is None:
+                    raise GraphQLError('Only persisted queries are allowed.')
+            elif query_id:
+                self.register(query_hash, query)
+            return query
+
+        if not query_id:
+            return query
+        stored = self.get(query_id)
+        if stored is None:
+            raise GraphQLError('PersistedQueryNotFound')
+        return stored
+
+
+registry = PersistedQueryRegistry()
+
+
+def invalid_document_executor(errors, *args, **kwargs):
+    return ExecutionResult(errors=errors, invalid=True)
+
+
+class DocumentCacheBackend(GraphQLCoreBackend):
+    """GraphQL backend keeping parsed and validated documents in an LRU cache
+    keyed by the query hash, so repeated operations skip parsing and
+    validation entirely."""
+
+    def __init__(self, executor=None, cache_size=None):
+        super().__init__(executor)
+        self.documents = LRUCache(cache_size or get_setting('DOCUMENT_CACHE_SIZE'))
+
+    def document_from_string(self, schema, document_string):
+        if not isinstance(document_string, str):
+            return super().document_from_string(schema, document_string)
+
+        key = get_query_hash(document_string)
+        document = self.documents.get(key)
+        if document is not None and document.schema is schema:
+            return document
+
+        document_ast = parse(document_string)
+        errors = validate(schema, document_ast)
+        if errors:
+            return GraphQLDocument(
+                schema=schema,
+                document_string=document_string,
+                document_ast=document_ast,
+                execute=partial(invalid_document_executor, errors))
+
+        document = GraphQLDocument(
+            schema=schema,
+            document_string=document_string,
+            document_ast=document_ast,
+            execute=partial(execute, schema, document_ast, **self.execute_params))
+        self.documents.set(key, document)
+        return document
@@ -0,0 +1,97 @@
+import json
+import threading
+from collections import OrderedDict
+from functools import partial
+
+from django.db import transaction
+
+_pending = threading.local()
+
+
+def get_key(value):
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class SideEffects:
+    """Work deferred until the transaction commits. Items added under the
+    same key are deduplicated and handed to their function in one call."""
+
+    def __init__(self):
+        self.batches = OrderedDict()
+
+    def __bool__(self):
+        return bool(self.batches)
+
+    def add_batch(self, key, func, items):
+        batch = self.batches.setdefault(key, (func, OrderedDict()))[1]
+        for item in items:
+            batch.setdefault(get_key(item), item)
+
+    def update(self, other):
+        for key, (func, items) in other.batches.items():
+            self.add_batch(key, func, items.values())
+
+    def send(self):
+        for func, items in self.batches.values():
+            if items:
+                func(list(items.values()))
+
+
+def commit_side_effects(side_effects):
+    """Commit callback of the collector of a savepoint, which Django drops
+    when the savepoint rolls back"""
+    _pending.committed.update(side_effects)
+
+
+def flush_side_effects():
+    committed = _pending.committed
+    _pending.committed = None
+    _pending.savepoints = None
+    if committed:
+        committed.send()
+
+
+def get_side_effects():
+    """Collector of the current savepoint, None in autocommit mode. Items of
+    rolled back savepoints are never sent, the others are merged and sent
+    together once the transaction commits."""
+    connection = transaction.get_connection()
+    if not connection.in_atomic_block:
+        return None
+    # A rolled back transaction drops the flush along with every collector
+    if not any(func is flush_side_effects for _, func in connection.run_on_commit):
+        _pending.savepoints = {}
+        _pending.committed = SideEffects()
+    key = tuple(connection.savepoint_ids)
+    side_effects = _pending.savepoints.get(key)
+    if side_effects is None:
+        side_effects = _pending.savepoints[key] = SideEffects()
+        transaction.on_commit(partial(commit_side_effects, side_effects))
+        # The flush stays last, after the collectors of every savepoint, and
+        # outside of them so no savepoint rollback drops it
+        connection.run_on_commit = [
+            (sids, func) for sids, func in connection.run_on_commit
+            if func is not flush_side_effects
+        ]
+        connection.run_on_commit.append((set(), flush_side_effects))
+    return side_effects
+
+
+def defer_items(func, items, key=None):
+    """Call `func` with a list of `items` once the current transaction
+    commits, together with the items of other calls under the same key.
+    Outside a transaction `func` is called at once."""
+    items = list(items)
+    if not items:
+        return
+    side_effects = get_side_effects()
+    if side_effects is None:
+        func(items)
+    else:
+        side_effects.add_batch(key or func, func, items)
+
+
+def defer_batch(task, items):
+    """Send `items` to `task`, which takes a list, once the current
+    transaction commits, together with the items of other calls"""
+    defer_items(task.delay, items, key=task.name)
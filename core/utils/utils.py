@@ -9,6 +9,7 @@ from django.db.models import Q, QuerySet
 import graphene
 from graphene_django.registry import get_global_registry
 from graphql.error import GraphQLError
+from graphql.execution import ExecutionResult
 from graphql_relay import from_global_id
 from graphene_django.views import HttpError
 from graphene_sentry.views import SentryGraphQLView
@@ -18,60 +19,150 @@ from PIL import ImageDraw
 
 from core.enums.grapheneEnum import ReportingPeriod
 from core.types.sort_input import SortInputObjectType
+from core.utils.db_search import is_searchable, search_queryset
+from core.utils.persisted_queries import registry as persisted_queries
 from refs.models import Country
 
 registry = get_global_registry()
 
 class CustomGraphQlView(SentryGraphQLView):
+    """GraphQL view supporting multipart uploads, persisted queries and
+    batched operations.
+    All operations of a batch run against the same request object, so they
+    share the authenticated user and the data loaders, which are reset after
+    a mutation."""
+
+    def parse_body(self, request):
+        content_type = self.get_content_type(request)
+        if content_type == "application/json":
+            body = request.body.decode("utf-8")
+            try:
+                request_json = json.loads(body)
+            except Exception:
+                raise HttpError(HttpResponseBadRequest("POST body sent invalid JSON."))
+            if isinstance(request_json, list):
+                if not request_json:
+                    raise HttpError(HttpResponseBadRequest("Received an empty list in the batch request."))
+                return request_json
+            if not isinstance(request_json, dict):
+                raise HttpError(HttpResponseBadRequest("The received data is not a valid JSON query."))
+            return request_json
+        return super().parse_body(request)
+
+    def get_response(self, request, data, show_graphiql=False):
+        params = self.get_graphql_params(request, data)
+
+        if isinstance(params, list):
+            responses = []
+            for operation_params in params:
+                responses.append(
+                    self.get_operation_response(request, data, operation_params, batch=True))
+            result = self.json_encode(
+                request, [response for response, _ in responses], pretty=show_graphiql)
+            status_code = max(status_code for _, status_code in responses)
+            return result, status_code
+
+        response, status_code = self.get_operation_response(
+            request, data, params, show_graphiql, batch=self.batch)
+        if response is None:
+            return None, status_code
+        return self.json_encode(request, response, pretty=show_graphiql), status_code
+
+    def get_operation_response(self, request, data, params, show_graphiql=False, batch=False):
+        query, variables, operation_name, id = params
+
+        try:
+            query = persisted_queries.resolve(query, id)
+        except GraphQLError as e:
+            execution_result = ExecutionResult(errors=[e])
+        else:
+            execution_result = self.execute_graphql_request(
+                request, data, query, variables, operation_name, show_graphiql)
+            if batch and self.is_mutation(request, query, operation_name):
+                # Loaders cache rows, operations following a mutation must
+                # not read the rows loaded before it
+                request.dataloaders = {}
+
+        status_code = 200
+        if not execution_result:
+            return None, status_code
+
+        response = {}
+        if execution_result.errors:
+            response["errors"] = [
+                self.format_error(e) for e in execution_result.errors]
+
+        if execution_result.invalid:
+            status_code = 400
+        else:
+            response["data"] = execution_result.data
+
+        if batch:
+            response["id"] = id
+            response["status"] = status_code
+        return response, status_code
+
+    def is_mutation(self, request, query, operation_name):
+        """Whether an operation is a mutation, from the cached document"""
+        try:
+            document = self.get_backend(request).document_from_string(self.schema, query)
+            return document.get_operation_type(operation_name) == 'mutation'
+        except Exception:
+            return False
+
+    @staticmethod
+    def load_json(value, message):
+        if value and isinstance(value, six.text_type):
+            try:
+                return json.loads(value)
+            except Exception:
+                raise HttpError(HttpResponseBadRequest(message))
+        return value
+
+    @staticmethod
+    def get_operation_params(operation, map=None, keyword='variables'):
+        if not isinstance(operation, dict):
+            raise HttpError(HttpResponseBadRequest("Operations are invalid JSON."))
+        query = operation.get("query")
+        id = operation.get("id")
+        operation_name = operation.get("operationName")
+        variables = CustomGraphQlView.load_json(
+            operation.get("variables"), "Variables are invalid JSON.")
+
+        if map:
+            variables = parse(variables, map, keyword)
+
+        if operation_name == "null":
+            operation_name = None
+
+        return query, variables, operation_name, id
 
     @staticmethod
     def get_graphql_params(request, data):
+        """Return (query, variables, operation name, id) for a single operation
+        or a list of them for a batch."""
+        if isinstance(data, list):
+            return [CustomGraphQlView.get_operation_params(entry) for entry in data]
+
         operations = request.GET.get("operations") or data.get("operations")
         if operations:
-            if isinstance(operations, six.text_type):
-                try:
-                    operations = json.loads(operations)
-                except Exception:
-                    raise HttpError(HttpResponseBadRequest("Operations are invalid JSON."))
+            operations = CustomGraphQlView.load_json(operations, "Operations are invalid JSON.")
+            map = CustomGraphQlView.load_json(data.get('map'), "Map are invalid JSON.")
 
             if isinstance(operations, list):
-                pass
-            else:
-                query = operations.get("query")
-                variables = operations.get("variables")
-                id = operations.get("id")
-                map = data.get('map')
-                operation_name = operations.get("operationName")
-
-                if variables and isinstance(variables, six.text_type):
-                    try:
-                        variables = json.loads(variables)
-                    except Exception:
-                        raise HttpError(HttpResponseBadRequest("Variables are invalid JSON."))
-
-                if map:
-                    if isinstance(map, six.text_type):
-                        try:
-                            map = json.loads(map)
-                        except Exception:
-                            raise HttpError(HttpResponseBadRequest("Map are invalid JSON."))
-
-                    variables = parse(variables, map, 'variables')
-
-            if operation_name == "null":
-                operation_name = None
-
-            return query, variables, operation_name, id
+                # Multipart batch, map paths are prefixed with the operation index
+                return [
+                    CustomGraphQlView.get_operation_params(
+                        operation, map, generateKeyword(str(index), 'variables'))
+                    for index, operation in enumerate(operations)
+                ]
+            return CustomGraphQlView.get_operation_params(operations, map)
         else:
             query = request.GET.get("query") or data.get("query")
             variables = request.GET.get("variables") or data.get("variables")
             id = request.GET.get("id") or data.get("id")
 
-            if variables and isinstance(variables, six.text_type):
-                try:
-                    variables = json.loads(variables)
-                except Exception:
-                    raise HttpError(HttpResponseBadRequest("Variables are invalid JSON."))
+            variables = CustomGraphQlView.load_json(variables, "Variables are invalid JSON.")
 
             operation_name = request.GET.get("operationName") or data.get("operationName")
             if operation_name == "null":
@@ -287,7 +378,11 @@ def filter_by_query_param(queryset, query, search_fields):
     queryset - queryset to be filtered
     query - search string
     search_fields - fields considered in filtering
+    Models with a search vector use the indexed database search instead
+    when DB_SEARCH_ENABLED is set.
     """
+    if query and is_searchable(queryset.model):
+        return search_queryset(queryset, query)
     if query:
         query_by = {
             '{0}__{1}'.format(
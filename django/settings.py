@@ -63,6 +63,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'django.contrib.gis',
+    'django.contrib.postgres',
 
     'uom',
     'refs',
@@ -134,15 +135,22 @@ GRAPHENE = {
     ],
 }
 
-# SEARCH CONFIGURATION
-DB_SEARCH_ENABLED = DB_SEARCH_ENABLED
+# Persisted queries, see core/utils/persisted_queries.py
+PERSISTED_QUERIES = {
+    'MODE': os.environ.get('PERSISTED_QUERIES_MODE', 'automatic'),
+    'MANIFEST': os.environ.get('PERSISTED_QUERIES_MANIFEST'),
+    'DOCUMENT_CACHE_SIZE': 500,
+}
 
+# SEARCH CONFIGURATION
 # support deployment-dependant elastic enviroment variable
 # ES_URL = (
 #     os.environ.get('ELASTICSEARCH_URL')
 #     or os.environ.get('SEARCHBOX_URL')
 #     or os.environ.get('BONSAI_URL'))
 ES_URL = ES_URL
+# The indexed database search never replaces a configured Elasticsearch backend
+DB_SEARCH_ENABLED = DB_SEARCH_ENABLED and not ES_URL
 ENABLE_SEARCH = bool(ES_URL) or DB_SEARCH_ENABLED  # global search disabling
 SEARCH_BACKEND = 'search.backend.postgresql'
 
@@ -186,6 +194,9 @@ AUTHENTICATION_BACKENDS = [
 #Cache
 CACHES = CACHES
 
+# Connections with `estimated_count` use the query planner estimate above this many rows
+ESTIMATED_COUNT_THRESHOLD = 10000
+
 # Kafka channel
 LOGPIPE = LOGPIPE
 
@@ -233,6 +244,13 @@ VERSATILEIMAGEFIELD_RENDITION_KEY_SETS = {
     'background_images': [
         ('header_image', 'thumbnail__1080x440')]}
 
+# Rendition key set each image field is rendered with, fields missing here
+# are served as uploaded and get no renditions
+THUMBNAIL_FIELD_KEY_SETS = {
+    'default_image': 'default_image',
+    'image': 'products',
+    'media': 'products'}
+
 VERSATILEIMAGEFIELD_SETTINGS = {
     # Images should be pre-generated on Production environment
     'create_images_on_demand': get_bool_from_env(
@@ -299,6 +317,7 @@ CELERY_IMPORTS = (
     'content.utils.thumbnails',
     'developer.utils.thumbnails',
     'products.utils.thumbnails',
+    'products.tasks',
     'store.utils.thumbnails',
     'store_content.utils.thumbnails',
     'store_products.tasks'
@@ -22,10 +22,9 @@ from django.conf import settings
 from products.views import homeview
 from refs.views import image_view
 from core.utils.utils import CustomGraphQlView
+from core.utils.persisted_queries import DocumentCacheBackend
 
-from graphql.backend import GraphQLCoreBackend
-
-class GraphQLCustomCoreBackend(GraphQLCoreBackend):
+class GraphQLCustomCoreBackend(DocumentCacheBackend):
     def __init__(self, executor=None):
         # type: (Optional[Any]) -> None
         super().__init__(executor)
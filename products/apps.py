@@ -1,5 +1,39 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class ProductsConfig(AppConfig):
     name = 'products'
+
+    def ready(self):
+        from core.custom.translations import connect_signals as connect_translation_signals
+        from core.models import status_changed
+        from core.utils.db_search import update_search_vector_receiver
+        from .models import Attribute, Brand, Category, Department, ProductMaster, ProductTemplate
+        from .utils.autocomplete import AUTOCOMPLETE_SENDERS, autocomplete_receiver
+        from .utils.barcodes import barcode_receiver
+        from .utils.category_tree import invalidate_category_tree
+        from .utils.listing import LISTING_SENDERS, refresh_listings_receiver
+
+        connect_translation_signals()
+
+        post_save.connect(invalidate_category_tree, sender=Category)
+        post_delete.connect(invalidate_category_tree, sender=Category)
+        status_changed.connect(invalidate_category_tree, sender=Category)
+
+        for sender in LISTING_SENDERS:
+            post_save.connect(refresh_listings_receiver, sender=sender)
+            post_delete.connect(refresh_listings_receiver, sender=sender)
+            status_changed.connect(refresh_listings_receiver, sender=sender)
+
+        # Master vectors include the template name, they are updated with the listing rows
+        for sender in (Attribute, Brand, Category, Department, ProductTemplate):
+            post_save.connect(update_search_vector_receiver, sender=sender)
+
+        for sender in AUTOCOMPLETE_SENDERS:
+            post_save.connect(autocomplete_receiver, sender=sender)
+            post_delete.connect(autocomplete_receiver, sender=sender)
+            status_changed.connect(autocomplete_receiver, sender=sender)
+
+        post_save.connect(barcode_receiver, sender=ProductMaster)
+        status_changed.connect(barcode_receiver, sender=ProductMaster)
@@ -0,0 +1,97 @@
+import graphene
+
+from .models import Category, ProductTemplate
+
+# Hot catalog operations replayed by the benchmark_graphql command.
+# `budget` is the maximum number of SQL queries a single execution may run.
+OPERATIONS = [
+    {
+        'name': 'templates',
+        'query': '''
+            query Templates($first: Int) {
+              templates(first: $first) {
+                totalCount
+                edges { node { id name code departments { id name } } }
+              }
+            }''',
+        'variables': {'first': 20},
+        'budget': 8,
+    },
+    {
+        'name': 'productMasters',
+        'query': '''
+            query ProductMasters($first: Int) {
+              productMasters(first: $first) {
+                edges {
+                  node {
+                    id name code barcode
+                    categories { id name }
+                    brands { id name }
+                    departments { id name }
+                  }
+                }
+              }
+            }''',
+        'variables': {'first': 20},
+        'budget': 10,
+    },
+    {
+        'name': 'categories',
+        'query': '''
+            query Categories($first: Int, $level: Int) {
+              categories(first: $first, level: $level) {
+                totalCount
+                edges { node { id name code } }
+              }
+            }''',
+        'variables': {'first': 50, 'level': 1},
+        'budget': 6,
+    },
+    {
+        'name': 'searchProducts',
+        'query': '''
+            query SearchProducts($query: String, $first: Int) {
+              searchProducts(query: $query, first: $first) {
+                edges { node { id name code } }
+              }
+            }''',
+        'variables': {'query': 'organic', 'first': 20},
+        'budget': 8,
+    },
+    {
+        'name': 'updateProductMaster',
+        'query': '''
+            mutation UpdateProductMaster($input: ProductMasterListInput) {
+              updateProductMaster(input: $input) {
+                productMasters { id code }
+                errors { field message }
+              }
+            }''',
+        'variables': {
+            'input': {
+                'items': [
+                    {
+                        'productTemplate': '{template_id}',
+                        'name': 'Benchmark {iteration} variant %s' % index,
+                    }
+                    for index in range(10)
+                ]
+            }
+        },
+        'budget': 150,
+    },
+]
+
+
+def get_placeholders():
+    """Values for `{name}` placeholders of operation variables, picked from
+    the generated catalog"""
+    placeholders = {}
+    # Simple templates accept masters without attribute values
+    template = ProductTemplate.objects.filter(attributes__isnull=True).order_by('pk').first()
+    if template:
+        placeholders['template_id'] = graphene.Node.to_global_id('ProductTemplate', template.pk)
+    category = Category.objects.order_by('pk').first()
+    if category:
+        placeholders['category_id'] = graphene.Node.to_global_id('Category', category.pk)
+    return placeholders
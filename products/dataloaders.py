@@ -0,0 +1,76 @@
+from core.enums.enum import Status
+from core.utils.dataloaders import DataLoader, group_by_key
+from store_products import models as store_product_model
+from . import models
+
+
+class CategoriesByTemplateIdLoader(DataLoader):
+    context_key = "categories_by_template_id"
+
+    def batch_load(self, keys):
+        relations = models.ProductCategoryRelation.objects.filter(
+            product_template_id__in=keys
+        ).exclude(
+            category__status=Status.DELETED.value
+        ).select_related('category').order_by('id')
+        return group_by_key(
+            relations, keys,
+            lambda relation: relation.product_template_id,
+            lambda relation: relation.category)
+
+
+class DepartmentsByTemplateIdLoader(DataLoader):
+    context_key = "departments_by_template_id"
+
+    def batch_load(self, keys):
+        relations = models.ProductCategoryRelation.objects.filter(
+            product_template_id__in=keys,
+            category__department__isnull=False
+        ).exclude(
+            category__department__status=Status.DELETED.value
+        ).select_related('category__department').order_by('id')
+        return group_by_key(
+            relations, keys,
+            lambda relation: relation.product_template_id,
+            lambda relation: relation.category.department)
+
+
+class BrandsByTemplateIdLoader(DataLoader):
+    context_key = "brands_by_template_id"
+
+    def batch_load(self, keys):
+        relations = models.ProductBrandRelation.objects.filter(
+            product_template_id__in=keys
+        ).exclude(
+            brand__status=Status.DELETED.value
+        ).select_related('brand').order_by('id')
+        return group_by_key(
+            relations, keys,
+            lambda relation: relation.product_template_id,
+            lambda relation: relation.brand)
+
+
+class UnitByTemplateIdLoader(DataLoader):
+    context_key = "unit_by_template_id"
+
+    def batch_load(self, keys):
+        templates = models.ProductTemplate.all_objects.filter(
+            pk__in=keys).select_related('uom')
+        units = {template.pk: template.uom for template in templates}
+        return [units.get(key) for key in keys]
+
+
+class StoreProductByStoreAndMasterIdLoader(DataLoader):
+    """Loads store products by (store id, product master id) keys"""
+    context_key = "store_product_by_store_and_master_id"
+
+    def batch_load(self, keys):
+        store_ids = {store_id for store_id, _ in keys}
+        master_ids = {master_id for _, master_id in keys}
+        store_products = store_product_model.StoreProduct.all_objects.filter(
+            store__in=store_ids, product_master__in=master_ids)
+        store_products = {
+            (store_product.store_id, store_product.product_master_id): store_product
+            for store_product in store_products
+        }
+        return [store_products.get(key) for key in keys]
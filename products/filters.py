@@ -43,10 +43,10 @@ def brand_filter_by_categories(qs, _, value):
 
 
 class TemplateFilter(django_filters.FilterSet):
-    categories = GlobalIDMultipleChoiceFilter()
-    brands = GlobalIDMultipleChoiceFilter()
-    departments = GlobalIDMultipleChoiceFilter()
-    search = django_filters.CharFilter()
+    categories = GlobalIDMultipleChoiceFilter(method=template_filter_by_categories)
+    brands = GlobalIDMultipleChoiceFilter(method=template_filter_by_brands)
+    departments = GlobalIDMultipleChoiceFilter(method=template_filter_by_departments)
+    search = django_filters.CharFilter(method=template_filter_search)
 
     class Meta:
         model = ProductTemplate
@@ -57,10 +57,10 @@ class TemplateFilter(django_filters.FilterSet):
         ]
 
 class MasterFilter(django_filters.FilterSet):
-    categories = GlobalIDMultipleChoiceFilter()
-    brands = GlobalIDMultipleChoiceFilter()
-    departments = GlobalIDMultipleChoiceFilter()
-    search = django_filters.CharFilter()
+    categories = GlobalIDMultipleChoiceFilter(method=master_filter_by_categories)
+    brands = GlobalIDMultipleChoiceFilter(method=master_filter_by_brands)
+    departments = GlobalIDMultipleChoiceFilter(method=master_filter_by_departments)
+    search = django_filters.CharFilter(method=master_filter_search)
 
     class Meta:
         model = ProductMaster
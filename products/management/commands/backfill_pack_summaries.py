@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+
+from core.enums.enum import ProductPackingType
+from products.models import ProductMaster
+from products.utils.packs import refresh_pack_summaries
+
+
+class Command(BaseCommand):
+    help = 'Computes the pack summary of every pack and combo product master'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--missing', action='store_true',
+            help='Only masters without a computed summary')
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        masters = ProductMaster.all_objects.exclude(packing_type=ProductPackingType.SINGLE.value)
+        if options['missing']:
+            masters = masters.filter(pack_summary__isnull=True)
+        master_ids = list(masters.order_by('pk').values_list('pk', flat=True))
+        changed = 0
+        for start in range(0, len(master_ids), chunk_size):
+            changed += refresh_pack_summaries(master_ids[start:start + chunk_size])
+        self.stdout.write('%s of %s pack summaries updated' % (changed, len(master_ids)))
@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from products.utils.generator import CatalogGenerator
+
+
+class Command(BaseCommand):
+    help = 'Generates a synthetic product catalog for benchmarks'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--departments', type=int, default=5)
+        parser.add_argument(
+            '--categories', type=int, default=4,
+            help='Child categories per category node')
+        parser.add_argument('--depth', type=int, default=3, help='Levels of the category tree')
+        parser.add_argument('--brands', type=int, default=50)
+        parser.add_argument('--attributes', type=int, default=6)
+        parser.add_argument('--values', type=int, default=5, help='Values per attribute')
+        parser.add_argument('--templates', type=int, default=1000)
+        parser.add_argument('--masters', type=int, default=3, help='Masters per template')
+        parser.add_argument(
+            '--languages', default='ar',
+            help='Comma separated language codes of the translations')
+        parser.add_argument('--media', type=int, default=1, help='Images per template and master')
+        parser.add_argument('--seed', type=int, help='Random seed for a repeatable catalog')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        generator = CatalogGenerator(
+            departments=options['departments'],
+            categories=options['categories'],
+            depth=options['depth'],
+            brands=options['brands'],
+            attributes=options['attributes'],
+            values=options['values'],
+            templates=options['templates'],
+            masters=options['masters'],
+            languages=[code for code in options['languages'].split(',') if code],
+            media=options['media'],
+            seed=options['seed'],
+            chunk_size=options['chunk_size'])
+        counts = generator.run()
+        for name, count in counts.items():
+            self.stdout.write('%s: %s' % (name, count))
@@ -0,0 +1,45 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.enums.enum import ImportFormat
+from products.models import CatalogImport
+from products.tasks import import_catalog_file
+from products.utils.importer import DEFAULT_CHUNK_SIZE, CatalogImporter
+
+
+class Command(BaseCommand):
+    help = 'Imports product templates and masters from a JSONL or CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='Path of the JSONL or CSV file')
+        parser.add_argument(
+            '--format', choices=[item.value for item in ImportFormat],
+            help='File format, guessed from the file extension by default')
+        parser.add_argument(
+            '--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE,
+            help='Number of rows written per transaction')
+        parser.add_argument(
+            '--async', action='store_true', dest='run_async',
+            help='Queue the import as a celery task')
+
+    def handle(self, *args, **options):
+        file = os.path.abspath(options['file'])
+        if not os.path.isfile(file):
+            raise CommandError('File %s does not exist' % file)
+        file_format = options['format']
+        if not file_format:
+            extension = os.path.splitext(file)[1].lstrip('.').upper()
+            file_format = ImportFormat.CSV.value if extension == 'CSV' else ImportFormat.JSONL.value
+
+        catalog_import = CatalogImport.objects.create(file=file, file_format=file_format)
+        if options['run_async']:
+            import_catalog_file.delay(catalog_import.pk, options['chunk_size'])
+            self.stdout.write('Queued catalog import %s' % catalog_import.pk)
+            return
+
+        catalog_import = CatalogImporter(catalog_import, options['chunk_size']).run()
+        self.stdout.write(
+            'Catalog import %s: %s rows processed, %s imported, %s failed' % (
+                catalog_import.pk, catalog_import.processed_rows,
+                catalog_import.imported_rows, catalog_import.failed_rows))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from products.models import ProductMaster
+from products.utils.listing import BATCH_SIZE, refresh_listings
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the listing rows of every product master'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=BATCH_SIZE * 4)
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        master_ids = list(ProductMaster.all_objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(master_ids), chunk_size):
+            refresh_listings(master_ids[start:start + chunk_size])
+            self.stdout.write('%s / %s' % (min(start + chunk_size, len(master_ids)), len(master_ids)))
@@ -0,0 +1,30 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from versatileimagefield.fields import VersatileImageField
+
+from core.custom.thumbnails import DEFAULT_WORKERS, ThumbnailWarmer
+
+
+class Command(BaseCommand):
+    help = 'Creates the missing renditions of every image of the products app'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+        parser.add_argument(
+            '--model', action='append', dest='models',
+            help='app_label.ModelName to warm, all products models by default')
+
+    def handle(self, *args, **options):
+        if options['models']:
+            models = [apps.get_model(label) for label in options['models']]
+        else:
+            models = apps.get_app_config('products').get_models()
+
+        warmer = ThumbnailWarmer(workers=options['workers'])
+        for model in models:
+            for field in model._meta.concrete_fields:
+                if isinstance(field, VersatileImageField):
+                    warmer.add_queryset(model._base_manager.all(), field.attname)
+        self.stdout.write('%s images' % len(warmer))
+        created, failed = warmer.warm()
+        self.stdout.write('%s thumbnails created, %s failed' % (created, len(failed)))
@@ -1,3 +1,6 @@
+from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector
 from django.db import models
 from versatileimagefield.fields import PPOIField, VersatileImageField
 from mptt.managers import TreeManager
@@ -7,11 +10,14 @@ from simple_history import register
 from uom.models import UOM
 from core.models import (
     BaseModel,
+    CoreModel,
     SoftDeleteHistoryModel,
     SoftDeleteManager,
     SoftDeleteModel,
     SortableModel,
-    ExportModel
+    ExportModel,
+    SearchVectorModel,
+    SEARCH_CONFIG
 )
 from search.models import SeoModel
 from refs.models import (
@@ -34,7 +40,9 @@ from core.enums.enum import (
     Priority,
     Direction,
     UserType,
-    Status
+    Status,
+    ImportStatus,
+    ImportFormat
 )
 from manufacture.models import (
     ManufactureBranch,
@@ -73,7 +81,7 @@ class AttributeGroupItem(BaseModel):
         return self.name
 
 
-class Attribute(BaseModel):
+class Attribute(BaseModel, SearchVectorModel):
     """Attribute is help to define variants of a product template
     For example Color of a product (iPhone6 have multiple colors)
     All the attributes are categorised into attribute group General"""
@@ -89,6 +97,14 @@ class Attribute(BaseModel):
         related_name='attributes',
         on_delete=models.SET_NULL, null=True, blank=True)
 
+    search_vector_fields = (('name', 'A'), ('slug', 'B'))
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='attribute_search_idx'),
+            GinIndex(fields=['name'], name='attribute_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -106,7 +122,7 @@ class AttributeValue(BaseModel, SortableModel):
     def __str__(self):
         return self.name
 
-class Department(SeoModel, SoftDeleteHistoryModel, ExportModel):
+class Department(SeoModel, SoftDeleteHistoryModel, ExportModel, SearchVectorModel):
     """Department is the top level of the product tree
     Example grocery, home appliances, electronics"""
 
@@ -129,6 +145,14 @@ class Department(SeoModel, SoftDeleteHistoryModel, ExportModel):
         on_delete=models.SET_NULL, blank=True, null=True)
     status = models.CharField(max_length=10, choices=[(type.name, type.value) for type in Status])
 
+    search_vector_fields = (('name', 'A'), ('code', 'A'), ('slug', 'B'), ('note', 'C'))
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='department_search_idx'),
+            GinIndex(fields=['name'], name='department_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -149,7 +173,7 @@ class DepartmentTranslation(BaseModel):
         unique_together = (("language_code", "department"),)
 
 
-class Category(MPTTModel, SoftDeleteModel, SeoModel, ExportModel):
+class Category(MPTTModel, SoftDeleteModel, SeoModel, ExportModel, SearchVectorModel):
     """Category is second level in product tree
     example fruits, vegetables"""
     name = models.CharField(max_length=128)
@@ -185,6 +209,23 @@ class Category(MPTTModel, SoftDeleteModel, SeoModel, ExportModel):
     objects = SoftDeleteManager()
     tree = TreeManager()
 
+    search_vector_fields = (('name', 'A'), ('code', 'A'), ('slug', 'B'), ('note', 'C'))
+    search_vector_parent_field = 'parent'
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='category_search_idx'),
+            GinIndex(fields=['name'], name='category_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
+    @classmethod
+    def get_search_vector(cls):
+        # Categories are also found by the name of their parent
+        parent_name = models.Subquery(Category.all_objects.filter(
+            pk=models.OuterRef('parent_id')).values('name')[:1])
+        return super().get_search_vector() + SearchVector(
+            parent_name, weight='B', config=SEARCH_CONFIG)
+
     def __str__(self):
         return self.name
 
@@ -226,7 +267,7 @@ class CategoryMedia(BaseModel, SortableModel):
         upload_to='category-images')
 
 
-class Brand(SoftDeleteHistoryModel, SeoModel, ExportModel):
+class Brand(SoftDeleteHistoryModel, SeoModel, ExportModel, SearchVectorModel):
     """Brand of a product like nike, adidas"""
     name = models.CharField(max_length=128)
     slug = models.CharField(max_length=128, unique=True)
@@ -242,6 +283,14 @@ class Brand(SoftDeleteHistoryModel, SeoModel, ExportModel):
     image_alt_text = models.CharField(max_length=32, null=True, blank=True)
     status = models.CharField(max_length=10, choices=[(type.name, type.value) for type in Status])
 
+    search_vector_fields = (('name', 'A'), ('code', 'A'), ('slug', 'B'), ('note', 'C'))
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='brand_search_idx'),
+            GinIndex(fields=['name'], name='brand_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -276,7 +325,7 @@ class BrandMedia(BaseModel, SortableModel):
         upload_to='brand-images')
 
 
-class ProductTemplate(SoftDeleteHistoryModel, SeoModel, ExportModel):
+class ProductTemplate(SoftDeleteHistoryModel, SeoModel, ExportModel, SearchVectorModel):
     """Product template is third level of product tree
     But in other way it is the first level of the product tree
     Every product start define from here
@@ -317,6 +366,15 @@ class ProductTemplate(SoftDeleteHistoryModel, SeoModel, ExportModel):
     background = models.CharField(max_length=128, null=True, blank=True)
     status = models.CharField(max_length=10, choices=[(type.name, type.value) for type in Status])
 
+    search_vector_fields = (
+        ('name', 'A'), ('code', 'A'), ('model', 'B'), ('slug', 'B'), ('description', 'C'))
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_template_search_idx'),
+            GinIndex(fields=['name'], name='product_template_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -361,13 +419,11 @@ class ProductCategoryRelation(SoftDeleteHistoryModel):
     status = models.CharField(max_length=10, choices=[(type.name, type.value) for type in Status],
                               default=Status.ACTIVE.value)
 
+    status_cascade_parents = ('product_template',)
+
     class Meta:
         unique_together = (("category", "product_template"),)
 
-    def change_status(self, status, **kwargs):
-        super().change_status(status, **kwargs)
-        self.product_template.change_status(status, **kwargs)
-
 
 class ProductBrandRelation(SoftDeleteHistoryModel):
     """A product template can have optional brand or multiple brand (in case of mixed pack)"""
@@ -609,12 +665,14 @@ class ProductTemplateManufacture(BaseModel):
         blank=True, null=True
     )
 
-class ProductMaster(MPTTModel, SoftDeleteModel, SeoModel, ExportModel):
+class ProductMaster(MPTTModel, SoftDeleteModel, SeoModel, ExportModel, SearchVectorModel):
     """Product master is all the variants and packs of the product master
     Inheriting description privacy, warranty etc. Option to overwrite"""
 
     name = models.CharField(max_length=128, null=True, blank=True)
     sub_name = models.CharField(max_length=128, null=True, blank=True)
+    # Computed from the pack items by products.utils.packs, None until computed
+    pack_summary = models.CharField(max_length=255, null=True, blank=True)
     slug = models.CharField(max_length=128, unique=True, null=True, blank=True)
     code = models.CharField(max_length=15, unique=True)
     product_template = models.ForeignKey(
@@ -652,6 +710,23 @@ class ProductMaster(MPTTModel, SoftDeleteModel, SeoModel, ExportModel):
     objects = SoftDeleteManager()
     tree = TreeManager()
 
+    search_vector_fields = (
+        ('name', 'A'), ('code', 'A'), ('barcode', 'A'), ('model', 'B'), ('description', 'C'))
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['search_vector'], name='product_master_search_idx'),
+            GinIndex(fields=['name'], name='product_master_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
+
+    @classmethod
+    def get_search_vector(cls):
+        # Masters without a name are listed by their template name
+        template_name = models.Subquery(ProductTemplate.all_objects.filter(
+            pk=models.OuterRef('product_template_id')).values('name')[:1])
+        return super().get_search_vector() + SearchVector(
+            template_name, weight='A', config=SEARCH_CONFIG)
+
     def __str__(self):
         if self.name == '' or not self.name:
             return self.product_template.name
@@ -663,24 +738,34 @@ class ProductMaster(MPTTModel, SoftDeleteModel, SeoModel, ExportModel):
         return self.product_template.default_image
 
     def get_sub_name(self):
-        value = ''
         if self.sub_name:
             return self.sub_name
         if self.packing_type != ProductPackingType.SINGLE.value:
-            items = self.product_master_pack_items.all()
-            i = 0
-            for item in items:
-                product_master = item.item
-                if product_master.name == '' or not product_master.name:
-                    name = product_master.product_template.name
-                else:
-                    name = product_master.name
-                value += str(int(item.qty)) + ' ' + name
-                if i != len(items)-1:
-                    value += ', '
-                i += 1
+            if self.pack_summary is not None:
+                return self.pack_summary
+            return self.format_pack_items(self.product_master_pack_items.all())
+        return ''
+
+    @staticmethod
+    def format_pack_items(items):
+        """Pack sub name like `2 Tea, 1 Mug` from pack items"""
+        value = ''
+        items = list(items)
+        for i, item in enumerate(items):
+            product_master = item.item
+            if product_master.name == '' or not product_master.name:
+                name = product_master.product_template.name
+            else:
+                name = product_master.name
+            value += str(int(item.qty)) + ' ' + name
+            if i != len(items)-1:
+                value += ', '
         return value
 
+    def get_listing(self):
+        """Listing row when loaded with select_related('listing'), None otherwise"""
+        return self._state.fields_cache.get('listing')
+
 register(ProductMaster)
 
 class ProductMasterTranslation(BaseModel):
@@ -801,6 +886,42 @@ class ProductMasterPacking(BaseModel):
         choices=[(time_type.name, time_type.value) for time_type in TimeType]
         , blank=True, null=True)
 
+class ProductMasterListing(models.Model):
+    """Flattened read model of a product master for listing queries.
+    Holds the resolved name, description, pack sub name and image with
+    template fallbacks, and the category, brand and department ids of the
+    template. Rows are rebuilt by products.utils.listing."""
+    product_master = models.OneToOneField(
+        ProductMaster,
+        related_name='listing',
+        primary_key=True,
+        on_delete=models.CASCADE)
+    product_template_id = models.IntegerField(blank=True, null=True, db_index=True)
+    code = models.CharField(max_length=15)
+    barcode = models.CharField(max_length=32, blank=True, null=True, db_index=True)
+    name = models.CharField(max_length=128, blank=True, null=True)
+    sort_name = models.CharField(max_length=128, db_index=True, default='')
+    description = models.TextField(blank=True, null=True)
+    sub_name = models.TextField(blank=True, default='')
+    image = VersatileImageField(
+        upload_to='product-master-images', null=True, blank=True)
+    unit_id = models.IntegerField(blank=True, null=True)
+    category_ids = ArrayField(models.IntegerField(), default=list)
+    brand_ids = ArrayField(models.IntegerField(), default=list)
+    department_ids = ArrayField(models.IntegerField(), default=list)
+    status = models.CharField(max_length=10, choices=[(type.name, type.value) for type in Status],
+                              default=Status.ACTIVE.value, db_index=True)
+    updated = models.DateTimeField(db_index=True)
+    refreshed = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            GinIndex(fields=['category_ids']),
+            GinIndex(fields=['brand_ids']),
+            GinIndex(fields=['department_ids']),
+        ]
+
+
 class ProductTemplateRelatedProduct(BaseModel, SortableModel):
     """Related products"""
     product_template = models.ForeignKey(
@@ -887,3 +1008,24 @@ class Product(BaseModel, SeoModel):
 #     ref_id = models.IntegerField()
 
 
+class CatalogImport(CoreModel):
+    """Progress of a bulk catalog import read from a JSONL or CSV file"""
+    file = models.CharField(max_length=255)
+    file_format = models.CharField(max_length=5, choices=[(type.name, type.value) for type in ImportFormat])
+    status = models.CharField(max_length=10, choices=[(type.name, type.value) for type in ImportStatus],
+                              default=ImportStatus.PENDING.value)
+    processed_rows = models.IntegerField(default=0)
+    imported_rows = models.IntegerField(default=0)
+    failed_rows = models.IntegerField(default=0)
+    note = models.TextField(blank=True, null=True)
+
+
+class CatalogImportError(CoreModel):
+    """A row of a catalog import which could not be imported"""
+    catalog_import = models.ForeignKey(
+        CatalogImport,
+        related_name='errors',
+        on_delete=models.CASCADE)
+    row = models.IntegerField()
+    field = models.CharField(max_length=64, blank=True, null=True)
+    message = models.TextField()
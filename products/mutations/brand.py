@@ -7,7 +7,7 @@ from core.types import Upload
 from core.utils.utils import clean_seo_fields
 from search.schema import SeoInput
 from core.enums.enum import UserType
-from ..utils.thumbnails import create_brand_default_thumbnails
+from ..utils.thumbnails import schedule_thumbnails
 from .. import models
 
 class BrandMediaInput(graphene.InputObjectType):
@@ -78,14 +78,9 @@ class BrandMixin:
     @classmethod
     def save(cls, info, instance, cleaned_input):
         instance.save()
-        if cleaned_input.get('icon'):
-            create_brand_default_thumbnails.delay(instance.pk, 'icon')
-
-        if cleaned_input.get('large_icon'):
-            create_brand_default_thumbnails.delay(instance.pk, 'large_icon')
-
-        if cleaned_input.get('default_image'):
-            create_brand_default_thumbnails.delay(instance.pk, 'default_image')
+        schedule_thumbnails(instance, *[
+            attr for attr in ('icon', 'large_icon', 'default_image')
+            if cleaned_input.get(attr)])
 
 
 class BrandCreate(BrandMixin, ModelMutation):
@@ -1,4 +1,5 @@
 from django.template.defaultfilters import slugify
+from django.db import Error as DBError
 import graphene
 
 from core.utils.decorators import permission_required, role_required
@@ -8,7 +9,8 @@ from core.utils.utils import clean_seo_fields
 from search.schema import SeoInput
 from core.enums.enum import UserType
 from core.enums.grapheneEnum import Maturity, Priority
-from ..utils.thumbnails import create_category_default_thumbnails
+from ..utils.codes import category_codes
+from ..utils.thumbnails import schedule_thumbnails
 from .. import models
 
 class CategoryInput(graphene.InputObjectType):
@@ -34,33 +36,22 @@ class CategoryMixin:
         if instance.pk:
             code = instance.code
         else:
-            category = models.Category.all_objects.last()
-            if category:
-                code = category.code
-                if 'C' in code:
-                    code = int(code.split('C')[1])
-                    code = code + 1
-                    code = 'C' + str(code)
-                else:
-                    cls.add_error(
-                        errors, 'code',
-                        'Category code could not generate.')
-            else:
-                code = 'C100000001'
+            try:
+                code = category_codes.next()
+            except DBError:
+                code = None
+                cls.add_error(
+                    errors, 'code',
+                    'Category code could not generate.')
         cleaned_input['code'] = code
         return cleaned_input
 
     @classmethod
     def save(cls, info, instance, cleaned_input):
         instance.save()
-        if cleaned_input.get('icon'):
-            create_category_default_thumbnails.delay(instance.pk, 'icon')
-
-        if cleaned_input.get('large_icon'):
-            create_category_default_thumbnails.delay(instance.pk, 'large_icon')
-
-        if cleaned_input.get('default_image'):
-            create_category_default_thumbnails.delay(instance.pk, 'default_image')
+        schedule_thumbnails(instance, *[
+            attr for attr in ('icon', 'large_icon', 'default_image')
+            if cleaned_input.get(attr)])
 
     @classmethod
     def clean_input(cls, info, instance, input, errors):
@@ -1,9 +1,20 @@
+import itertools
+from collections import defaultdict
+
 from django.template.defaultfilters import slugify
 from django.db import Error as DBError, transaction
+from django.utils import timezone
 import graphene
 
 from core.utils.decorators import permission_required, role_required
-from core.utils.mutations import ModelMutation, ModelStatusChangeMutation
+from core.models import bulk_history_update
+from core.utils.mutations import (
+    BaseMutation,
+    ModelCollectionMutation,
+    ModelMutation,
+    ModelStatusChangeMutation,
+    get_field_value
+)
 from core.types import Upload
 from core.utils.utils import validate_image_file, clean_seo_fields
 from search.schema import SeoInput
@@ -12,14 +23,15 @@ from core.enums.grapheneEnum import ProductPackingType
 from refs.types import Country
 from refs import models as refsModel
 from core.enums.enum import UserType, Status
-from ..utils.thumbnails import (
-    create_product_template_default_thumbnails,
-    create_product_template_addon_thumbnails,
-    create_product_template_thumbnails,
-    create_product_master_default_thumbnails,
-    create_product_master_thumbnails
-)
+from ..utils.autocomplete import schedule_autocomplete_update
+from ..utils.barcodes import get_barcode_index, lookup_barcodes, schedule_barcode_update
+from ..utils.listing import schedule_listing_refresh
+from ..utils.bulk import bulk_create, set_tree_roots
+from ..utils.codes import master_codes, template_codes
+from ..utils.masters import MasterBatch, bulk_save_masters, get_attribute_combinations
+from ..utils.thumbnails import schedule_thumbnails
 from ..types import (
+    BarcodeExist,
     ProductTemplate,
     Brand,
     Category,
@@ -44,6 +56,13 @@ from ..types import (
 )
 from .. import models
 
+# ID fields of a master input resolved by ProductMasterListUpdate.load_batch
+MASTER_ID_FIELDS = ('product_master', 'product_template', 'parent', 'weight_unit')
+# Largest number of combinations ProductMasterVariantsGenerate creates at once
+MAX_VARIANTS = 500
+# Largest number of barcodes CheckBarcodesExist checks at once
+MAX_BARCODES = 10000
+
 class CheckBarcodeExist(ModelMutation):
 
     exist = graphene.Boolean(description='Is barcode is existing')
@@ -57,6 +76,8 @@ class CheckBarcodeExist(ModelMutation):
 
     @classmethod
     def mutate(cls, root, info, barcode):
+        if not barcode or barcode not in get_barcode_index():
+            return CheckBarcodeExist(productMaster=None, exist=False)
         try:
             instance = models.ProductMaster.objects.get(barcode=barcode)
             return CheckBarcodeExist(productMaster=instance, exist=True)
@@ -64,6 +85,32 @@ class CheckBarcodeExist(ModelMutation):
             return CheckBarcodeExist(productMaster=None, exist=False)
 
 
+class CheckBarcodesExist(BaseMutation):
+
+    results = graphene.List(BarcodeExist, description='Result of every checked barcode')
+
+    class Arguments:
+        barcodes = graphene.List(graphene.String, required=True, description='Barcodes to check exist')
+
+    class Meta:
+        description = 'Check a list of barcodes exist'
+
+    @classmethod
+    def mutate(cls, root, info, barcodes):
+        errors = []
+        if len(barcodes) > MAX_BARCODES:
+            cls.add_error(errors, 'barcodes', 'At most %s barcodes can be checked at once.' % MAX_BARCODES)
+            return CheckBarcodesExist(errors=errors)
+        masters = lookup_barcodes(barcodes)
+        results = []
+        for barcode in barcodes:
+            pks = masters.get(barcode) or []
+            results.append(BarcodeExist(
+                barcode=barcode, exist=bool(pks),
+                product_masters=[graphene.Node.to_global_id('ProductMaster', pk) for pk in pks]))
+        return CheckBarcodesExist(results=results, errors=errors)
+
+
 class ProductBrandRelationInput(graphene.InputObjectType):
     brand = graphene.ID(description='Product template brand ids.')
 
@@ -126,34 +173,33 @@ class ProductMasterInput(graphene.InputObjectType):
 class ProductMasterMixin:
 
     @classmethod
-    def clean_master_code(cls, instance, cleaned_input, errors, index=None):
-        product_master = models.ProductMaster.all_objects.last()
+    def reserve_master_codes(cls, count, errors):
+        """Reserve codes for `count` new masters in one query"""
+        try:
+            return master_codes.allocate(count)
+        except DBError:
+            cls.add_error(
+                errors, 'code',
+                'Product master code could not generate.')
+            return [None] * count
+
+    @classmethod
+    def clean_master_code(cls, instance, cleaned_input, errors, code=None):
         if instance.pk:
             code = instance.code
-        else:
-            if product_master:
-                code = product_master.code
-                if 'M' in code:
-                    code = int(code.split('M')[1])
-                    if index:
-                        code = code + index
-                    else:
-                        code = code + 1
-                    code = 'M' + str(code)
-                else:
-                    cls.add_error(
-                        errors, 'code',
-                        'Product master code could not generate.')
-            else:
-                code = 'M100000001'
+        elif code is None:
+            code = cls.reserve_master_codes(1, errors)[0]
         cleaned_input['code'] = code
         return cleaned_input
 
     @classmethod
-    def clean_pack_item(cls, info, cleaned_input, errors, index=None):
+    def clean_pack_item(cls, info, cleaned_input, errors, index=None, batch=None):
         pack_items = cleaned_input.get('pack_items') or []
         for item in pack_items:
-            item['item'] = cls.get_node_or_error(info, item['item'], errors, 'id', ProductMaster)
+            if batch is not None:
+                item['item'] = batch.get(item['item'])
+            else:
+                item['item'] = cls.get_node_or_error(info, item['item'], errors, 'id', ProductMaster)
         return cleaned_input
 
     @classmethod
@@ -190,7 +236,7 @@ class ProductMasterMixin:
         return cleaned_input
 
     @classmethod
-    def clean_master_images(cls, info, cleaned_input, errors):
+    def clean_master_images(cls, info, cleaned_input, errors, batch=None):
         newImages = []
         images = cleaned_input.get('images') or []
         for image in images:
@@ -198,7 +244,9 @@ class ProductMasterMixin:
             value = info.context.FILES.get(image['media'])
             media['media'] = value
             validate_image_file(cls, value, 'media', errors)
-            if image.get('id'):
+            if image.get('id') and batch is not None:
+                media['image'] = batch.get(image.get('id'))
+            elif image.get('id'):
                 image = cls.get_node_or_error(info, image.get('id'), errors, field='id', only_type=ProductMasterMedia)
                 media['image'] = image
             newImages.append(media)
@@ -207,12 +255,18 @@ class ProductMasterMixin:
 
 
     @classmethod
-    def check_all_attributes_filled(cls, product_master, cleaned_input,errors):
+    def check_all_attributes_filled(cls, product_master, cleaned_input,errors, batch=None):
         """Checking all the attributes assigned for template is provided for master"""
         product_template = cleaned_input.get('product_template')
-        template_attributes = product_template.attributes.values_list('id', flat=True)
         master_attributes = cleaned_input.get('attributes') or []
-        existing_attributes = product_master.attributes.values_list('product_template_attribute', flat=True) or []
+        if batch is not None:
+            if not product_template:
+                return
+            template_attributes = batch.template_attributes[product_template.pk]
+            existing_attributes = batch.master_attributes[product_master.pk]
+        else:
+            template_attributes = product_template.attributes.values_list('id', flat=True)
+            existing_attributes = product_master.attributes.values_list('product_template_attribute', flat=True) or []
 
         for template_attribute in template_attributes:
             found = False
@@ -227,7 +281,7 @@ class ProductMasterMixin:
             break
 
     @classmethod
-    def clean_attributes(cls, info, cleaned_input, product_master, errors):
+    def clean_attributes(cls, info, cleaned_input, product_master, errors, batch=None):
         """Clean attribute with checking template assigned attribute
         Check attribute already assigned to a master product
         check attribute and its values are proper fields"""
@@ -236,12 +290,19 @@ class ProductMasterMixin:
             return cleaned_input
         attributes = cleaned_input['attributes']
         newAttributes = []
-        existing_values = product_master.attributes.values_list('product_template_attribute', flat=True)
+        if batch is not None:
+            existing_values = batch.master_attributes[product_master.pk]
+        else:
+            existing_values = product_master.attributes.values_list('product_template_attribute', flat=True)
         for attribute_data in attributes:
             product_template_attribute = attribute_data['product_template_attribute']
             attribute = attribute_data['attribute']
             attribute_value = attribute_data['attribute_value']
 
+            if batch is not None:
+                cls.clean_batch_attribute(attribute_data, existing_values, errors, batch, newAttributes)
+                continue
+
             product_template_attribute_obj = cls.get_node_or_error(
                 info, product_template_attribute, errors, 'id', ProductTemplateAttribute)
             if not product_template_attribute_obj or product_template_attribute_obj.id in existing_values:
@@ -277,16 +338,45 @@ class ProductMasterMixin:
         cleaned_input['attributes'] = newAttributes
         return cleaned_input
 
+    @classmethod
+    def clean_batch_attribute(cls, attribute_data, existing_values, errors, batch, attributes):
+        """clean_attributes of one attribute from the preloaded rows, the
+        attribute and value are compared by id"""
+        product_template_attribute = batch.get(attribute_data['product_template_attribute'])
+        if not product_template_attribute or product_template_attribute.id in existing_values:
+            return
+        attribute_data['product_template_attribute'] = product_template_attribute
+
+        attribute = batch.get(attribute_data['attribute'])
+        if not attribute or attribute.id != product_template_attribute.attribute_id:
+            cls.add_error(errors, 'attribute', 'Attribute not found.')
+            return
+
+        attribute_value = batch.get(attribute_data['attribute_value'])
+        if not attribute_value or attribute_value.attribute_id != attribute.id:
+            cls.add_error(errors, 'attribute', 'Attribute value not found.')
+            return
+        attribute_data['attribute_value'] = attribute_value
+        attribute_data.pop('attribute', None)
+        attributes.append(attribute_data)
+
 
     @classmethod
-    def clean_product(cls, info, cleaned_input, instance, errors):
+    def clean_product(cls, info, cleaned_input, instance, errors, batch=None):
         products = []
         if 'products' in cleaned_input:
             for product in cleaned_input['products']:
-                country = cls.get_node_or_error(
-                    info, product['country'], errors, 'id', Country)
+                if batch is not None:
+                    country = batch.get(product['country'])
+                else:
+                    country = cls.get_node_or_error(
+                        info, product['country'], errors, 'id', Country)
                 if country:
-                    if instance.pk:
+                    if instance.pk and batch is not None:
+                        if country.pk not in batch.master_countries[instance.pk]:
+                            product['country'] = country
+                            products.append(product)
+                    elif instance.pk:
                         query = models.Product.objects.filter(country=country.id,
                                                               product_master=instance.id)
                         if not query.exists():
@@ -320,9 +410,12 @@ class ProductMasterMixin:
         return cleaned_input
 
     @classmethod
-    def clean_master_input(cls, info, instance, input, errors, index=None):
+    def clean_master_input(cls, info, instance, input, errors, code=None, batch=None, resolved=None):
+        """With a `batch`, ID fields are passed already resolved in `resolved`
+        and the slug and barcode are checked for the whole batch by the caller"""
         cleaned_input = super().clean_input(info, instance, input, errors, ProductMasterInput)
-        cls.clean_master_code(instance, cleaned_input, errors, index)
+        cleaned_input.update(resolved or {})
+        cls.clean_master_code(instance, cleaned_input, errors, code)
 
         if 'name' in cleaned_input and cleaned_input['name'] != '':
             slug = slugify(cleaned_input['name'])
@@ -338,7 +431,7 @@ class ProductMasterMixin:
 
         query = models.ProductMaster.objects.filter(slug=slug)
         query = query.exclude(pk=getattr(instance, 'pk', None))
-        if query.exists():
+        if batch is None and query.exists():
             cls.add_error(
                 errors, 'name',
                 'Product master already exists with this name.')
@@ -354,14 +447,14 @@ class ProductMasterMixin:
 
         new_query = models.ProductMaster.objects.filter(barcode=barcode)
         new_query = new_query.exclude(pk=getattr(instance, 'pk', None))
-        if new_query.exists():
+        if batch is None and new_query.exists():
             cls.add_error(
                 errors, 'name',
                 'Product master already exists with this barcode.')
 
 
         cls.clean_seo_fields(instance, cleaned_input, errors)
-        cls.clean_pack_item(info, cleaned_input, errors)
+        cls.clean_pack_item(info, cleaned_input, errors, batch=batch)
         return cleaned_input
 
 class ProductTemplateInput(graphene.InputObjectType):
@@ -393,19 +486,13 @@ class ProductTemplateMixin:
         if instance.pk:
             code = instance.code
         else:
-            product_template = models.ProductTemplate.all_objects.last()
-            if product_template:
-                code = product_template.code
-                if 'T' in code:
-                    code = int(code.split('T')[1])
-                    code = code + 1
-                    code = 'T' + str(code)
-                else:
-                    cls.add_error(
-                        errors, 'code',
-                        'Product template code could not generate.')
-            else:
-                code = 'T100000001'
+            try:
+                code = template_codes.next()
+            except DBError:
+                code = None
+                cls.add_error(
+                    errors, 'code',
+                    'Product template code could not generate.')
         cleaned_input['code'] = code
         return cleaned_input
 
@@ -447,9 +534,10 @@ class ProductTemplateMixin:
         if cleaned_input.get('masters'):
             masters = cleaned_input.get('masters') or []
             masterArray = []
-            for master_input in masters:
+            codes = cls.reserve_master_codes(len(masters), errors)
+            for master_input, code in zip(masters, codes):
                 master = models.ProductMaster()
-                master_cleaned_input = cls.clean_master_input(info, master, master_input, errors)
+                master_cleaned_input = cls.clean_master_input(info, master, master_input, errors, code)
                 cls.clean_product(info, master_cleaned_input, master, errors)
                 master = cls.construct_instance(master, master_cleaned_input)
                 cls.clean_instance(master, errors)
@@ -509,14 +597,9 @@ class ProductTemplateMixin:
     @classmethod
     def save(cls, info, instance, cleaned_input, categories, brands):
         instance.save()
-        if cleaned_input.get('icon'):
-            create_product_template_default_thumbnails.delay(instance.pk, 'icon')
-
-        if cleaned_input.get('large_icon'):
-            create_product_template_default_thumbnails.delay(instance.pk, 'large_icon')
-
-        if cleaned_input.get('default_image'):
-            create_product_template_default_thumbnails.delay(instance.pk, 'default_image')
+        schedule_thumbnails(instance, *[
+            attr for attr in ('icon', 'large_icon', 'default_image')
+            if cleaned_input.get(attr)])
 
         for category in categories:
             instance.categories.create(category=category)
@@ -563,10 +646,10 @@ class ProductTemplateMixin:
                 oldImage = image.get('image')
                 oldImage.media = image.get('media')
                 oldImage.save()
-                create_product_template_thumbnails.delay(oldImage.pk)
+                schedule_thumbnails(oldImage, 'media')
             else:
                 image = instance.images.create(**image)
-                create_product_template_thumbnails.delay(image.pk)
+                schedule_thumbnails(image, 'media')
 
         for image in remove_images:
             image.delete()
@@ -868,6 +951,21 @@ class ProductTemplateAttributeCreate(ModelMutation):
             remove_item.delete()
 
 
+class ProductTemplateCollectionMutation(ModelCollectionMutation):
+    """Saves a list of sub-resources of product templates"""
+    parent_field = 'product_template'
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def save_collection(cls, info, rows, remove):
+        super().save_collection(info, rows, remove)
+        for instance, cleaned_input, _ in rows:
+            if cleaned_input.get('image'):
+                schedule_thumbnails(instance, 'image')
+
+
 class ProductTemplateDescriptionInput(graphene.InputObjectType):
     id = graphene.ID(description='ID of the description to update')
     title = graphene.String(description='Description title')
@@ -876,7 +974,7 @@ class ProductTemplateDescriptionInput(graphene.InputObjectType):
     image = Upload(description='If any image for description')
     product_template = graphene.ID(description='Product template ID')
 
-class ProductTemplateDescriptionCreate(ModelMutation):
+class ProductTemplateDescriptionCreate(ProductTemplateCollectionMutation):
 
     productTemplateDescriptions = graphene.List(ProductTemplateDescription)
 
@@ -894,52 +992,16 @@ class ProductTemplateDescriptionCreate(ModelMutation):
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
     def mutate(cls, root, info, input, removeItems):
-        errors = []
-        data = []
-        instances = []
-        removeInstances = []
         try:
             with transaction.atomic():
-                for cleaned_data in input:
-                    if cleaned_data.get('id'):
-                        instance = cls.get_node_or_error(info, cleaned_data.get('id'), errors, 'id',
-                                                         ProductTemplateDescription)
-                    else:
-                        instance = models.ProductTemplateDescription()
-
-                    cleaned_input = cls.clean_input(info, instance, cleaned_data, errors,
-                                                    ProductTemplateDescriptionInput)
-                    instance = cls.construct_instance(instance, cleaned_input)
-                    cls.clean_instance(instance, errors)
-                    data.append((instance, cleaned_input))
-                    instances.append(instance)
-
-                for remove_data in removeItems:
-                    instance = cls.get_node_or_error(info, remove_data, errors, 'id',
-                                                     ProductTemplateDescription)
-                    if instance:
-                        removeInstances.append(instance)
-
-                if errors:
-                    return ProductTemplateDescriptionCreate(errors=errors)
-
-                cls.save(info, data, removeInstances)
-                return ProductTemplateDescriptionCreate(errors=errors, productTemplateDescriptions=instances)
-
+                instances, errors = cls.perform_collection_mutation(info, input, removeItems)
         except DBError as e:
+            errors = []
             cls.add_error(errors, 'db', str(e))
             return ProductTemplateDescriptionCreate(errors=errors)
-
-
-    @classmethod
-    def save(cls, info, instances, removeInstances):
-        for instance, cleaned_input in instances:
-            instance.save()
-            if cleaned_input.get('image'):
-                create_product_template_addon_thumbnails.delay(instance.pk, models.ProductTemplateDescription)
-        for removeInstance in removeInstances:
-            removeInstance.delete()
-
+        if errors:
+            return ProductTemplateDescriptionCreate(errors=errors)
+        return ProductTemplateDescriptionCreate(productTemplateDescriptions=instances, errors=errors)
 
 class ProductTemplateNutritionInput(graphene.InputObjectType):
     nutrition = graphene.String(description='Product template nutrition description')
@@ -948,7 +1010,7 @@ class ProductTemplateNutritionInput(graphene.InputObjectType):
     product_template = graphene.ID(description='Product template ID')
     id = graphene.ID(description='Product template nutrition id')
 
-class ProductTemplateNutritionCreate(ModelMutation):
+class ProductTemplateNutritionCreate(ProductTemplateCollectionMutation):
 
     productTemplateNutritions = graphene.List(ProductTemplateNutrition)
 
@@ -965,46 +1027,16 @@ class ProductTemplateNutritionCreate(ModelMutation):
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
     def mutate(cls, root, info, input, removeItems):
-        errors = []
-        instances = []
-        removeInstances = []
         try:
             with transaction.atomic():
-                for cleaned_data in input:
-                    if cleaned_data.get('id'):
-                        instance = cls.get_node_or_error(info, cleaned_data.get('id'), errors, 'id',
-                                                         ProductTemplateNutrition)
-                    else:
-                        instance = models.ProductTemplateNutrition()
-
-                    cleaned_input = cls.clean_input(info, instance, cleaned_data, errors,
-                                                    ProductTemplateNutritionInput)
-                    instance = cls.construct_instance(instance, cleaned_input)
-                    cls.clean_instance(instance, errors)
-                    instances.append(instance)
-
-                for remove_data in removeItems:
-                    instance = cls.get_node_or_error(info, remove_data, errors, 'id',
-                                                     ProductTemplateNutrition)
-                    if instance:
-                        removeInstances.append(instance)
-
-                if errors:
-                    return ProductTemplateNutritionCreate(errors=errors)
-
-                cls.save(info, instances, removeInstances)
-                return ProductTemplateNutritionCreate(productTemplateNutritions=instances, errors=errors)
-
+                instances, errors = cls.perform_collection_mutation(info, input, removeItems)
         except DBError as e:
+            errors = []
             cls.add_error(errors, 'db', str(e))
             return ProductTemplateNutritionCreate(errors=errors)
-
-    @classmethod
-    def save(cls, info, instances, removeInstances):
-        for instance in instances:
-            instance.save()
-        for removeInstance in removeInstances:
-            removeInstance.delete()
+        if errors:
+            return ProductTemplateNutritionCreate(errors=errors)
+        return ProductTemplateNutritionCreate(productTemplateNutritions=instances, errors=errors)
 
 class ProductTemplateIngredientInput(graphene.InputObjectType):
     ingredient = graphene.String(description='Product template ingredient')
@@ -1013,7 +1045,7 @@ class ProductTemplateIngredientInput(graphene.InputObjectType):
     product_template = graphene.ID(description='Product template ID')
     id = graphene.ID(description='Product template ingrediant id')
 
-class ProductTemplateIngredientCreate(ModelMutation):
+class ProductTemplateIngredientCreate(ProductTemplateCollectionMutation):
 
     productTemplateIngredients = graphene.List(ProductTemplateIngredient)
 
@@ -1030,49 +1062,16 @@ class ProductTemplateIngredientCreate(ModelMutation):
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
     def mutate(cls, root, info, input, removeItems):
-        errors = []
-        instances = []
-        removeInstances = []
-
         try:
             with transaction.atomic():
-
-                for cleaned_data in input:
-
-                    if cleaned_data.get('id'):
-                        instance = cls.get_node_or_error(info, cleaned_data.get('id'), errors, 'id',
-                                                         ProductTemplateIngredient)
-                    else:
-                        instance = models.ProductTemplateIngredient()
-
-                    cleaned_input = cls.clean_input(info, instance, cleaned_data, errors,
-                                                    ProductTemplateIngredientInput)
-
-                    instance = cls.construct_instance(instance, cleaned_input)
-                    cls.clean_instance(instance, errors)
-                    instances.append(instance)
-
-                for remove_data in removeItems:
-                    instance = cls.get_node_or_error(info, remove_data, errors, 'id',
-                                                     ProductTemplateIngredient)
-                    if instance:
-                        removeInstances.append(instance)
-
-                if errors:
-                    return ProductTemplateIngredientCreate(errors=errors)
-                cls.save(info, instances, removeInstances)
-                return ProductTemplateIngredientCreate(productTemplateIngredients=instances, errors=errors)
+                instances, errors = cls.perform_collection_mutation(info, input, removeItems)
         except DBError as e:
+            errors = []
             cls.add_error(errors, 'db', str(e))
             return ProductTemplateIngredientCreate(errors=errors)
-
-
-    @classmethod
-    def save(cls, info, instances, removeInstances):
-        for instance in instances:
-            instance.save()
-        for removeInstance in removeInstances:
-            removeInstance.delete()
+        if errors:
+            return ProductTemplateIngredientCreate(errors=errors)
+        return ProductTemplateIngredientCreate(productTemplateIngredients=instances, errors=errors)
 
 class ProductTemplateHowToUseInput(graphene.InputObjectType):
     sort_order = graphene.Int(description="Sort order for attribute values")
@@ -1082,7 +1081,7 @@ class ProductTemplateHowToUseInput(graphene.InputObjectType):
     product_template = graphene.ID(description='Product template ID')
     id = graphene.ID(description='Product template how to use id')
 
-class ProductTemplateHowToUseCreate(ModelMutation):
+class ProductTemplateHowToUseCreate(ProductTemplateCollectionMutation):
 
     productTemplateHowToUses = graphene.List(ProductTemplateHowToUse)
 
@@ -1099,53 +1098,16 @@ class ProductTemplateHowToUseCreate(ModelMutation):
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
     def mutate(cls, root, info, input, removeItems):
-        errors = []
-        instances = []
-        data = []
-        removeInstances = []
-
         try:
             with transaction.atomic():
-
-                for cleaned_data in input:
-
-                    if cleaned_data.get('id'):
-                        instance = cls.get_node_or_error(info, cleaned_data.get('id'), errors, 'id',
-                                                         ProductTemplateHowToUse)
-                    else:
-                        instance = models.ProductTemplateHowToUse()
-
-                    cleaned_input = cls.clean_input(info, instance, cleaned_data, errors,
-                                                    ProductTemplateHowToUseInput)
-
-                    instance = cls.construct_instance(instance, cleaned_input)
-                    cls.clean_instance(instance, errors)
-                    data.append((instance, cleaned_input))
-                    instances.append(instance)
-
-                for remove_data in removeItems:
-                    instance = cls.get_node_or_error(info, remove_data, errors, 'id', ProductTemplateHowToUse)
-                    if instance:
-                        removeInstances.append(instance)
-
-                if errors:
-                    return ProductTemplateHowToUseCreate(errors=errors)
-
-                cls.save(info, data, removeInstances)
-                return ProductTemplateHowToUseCreate(productTemplateHowToUses=instances, errors=errors)
+                instances, errors = cls.perform_collection_mutation(info, input, removeItems)
         except DBError as e:
+            errors = []
             cls.add_error(errors, 'db', str(e))
             return ProductTemplateHowToUseCreate(errors=errors)
-
-    @classmethod
-    def save(cls, info, instances, removeInstances):
-        for instance, cleaned_input in instances:
-            instance.save()
-            if cleaned_input.get('image'):
-                create_product_template_addon_thumbnails.delay(instance.pk, models.ProductTemplateHowToUse)
-        for removeInstance in removeInstances:
-            removeInstance.delete()
-
+        if errors:
+            return ProductTemplateHowToUseCreate(errors=errors)
+        return ProductTemplateHowToUseCreate(productTemplateHowToUses=instances, errors=errors)
 
 class ProductTemplateCautionMessageInput(graphene.InputObjectType):
     message = graphene.String(description='Product template caution message')
@@ -1154,7 +1116,7 @@ class ProductTemplateCautionMessageInput(graphene.InputObjectType):
     product_template = graphene.ID(description='Product template ID')
     id = graphene.ID(description='Product template caution message ID')
 
-class ProductTemplateCautionMessageCreate(ModelMutation):
+class ProductTemplateCautionMessageCreate(ProductTemplateCollectionMutation):
 
     productTemplateCautionMessages = graphene.List(ProductTemplateCautionMessage)
 
@@ -1172,50 +1134,16 @@ class ProductTemplateCautionMessageCreate(ModelMutation):
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
     def mutate(cls, root, info, input, removeItems):
-        errors = []
-        instances = []
-        data = []
-        removeInstances = []
         try:
             with transaction.atomic():
-                for cleaned_data in input:
-                    if cleaned_data.get('id'):
-                        instance = cls.get_node_or_error(info, cleaned_data.get('id'), errors, 'id',
-                                                         ProductTemplateCautionMessage)
-                    else:
-                        instance = models.ProductTemplateCautionMessage()
-
-                    cleaned_input = cls.clean_input(info, instance, cleaned_data, errors,
-                                                    ProductTemplateCautionMessageInput)
-                    instance = cls.construct_instance(instance, cleaned_input)
-                    cls.clean_instance(instance, errors)
-                    data.append((instance, cleaned_input))
-                    instances.append(instance)
-
-                for remove_data in removeItems:
-                    instance = cls.get_node_or_error(info, remove_data, errors, 'id', ProductTemplateCautionMessage)
-                    if instance:
-                        removeInstances.append(instance)
-
-                if errors:
-                    return ProductTemplateCautionMessageCreate(errors=errors)
-
-                cls.save(info, data, removeInstances)
-                return ProductTemplateCautionMessageCreate(productTemplateCautionMessages=instances, errors=errors)
+                instances, errors = cls.perform_collection_mutation(info, input, removeItems)
         except DBError as e:
+            errors = []
             cls.add_error(errors, 'db', str(e))
             return ProductTemplateCautionMessageCreate(errors=errors)
-
-
-
-    @classmethod
-    def save(cls, info, instances, removeInstances):
-        for instance, cleaned_input in instances:
-            instance.save()
-            if cleaned_input.get('image'):
-                create_product_template_addon_thumbnails.delay(instance.pk, models.ProductTemplateCautionMessage)
-        for removeInstance in removeInstances:
-            removeInstance.delete()
+        if errors:
+            return ProductTemplateCautionMessageCreate(errors=errors)
+        return ProductTemplateCautionMessageCreate(productTemplateCautionMessages=instances, errors=errors)
 
 class ProductTemplateCertificationInput(graphene.InputObjectType):
     certification = graphene.ID(description='Certification ID')
@@ -1223,7 +1151,7 @@ class ProductTemplateCertificationInput(graphene.InputObjectType):
     product_template = graphene.ID(description='Product template ID')
     id = graphene.ID(description='Product template certificate ID')
 
-class ProductTemplateCertificationCreate(ModelMutation):
+class ProductTemplateCertificationCreate(ProductTemplateCollectionMutation):
 
     productTemplateCertifications = graphene.List(ProductTemplateCertification)
 
@@ -1241,46 +1169,16 @@ class ProductTemplateCertificationCreate(ModelMutation):
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
     def mutate(cls, root, info, input, removeItems):
-        errors = []
-        instances = []
-        removeInstances = []
-
         try:
             with transaction.atomic():
-                for cleaned_data in input:
-                    if cleaned_data.get('id'):
-                        instance = cls.get_node_or_error(info, cleaned_data.get('id'), errors, 'id',
-                                                         ProductTemplateCertification)
-                    else:
-                        instance = models.ProductTemplateCertification()
-
-                    cleaned_input = cls.clean_input(info, instance, cleaned_data, errors,
-                                                    ProductTemplateCertificationInput)
-
-                    instance = cls.construct_instance(instance, cleaned_input)
-                    cls.clean_instance(instance, errors)
-                    instances.append(instance)
-
-                for remove_data in removeItems:
-                    instance = cls.get_node_or_error(info, remove_data, errors, 'id', ProductTemplateCertification)
-                    if instance:
-                        removeInstances.append(instance)
-
-                if errors:
-                    return ProductTemplateCertificationCreate(errors=errors)
-                cls.save(info, instances, removeInstances)
-                return ProductTemplateCertificationCreate(productTemplateCertifications=instances, errors=errors)
+                instances, errors = cls.perform_collection_mutation(info, input, removeItems)
         except DBError as e:
+            errors = []
             cls.add_error(errors, 'db', str(e))
             return ProductTemplateCertificationCreate(errors=errors)
-
-    @classmethod
-    def save(cls, info, instances, removeInstances):
-        for instance in instances:
-            instance.save()
-        for removeInstance in removeInstances:
-            removeInstance.delete()
-
+        if errors:
+            return ProductTemplateCertificationCreate(errors=errors)
+        return ProductTemplateCertificationCreate(productTemplateCertifications=instances, errors=errors)
 
 class ProductTemplateWarrantyInput(graphene.InputObjectType):
     product_template = graphene.ID(description='Product template ID')
@@ -1329,7 +1227,7 @@ class ProductTemplatePolicyInput(graphene.InputObjectType):
     id = graphene.ID(description='Product template policy ID')
 
 
-class ProductTemplatePolicyCreate(ModelMutation):
+class ProductTemplatePolicyCreate(ProductTemplateCollectionMutation):
 
     productTemplatePolicies = graphene.List(ProductTemplatePolicy)
 
@@ -1345,45 +1243,16 @@ class ProductTemplatePolicyCreate(ModelMutation):
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
     def mutate(cls, root, info, input, removeItems):
-        errors = []
-        instances = []
-        removeInstances = []
-
         try:
             with transaction.atomic():
-                for cleaned_data in input:
-                    if cleaned_data.get('id'):
-                        instance = cls.get_node_or_error(info, cleaned_data.get('id'), errors, 'id',
-                                                         ProductTemplatePolicy)
-                    else:
-                        instance = models.ProductTemplatePolicy()
-
-                    cleaned_input = cls.clean_input(info, instance, cleaned_data, errors,
-                                                    ProductTemplatePolicyInput)
-
-                    instance = cls.construct_instance(instance, cleaned_input)
-                    cls.clean_instance(instance, errors)
-                    instances.append(instance)
-
-                for remove_data in removeItems:
-                    instance = cls.get_node_or_error(info, remove_data, errors, 'id', ProductTemplatePolicy)
-                    if instance:
-                        removeInstances.append(instance)
-
-                if errors:
-                    return ProductTemplatePolicyCreate(errors=errors)
-                cls.save(info, instances, removeInstances)
-                return ProductTemplatePolicyCreate(productTemplatePolicies=instances, errors=errors)
+                instances, errors = cls.perform_collection_mutation(info, input, removeItems)
         except DBError as e:
+            errors = []
             cls.add_error(errors, 'db', str(e))
             return ProductTemplatePolicyCreate(errors=errors)
-
-    @classmethod
-    def save(cls, info, instances, removeInstances):
-        for instance in instances:
-            instance.save()
-        for removeInstance in removeInstances:
-            removeInstance.delete()
+        if errors:
+            return ProductTemplatePolicyCreate(errors=errors)
+        return ProductTemplatePolicyCreate(productTemplatePolicies=instances, errors=errors)
 
 class ProductTemplateIncludeInput(graphene.InputObjectType):
     product_template = graphene.ID(description='Product template ID')
@@ -1393,7 +1262,7 @@ class ProductTemplateIncludeInput(graphene.InputObjectType):
     qty = graphene.Float(description='Pack include qty')
     id = graphene.ID(description='Product template include ID')
 
-class ProductTemplateIncludeCreate(ModelMutation):
+class ProductTemplateIncludeCreate(ProductTemplateCollectionMutation):
 
     productTemplateIncludes = graphene.List(ProductTemplateInclude)
 
@@ -1409,49 +1278,16 @@ class ProductTemplateIncludeCreate(ModelMutation):
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
     def mutate(cls, root, info, input, removeItems):
-        errors = []
-        instances = []
-        data = []
-        removeInstances = []
-
         try:
             with transaction.atomic():
-                for cleaned_data in input:
-                    if cleaned_data.get('id'):
-                        instance = cls.get_node_or_error(info, cleaned_data.get('id'), errors, 'id',
-                                                         ProductTemplateInclude)
-                    else:
-                        instance = models.ProductTemplateInclude()
-
-                    cleaned_input = cls.clean_input(info, instance, cleaned_data, errors,
-                                                    ProductTemplateIncludeInput)
-
-                    instance = cls.construct_instance(instance, cleaned_input)
-                    cls.clean_instance(instance, errors)
-                    instances.append(instance)
-                    data.append((instance, cleaned_input))
-
-                for remove_data in removeItems:
-                    instance = cls.get_node_or_error(info, remove_data, errors, 'id', ProductTemplateInclude)
-                    if instance:
-                        removeInstances.append(instance)
-
-                if errors:
-                    return ProductTemplateIncludeCreate(errors=errors)
-                cls.save(info, data, removeInstances)
-                return ProductTemplateIncludeCreate(productTemplateIncludes=instances, errors=errors)
+                instances, errors = cls.perform_collection_mutation(info, input, removeItems)
         except DBError as e:
+            errors = []
             cls.add_error(errors, 'db', str(e))
             return ProductTemplateIncludeCreate(errors=errors)
-
-    @classmethod
-    def save(cls, info, instances, removeInstances):
-        for instance, cleaned_input in instances:
-            instance.save()
-            if cleaned_input.get('image'):
-                create_product_template_addon_thumbnails.delay(instance.pk, models.ProductTemplateInclude)
-        for removeInstance in removeInstances:
-            removeInstance.delete()
+        if errors:
+            return ProductTemplateIncludeCreate(errors=errors)
+        return ProductTemplateIncludeCreate(productTemplateIncludes=instances, errors=errors)
 
 class ProductTemplateManufactureInput(graphene.InputObjectType):
     product_template = graphene.ID(description='Product template ID')
@@ -1512,7 +1348,7 @@ class ProductMasterCreate(ProductMasterMixin, ModelMutation):
         images = cleaned_data.get('images') or []
         for image in images:
             image = product_master.images.create(**image)
-            create_product_master_thumbnails.delay(image.pk)
+            schedule_thumbnails(image, 'media')
 
         remove_images = cleaned_data.get('remove_images') or []
         for image in remove_images:
@@ -1521,14 +1357,9 @@ class ProductMasterCreate(ProductMasterMixin, ModelMutation):
     @classmethod
     def save(cls, info, instance, cleaned_input):
         instance.save()
-        if cleaned_input.get('icon'):
-            create_product_master_default_thumbnails.delay(instance.pk, 'icon')
-
-        if cleaned_input.get('large_icon'):
-            create_product_master_default_thumbnails.delay(instance.pk, 'large_icon')
-
-        if cleaned_input.get('default_image'):
-            create_product_master_default_thumbnails.delay(instance.pk, 'default_image')
+        schedule_thumbnails(instance, *[
+            attr for attr in ('icon', 'large_icon', 'default_image')
+            if cleaned_input.get(attr)])
 
     @classmethod
     @permission_required('products')
@@ -1581,58 +1412,108 @@ class ProductMasterListUpdate(ProductMasterMixin, ModelMutation):
         model = models.ProductMaster
 
     @classmethod
-    def clean_remove_items(cls, info, remove_items, errors):
-        newRemoveItems = []
-        for remove_item in remove_items:
-            product_master = cls.get_node_or_error(
-                info, remove_item, errors, 'id', ProductMaster)
-            if product_master:
-                master = models.ProductMaster.objects.get(pk=product_master.id)
-                newRemoveItems.append(master)
-        return newRemoveItems
+    def load_batch(cls, items, remove_items, errors):
+        """Resolve every global ID of the items with one query per model and
+        field, and load the rows the items are validated against"""
+        ids = defaultdict(list)
+        for item in items:
+            ids[models.ProductMaster, 'id'].append(item.get('id'))
+            ids[models.ProductMaster, 'product_master'].append(item.get('product_master'))
+            ids[models.ProductTemplate, 'product_template'].append(item.get('product_template'))
+            ids[models.ProductMaster, 'parent'].append(item.get('parent'))
+            ids[models.ProductMaster.weight_unit.field.related_model, 'weight_unit'].append(
+                item.get('weight_unit'))
+            for attribute in item.get('attributes') or []:
+                ids[models.ProductTemplateAttribute, 'id'].append(
+                    attribute.get('product_template_attribute'))
+                ids[models.Attribute, 'id'].append(attribute.get('attribute'))
+                ids[models.AttributeValue, 'id'].append(attribute.get('attribute_value'))
+            for product in item.get('products') or []:
+                ids[refsModel.Country, 'id'].append(product.get('country'))
+            for image in item.get('images') or []:
+                ids[models.ProductMasterMedia, 'id'].append(image.get('id'))
+            ids[models.ProductMasterMedia, 'remove_images'].extend(item.get('remove_images') or [])
+            for pack_item in item.get('pack_items') or []:
+                ids[models.ProductMaster, 'id'].append(pack_item.get('item'))
+        ids[models.ProductMaster, 'id'].extend(remove_items)
+
+        nodes = {}
+        for (model, field), global_ids in ids.items():
+            global_ids = [global_id for global_id in global_ids if global_id]
+            if global_ids:
+                nodes.update(cls.resolve_global_ids(global_ids, errors, field, model))
+        return MasterBatch(nodes)
 
     @classmethod
-    def clean_item(cls, info, instance, input, errors, index=None):
-
-        product_template = cls.get_node_or_error(
-            info, input['product_template'], errors, 'id', ProductTemplate)
-        if not product_template:
+    def clean_item(cls, info, instance, input, errors, code=None, batch=None):
+        resolved = {
+            field: batch.get(input[field]) for field in MASTER_ID_FIELDS if field in input
+        }
+        if 'remove_images' in input:
+            resolved['remove_images'] = [
+                batch.get(image_id) for image_id in input['remove_images'] or []
+            ]
+        if not resolved.get('product_template'):
             cls.add_error(errors, 'product_template', "Product template not found")
-        if input.get('parent'):
-            product_master = cls.get_node_or_error(
-                info, input['parent'], errors, 'id', ProductMaster)
-            if not product_master:
-                cls.add_error(errors, 'product_master', "Parent product master not found")
-
-        cleaned_input = cls.clean_master_input(info, instance, input, errors, index)
-        cls.clean_attributes(info, cleaned_input, instance, errors)
-        cls.check_all_attributes_filled(instance, cleaned_input, errors)
-        cls.clean_product(info, cleaned_input, instance, errors)
+        if input.get('parent') and not resolved.get('parent'):
+            cls.add_error(errors, 'product_master', "Parent product master not found")
+
+        data = {key: value for key, value in input.items() if key != 'id' and key not in resolved}
+        cleaned_input = cls.clean_master_input(info, instance, data, errors, code, batch, resolved)
+        cls.clean_attributes(info, cleaned_input, instance, errors, batch)
+        cls.check_all_attributes_filled(instance, cleaned_input, errors, batch)
+        cls.clean_product(info, cleaned_input, instance, errors, batch)
         instance = cls.construct_instance(instance, cleaned_input)
-        cls.clean_instance(instance, errors)
-        cls.clean_master_images(info, cleaned_input, errors)
+        # Related rows are resolved in the batch, slugs and barcodes are checked with clean_unique
+        cls.clean_instance(
+            instance, errors, exclude=list(MASTER_ID_FIELDS), validate_unique=False)
+        cls.clean_master_images(info, cleaned_input, errors, batch)
         return (instance, cleaned_input)
 
+    @classmethod
+    def clean_unique(cls, instances, errors):
+        """Check the slugs and barcodes of all items with one query each"""
+        pks = [instance.pk for instance, _ in instances if instance.pk]
+        for field, message in (
+                ('slug', 'Product master already exists with this name.'),
+                ('barcode', 'Product master already exists with this barcode.')):
+            values = [getattr(instance, field) for instance, _ in instances]
+            values = [value for value in values if value]
+            query = models.ProductMaster.objects.filter(
+                **{'%s__in' % field: values}).exclude(pk__in=pks)
+            if len(values) != len(set(values)) or query.exists():
+                cls.add_error(errors, 'name', message)
+
     @classmethod
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
     def mutate(cls, root, info, input):
         errors = []
         instances = []
-        instancesArray = []
         items = input.get('items') or []
         removeItems = input.get('remove_items') or []
-        for i,newItem in enumerate(items):
-            if newItem.get('id'):
-                instance = cls.get_node_or_error(
-                    info, newItem.get('id'), errors, 'id', ProductMaster)
-            else:
-                instance = models.ProductMaster()
-            instancesArray.append(instance)
-            data = cls.clean_item(info, instance, newItem, errors, i+1)
-            instances.append(data)
+        batch = cls.load_batch(items, removeItems, errors)
+        if errors:
+            return ProductMasterListUpdate(errors=errors)
 
-        removeItems = cls.clean_remove_items(info, removeItems, errors)
+        codes = cls.reserve_master_codes(
+            len([item for item in items if not item.get('id')]), errors)
+        for newItem in items:
+            code = None
+            instance = batch.get(newItem.get('id'))
+            if instance is None:
+                instance = models.ProductMaster()
+                code = codes.pop(0)
+            original = None
+            if instance.pk:
+                original = {
+                    field.attname: get_field_value(instance, field)
+                    for field in instance._meta.concrete_fields
+                }
+            instance, cleaned_input = cls.clean_item(info, instance, newItem, errors, code, batch)
+            instances.append((instance, cleaned_input, original))
+        cls.clean_unique(instances, errors)
+        removeItems = [batch.get(remove_item) for remove_item in removeItems]
 
         if errors:
             return ProductMasterListUpdate(errors=errors)
@@ -1644,51 +1525,66 @@ class ProductMasterListUpdate(ProductMasterMixin, ModelMutation):
             cls.add_error(errors, 'db', str(e))
             return ProductMasterListUpdate(errors=errors)
 
-        return ProductMasterListUpdate(productMasters=instancesArray, errors=errors)
+        return ProductMasterListUpdate(
+            productMasters=[instance for instance, _, _ in instances], errors=errors)
 
     @classmethod
     def save(cls, info, instances, removeItems):
-        for instance, cleaned_input in instances:
-            instance.save()
-            attributes = cleaned_input.get('attributes') or []
-            products = cleaned_input.get('products') or []
-            pack_items = cleaned_input.get('pack_items') or []
-
-            for attribute in attributes:
-                instance.attributes.create(**attribute)
-
-            for pack_item in pack_items:
-                instance.product_master_pack_items.create(**pack_item)
-
-            for product in products:
-                instance.products.create(**product)
-
-            if cleaned_input.get('icon'):
-                create_product_master_default_thumbnails.delay(instance.pk, 'icon')
-
-            if cleaned_input.get('large_icon'):
-                create_product_master_default_thumbnails.delay(instance.pk, 'large_icon')
-
-            if cleaned_input.get('default_image'):
-                create_product_master_default_thumbnails.delay(instance.pk, 'default_image')
-
-            images = cleaned_input.get('images') or []
-            for image in images:
+        """Write the masters and their attributes, pack items, products and
+        images with bulk statements, and one batch of history records per model"""
+        now = timezone.now()
+        bulk_save_masters([(instance, original) for instance, _, original in instances])
+
+        attributes, pack_items, products, images, updated_images = [], [], [], [], []
+        remove_image_ids = []
+        for instance, cleaned_input, _ in instances:
+            for attribute in cleaned_input.get('attributes') or []:
+                attributes.append(models.ProductMasterAttributeValue(product_master=instance, **attribute))
+            for pack_item in cleaned_input.get('pack_items') or []:
+                pack_items.append(models.ProductPackItem(product_master=instance, **pack_item))
+            for product in cleaned_input.get('products') or []:
+                products.append(models.Product(product_master=instance, **product))
+
+            schedule_thumbnails(instance, *[
+                attr for attr in ('icon', 'large_icon', 'default_image')
+                if cleaned_input.get(attr)])
+
+            for image in cleaned_input.get('images') or []:
                 if image.get('image'):
                     oldImage = image.get('image')
                     oldImage.media = image.get('media')
-                    oldImage.save()
-                    create_product_master_thumbnails.delay(oldImage.pk)
+                    updated_images.append(oldImage)
                 else:
-                    image = instance.images.create(**image)
-                    create_product_master_thumbnails.delay(image.pk)
-
-            remove_images = cleaned_input.get('remove_images') or []
-            for image in remove_images:
-                image.delete()
-
-        for removeItem in removeItems:
-            removeItem.change_status(Status.DELETED.value)
+                    images.append(models.ProductMasterMedia(product_master=instance, **image))
+            remove_image_ids.extend(
+                image.pk for image in cleaned_input.get('remove_images') or [] if image)
+
+        bulk_create(models.ProductMasterAttributeValue, attributes)
+        bulk_create(models.ProductPackItem, pack_items)
+        bulk_create(models.Product, products)
+        bulk_create(models.ProductMasterMedia, images)
+        if updated_images:
+            media = models.ProductMasterMedia._meta.get_field('media')
+            for image in updated_images:
+                # Stores the upload, bulk_update does not call pre_save
+                image.media = media.pre_save(image, False)
+                image.updated = now
+            models.ProductMasterMedia.objects.bulk_update(updated_images, ['media', 'updated'])
+            bulk_history_update(models.ProductMasterMedia, updated_images, now)
+        for image in images + updated_images:
+            schedule_thumbnails(image, 'media')
+        if remove_image_ids:
+            models.ProductMasterMedia.objects.filter(pk__in=remove_image_ids).delete()
+
+        remove_ids = [removeItem.pk for removeItem in removeItems]
+        if remove_ids:
+            models.ProductMaster.objects.filter(pk__in=remove_ids).change_status(Status.DELETED.value)
+
+        # Bulk writes send no signals
+        master_ids = [instance.pk for instance, _, _ in instances]
+        schedule_listing_refresh(master_ids)
+        schedule_autocomplete_update('master', master_ids)
+        schedule_barcode_update(instance.barcode for instance, _, _ in instances)
 
 
 class ProductTemplateRelatedProductInput(graphene.InputObjectType):
@@ -1782,6 +1678,138 @@ class ProductTemplateRelatedProductCreate(ModelMutation):
         for removeInstance in removeInstances:
             removeInstance.delete()
 
+class ProductMasterVariantAttributeInput(graphene.InputObjectType):
+    product_template_attribute = graphene.ID(required=True, description='Product template attribute ID')
+    values = graphene.List(graphene.ID, required=True, description='Attribute value IDs to combine')
+
+
+class ProductMasterVariantsGenerate(ProductMasterMixin, ModelMutation):
+    productMasters = graphene.List(ProductMaster)
+
+    class Arguments:
+        product_template = graphene.ID(required=True, description='Product template ID')
+        attributes = graphene.List(
+            ProductMasterVariantAttributeInput, required=True,
+            description='Selected values of every attribute of the template')
+
+    class Meta:
+        description = 'Create a product master for every combination of the selected attribute values'
+        model = models.ProductMaster
+
+    @classmethod
+    def clean_attributes_selection(cls, product_template, attributes, errors):
+        """Returns [(template attribute, [attribute values])] ordered like the
+        template attributes, resolved with one query per model"""
+        template_attributes = cls.resolve_global_ids(
+            [attribute['product_template_attribute'] for attribute in attributes],
+            errors, 'product_template_attribute', models.ProductTemplateAttribute)
+        values = cls.resolve_global_ids(
+            [value for attribute in attributes for value in attribute['values'] or []],
+            errors, 'values', models.AttributeValue)
+        if errors:
+            return []
+
+        selection = {}
+        for attribute in attributes:
+            template_attribute = template_attributes[attribute['product_template_attribute']]
+            if template_attribute.product_template_id != product_template.pk:
+                cls.add_error(errors, 'product_template_attribute', 'Attribute not found.')
+                continue
+            attribute_values = selection.setdefault(template_attribute, [])
+            for value_id in attribute['values'] or []:
+                value = values[value_id]
+                if value.attribute_id != template_attribute.attribute_id:
+                    cls.add_error(errors, 'values', 'Attribute value not found.')
+                elif value not in attribute_values:
+                    attribute_values.append(value)
+
+        template_attribute_ids = set(
+            product_template.attributes.values_list('id', flat=True))
+        if not template_attribute_ids:
+            # The product of no attributes is a single empty combination
+            cls.add_error(errors, 'product_template', 'Template has no attributes to generate variants from')
+            return []
+        selected = {template_attribute.pk for template_attribute, values in selection.items() if values}
+        if selected != template_attribute_ids:
+            cls.add_error(errors, 'attributes', 'Provide all the attributes defined for template')
+        return sorted(
+            selection.items(), key=lambda item: (item[0].sort_order is None, item[0].sort_order, item[0].pk))
+
+    @classmethod
+    @permission_required('products')
+    @role_required([UserType.ADMIN.value])
+    def mutate(cls, root, info, product_template, attributes):
+        errors = []
+        product_template = cls.get_node_or_error(
+            info, product_template, errors, 'product_template', ProductTemplate)
+        if errors:
+            return ProductMasterVariantsGenerate(errors=errors)
+        selection = cls.clean_attributes_selection(product_template, attributes, errors)
+        if errors:
+            return ProductMasterVariantsGenerate(errors=errors)
+        count = 1
+        for _, values in selection:
+            count *= len(values)
+        if count > MAX_VARIANTS:
+            cls.add_error(
+                errors, 'attributes', 'At most %s variants can be generated at once.' % MAX_VARIANTS)
+            return ProductMasterVariantsGenerate(errors=errors)
+
+        try:
+            with transaction.atomic():
+                # Concurrent generations of a template would create the same combinations
+                models.ProductTemplate.objects.select_for_update().filter(pk=product_template.pk).exists()
+                masters = cls.save(info, product_template, selection)
+        except DBError as e:
+            cls.add_error(errors, 'db', str(e))
+            return ProductMasterVariantsGenerate(errors=errors)
+        return ProductMasterVariantsGenerate(productMasters=masters, errors=errors)
+
+    @classmethod
+    def save(cls, info, product_template, selection):
+        """Create the combinations which no master of the template has yet,
+        with one insert for the masters and one for their attribute values"""
+        existing = get_attribute_combinations(product_template)
+        combinations = []
+        for values in itertools.product(*[values for _, values in selection]):
+            combination = [
+                (template_attribute, value) for (template_attribute, _), value in zip(selection, values)
+            ]
+            key = frozenset((template_attribute.pk, value.pk) for template_attribute, value in combination)
+            if key not in existing:
+                combinations.append(combination)
+        if not combinations:
+            return []
+
+        codes = master_codes.allocate(len(combinations))
+        masters = []
+        for combination, code in zip(combinations, codes):
+            sub_name = ' / '.join(value.name for _, value in combination)
+            masters.append(models.ProductMaster(
+                code=code, slug=code, barcode=code,
+                product_template=product_template,
+                sub_name=sub_name[:models.ProductMaster._meta.get_field('sub_name').max_length],
+                packing_type=ProductPackingType.SINGLE.value,
+                seo_title=product_template.seo_title,
+                seo_description=product_template.seo_description,
+                seo_keywords=list(product_template.seo_keywords or [])))
+        masters = bulk_create(models.ProductMaster, set_tree_roots(models.ProductMaster, masters))
+        bulk_create(models.ProductMasterAttributeValue, [
+            models.ProductMasterAttributeValue(
+                product_master=master, product_template_attribute=template_attribute,
+                attribute_value=value)
+            for master, combination in zip(masters, combinations)
+            for template_attribute, value in combination
+        ])
+
+        # Bulk writes send no signals
+        master_ids = [master.pk for master in masters]
+        schedule_listing_refresh(master_ids)
+        schedule_autocomplete_update('master', master_ids)
+        schedule_barcode_update(master.barcode for master in masters)
+        return masters
+
+
 class ProductMasterChangeStatus(ModelStatusChangeMutation):
 
     class Arguments:
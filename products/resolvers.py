@@ -1,5 +1,9 @@
+import graphene
 import graphene_django_optimizer as gql_optimizer
+from django.conf import settings
+from django.utils.translation import get_language
 
+from core.utils.db_search import order_by_rank, search_queryset
 from core.utils.utils import (
     filter_by_query_param,
     sort_queryset
@@ -7,6 +11,7 @@ from core.utils.utils import (
 from search.backend.search import  get_product_templates, get_product_masters
 from store_products.filters import prepare_product_pojo_filter
 from . import models
+from .utils.autocomplete import get_autocomplete_index
 from .sorters import (
     TemplateSortField,
     MasterSortField
@@ -17,6 +22,13 @@ ATTRIBUTES_SEARCH_FIELDS = ('name', 'slug')
 GROUP_ATTRIBUTES_SEARCH_FIELDS = ('name', 'slug')
 DEPARTMENTS_SEARCH_FIELDS = ('name', 'slug', 'code')
 BRANDS_SEARCH_FIELDS = ('name', 'slug', 'code')
+AUTOCOMPLETE_TYPES = {
+    'template': 'ProductTemplate',
+    'master': 'ProductMaster',
+    'brand': 'Brand',
+    'category': 'Category',
+}
+AUTOCOMPLETE_LIMIT = 50
 
 def resolve_categories(info, level=None, **kwargs):
     qs = models.Category.objects.prefetch_related('children')
@@ -29,7 +41,7 @@ def resolve_categories(info, level=None, **kwargs):
 def resolve_attributes(info, query=None):
     qs = models.Attribute.objects.all()
     qs = filter_by_query_param(qs, query, ATTRIBUTES_SEARCH_FIELDS)
-    qs = qs.order_by('name')
+    qs = order_by_rank(qs, 'name')
     qs = qs.distinct()
     return gql_optimizer.query(qs, info)
 
@@ -43,7 +55,7 @@ def resolve_group_attributes(info, query=None):
 def resolve_departments(info, query=None):
     qs = models.Department.objects.all()
     qs = filter_by_query_param(qs, query, DEPARTMENTS_SEARCH_FIELDS)
-    qs = qs.order_by('name')
+    qs = order_by_rank(qs, 'name')
     qs = qs.distinct()
     return gql_optimizer.query(qs, info)
 
@@ -53,18 +65,60 @@ def resolve_brands(info, **kwargs):
     qs = qs.distinct()
     return gql_optimizer.query(qs, info)
 
-def resolve_templates(info, **kwargs):
+def sort_catalog_queryset(qs, sort_by, sort_enum):
+    """Order the rows of a database resolved catalog list like its keyset
+    pages, with the pk breaking ties so offset pages are stable"""
+    if sort_by is None and 'search_rank' in qs.query.annotations:
+        return qs
+    qs = sort_queryset(qs, sort_by, sort_enum)
+    return qs.order_by(*qs.query.order_by, 'pk')
+
+def resolve_templates(info, query=None, **kwargs):
+    if settings.DB_SEARCH_ENABLED:
+        # Filtered and paginated by the connection field, so pages can seek
+        # on their sort key and totals and facets see every filtered row
+        qs = models.ProductTemplate.objects.all()
+        if query:
+            qs = search_queryset(qs, query)
+        qs = sort_catalog_queryset(qs, kwargs.get('sort_by'), TemplateSortField)
+        return gql_optimizer.query(qs, info)
+    if query:
+        kwargs.setdefault('filter', {})['search'] = query
     pojo = prepare_product_pojo_filter(**kwargs)
     (qs, count) = get_product_templates(pojo)
     return (gql_optimizer.query(qs, info), count)
 
 def resolve_product_masters(info, **kwargs):
-    pojo = prepare_product_pojo_filter(**kwargs)
-    (qs, count) = get_product_masters(pojo)
-    return (gql_optimizer.query(qs, info), count)
+    count = None
+    if settings.DB_SEARCH_ENABLED:
+        # Filtered on the category, brand and department ids of the listing rows
+        qs = models.ProductMaster.objects.all()
+        qs = sort_catalog_queryset(qs, kwargs.get('sort_by'), MasterSortField)
+    else:
+        pojo = prepare_product_pojo_filter(**kwargs)
+        (qs, count) = get_product_masters(pojo)
+    # Names, sub names and images come from the flattened listing rows, the
+    # template is read for the cursors of pages sorted by its name
+    qs = gql_optimizer.query(qs.select_related('listing', 'product_template'), info)
+    if count is None:
+        return qs
+    return (qs, count)
 
 def resolve_product_template_attributes(info, id):
     qs = models.ProductTemplateAttribute.objects.filter(product_template=id)
     qs = qs.order_by('id')
     qs = qs.distinct()
     return gql_optimizer.query(qs, info)
+
+def resolve_autocomplete(info, query, first=10, kinds=None):
+    index = get_autocomplete_index()
+    results = index.search(
+        query, locale=get_language(), limit=min(first, AUTOCOMPLETE_LIMIT), kinds=kinds)
+    return [
+        {
+            'kind': kind,
+            'id': graphene.Node.to_global_id(AUTOCOMPLETE_TYPES[kind], pk),
+            'label': label
+        }
+        for kind, pk, label in results
+    ]
@@ -48,11 +48,13 @@ from .mutations.products import (
     ProductTemplateCertificationCreate,
     ProductTemplateAttributeCreate,
     ProductMasterListUpdate,
+    ProductMasterVariantsGenerate,
     ProductTemplateManufactureCreate,
     ProductTemplateIncludeCreate,
     ProductTemplateRelatedProductCreate,
     ProductMasterChangeStatus,
-    CheckBarcodeExist
+    CheckBarcodeExist,
+    CheckBarcodesExist
 )
 from .types import (
     Department,
@@ -62,7 +64,8 @@ from .types import (
     AttributeGroup,
     Brand,
     ProductMaster,
-    ProductTemplateAttribute
+    ProductTemplateAttribute,
+    AutocompleteSuggestion
 )
 from .resolvers import (
     resolve_categories,
@@ -72,7 +75,8 @@ from .resolvers import (
     resolve_brands,
     resolve_templates,
     resolve_product_masters,
-    resolve_product_template_attributes
+    resolve_product_template_attributes,
+    resolve_autocomplete
 )
 from .filters import (
     TemplateFilterInput,
@@ -82,7 +86,9 @@ from .filters import (
 )
 from .sorters import (
     TemplateSortInput,
-    MasterSortInput
+    TemplateSortField,
+    MasterSortInput,
+    MasterSortField
 )
 
 class ProductQuery(graphene.ObjectType):
@@ -92,6 +98,14 @@ class ProductQuery(graphene.ObjectType):
             description='List of attributes query'),
         description='List of attributes.')
 
+    autocomplete = graphene.List(
+        AutocompleteSuggestion,
+        query=graphene.String(required=True, description='Text typed so far'),
+        first=graphene.Int(default_value=10, description='Maximum number of suggestions'),
+        kinds=graphene.List(
+            graphene.String, description='Only template, master, brand or category'),
+        description='Suggestions for a search box, matched by word prefix.')
+
     attribute = graphene.Field(
         Attribute, id=graphene.Argument(graphene.ID, required=True),
         description='Lookup a attribute by ID.')
@@ -141,6 +155,8 @@ class ProductQuery(graphene.ObjectType):
         ProductTemplate,
         sort_by=TemplateSortInput(description="Sort products."),
         filter=TemplateFilterInput(description="Filtering options for products."),
+        keyset_sort_enum=TemplateSortField,
+        estimated_count=True,
         description='List of product templates.')
 
     template_attributes = FilterInputConnectionField(
@@ -155,12 +171,16 @@ class ProductQuery(graphene.ObjectType):
         ProductMaster,
         sort_by=MasterSortInput(description="Sort products."),
         filter=MasterFilterInput(description="Filter options for product masters"),
+        keyset_sort_enum=MasterSortField,
+        estimated_count=True,
         description='List of product masters.')
 
 
     def resolve_search_products(self, info,  query=None, **kwargs):
-        kwargs['filter']['search'] = query
-        return resolve_templates(info, kwargs)
+        return resolve_templates(info, query=query, **kwargs)
+
+    def resolve_autocomplete(self, info, query, first=10, kinds=None):
+        return resolve_autocomplete(info, query, first=first, kinds=kinds)
 
     @permission_required('products')
     @role_required([UserType.ADMIN.value])
@@ -279,8 +299,10 @@ class ProductMutations(graphene.ObjectType):
 
     create_product_master = ProductMasterCreate.Field()
     update_product_master = ProductMasterListUpdate.Field()
+    generate_product_master_variants = ProductMasterVariantsGenerate.Field()
     change_product_master_status = ProductMasterChangeStatus.Field()
 
     create_related_products = ProductTemplateRelatedProductCreate.Field()
 
     check_barcode_exist = CheckBarcodeExist.Field()
+    check_barcodes_exist = CheckBarcodesExist.Field()
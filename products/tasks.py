@@ -0,0 +1,18 @@
+from celery import task
+
+from .models import CatalogImport
+from .utils.importer import DEFAULT_CHUNK_SIZE, CatalogImporter
+from .utils.listing import refresh_listings
+
+
+@task
+def import_catalog_file(catalog_import_id, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Runs a catalog import created by the import_catalog command"""
+    catalog_import = CatalogImport.objects.get(pk=catalog_import_id)
+    CatalogImporter(catalog_import, chunk_size).run()
+
+
+@task
+def refresh_master_listings(master_ids):
+    """Rebuilds listing rows of masters changed by a large update"""
+    refresh_listings(master_ids)
@@ -1,3 +1,401 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from types import SimpleNamespace
 
-# Create your tests here.
+import graphene
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.test import RequestFactory, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from graphene_django.registry import get_global_registry
+
+from core.enums.enum import ImportFormat, ImportStatus, Status
+from core.models import SEARCH_CONFIG
+from core.utils.mutations import get_field_value
+from .models import (
+    Brand,
+    CatalogImport,
+    Category,
+    Department,
+    ProductBrandRelation,
+    ProductCategoryRelation,
+    ProductMaster,
+    ProductTemplate,
+    ProductTemplateDescription
+)
+from .mutations.products import ProductTemplateDescriptionCreate
+from .types import FacetedConnection
+from .utils.autocomplete import AutocompleteIndex
+from .utils.barcodes import BarcodeIndex, get_barcode_hash
+from .utils.facets import compute_facets, get_facet_key
+from .utils.importer import CatalogImporter
+from .utils.masters import bulk_save_masters
+
+
+def to_global_id(instance):
+    model_type = get_global_registry().get_type_for_model(type(instance))
+    return graphene.Node.to_global_id(str(model_type), instance.pk)
+
+
+def create_template(code):
+    return ProductTemplate.objects.create(
+        name='Template %s' % code, slug='template-%s' % code, code=code,
+        default_image='', status=Status.ACTIVE.value)
+
+
+class ModelCollectionMutationTest(TestCase):
+
+    def setUp(self):
+        self.info = SimpleNamespace(context=RequestFactory().post('/graphql/'))
+        self.template = create_template('T1')
+        self.other_template = create_template('T2')
+
+    def create_description(self, template, sort_order):
+        return ProductTemplateDescription.objects.create(
+            product_template=template, title='Title %s' % sort_order,
+            description='Description', sort_order=sort_order)
+
+    def mutate(self, input, remove_items=None):
+        return ProductTemplateDescriptionCreate.perform_collection_mutation(
+            self.info, input, remove_items)
+
+    def new_items(self, count, template=None):
+        return [{
+            'title': 'New %s' % index,
+            'description': 'Description',
+            'product_template': to_global_id(template or self.template)
+        } for index in range(count)]
+
+    def test_create_appends_after_existing_sort_order(self):
+        self.create_description(self.template, 4)
+        instances, errors = self.mutate(self.new_items(2))
+        self.assertEqual(errors, [])
+        self.assertEqual([instance.sort_order for instance in instances], [5, 6])
+        self.assertEqual(self.template.descriptions.count(), 3)
+
+    def test_create_keeps_given_sort_order(self):
+        items = self.new_items(1)
+        items[0]['sort_order'] = 9
+        instances, errors = self.mutate(items)
+        self.assertEqual(errors, [])
+        self.assertEqual(instances[0].sort_order, 9)
+
+    def test_update(self):
+        description = self.create_description(self.template, 0)
+        instances, errors = self.mutate([{
+            'id': to_global_id(description),
+            'title': 'Changed',
+            'product_template': to_global_id(self.template)
+        }])
+        self.assertEqual(errors, [])
+        description.refresh_from_db()
+        self.assertEqual(description.title, 'Changed')
+        self.assertEqual(description.sort_order, 0)
+        self.assertEqual(description.history.first().history_type, '~')
+
+    def test_remove(self):
+        description = self.create_description(self.template, 0)
+        _, errors = self.mutate(self.new_items(1), [to_global_id(description)])
+        self.assertEqual(errors, [])
+        self.assertFalse(ProductTemplateDescription.objects.filter(pk=description.pk).exists())
+
+    def test_remove_only(self):
+        descriptions = [self.create_description(self.template, index) for index in range(2)]
+        instances, errors = self.mutate([], [to_global_id(descriptions[0])])
+        self.assertEqual(errors, [])
+        self.assertEqual(instances, [])
+        self.assertEqual(list(self.template.descriptions.all()), [descriptions[1]])
+
+    def test_rows_of_other_parents_are_rejected(self):
+        description = self.create_description(self.other_template, 0)
+        _, errors = self.mutate([{
+            'id': to_global_id(description),
+            'title': 'Changed',
+            'product_template': to_global_id(self.template)
+        }])
+        self.assertEqual([error.field for error in errors], ['id'])
+
+        _, errors = self.mutate(self.new_items(1), [to_global_id(description)])
+        self.assertEqual([error.field for error in errors], ['id'])
+
+        description.refresh_from_db()
+        self.assertEqual(description.title, 'Title 0')
+        self.assertEqual(self.template.descriptions.count(), 0)
+
+    def test_query_count_does_not_grow_with_items(self):
+        counts = []
+        for size in (2, 10):
+            existing = [
+                self.create_description(self.template, index) for index in range(size)]
+            items = self.new_items(size) + [{
+                'id': to_global_id(description),
+                'title': 'Changed %s' % description.pk,
+                'product_template': to_global_id(self.template)
+            } for description in existing[1:]]
+            with CaptureQueriesContext(connection) as queries:
+                _, errors = self.mutate(items, [to_global_id(existing[0])])
+            self.assertEqual(errors, [])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class BulkSaveMastersTest(TestCase):
+
+    def setUp(self):
+        self.template = create_template('T1')
+        self.count = 0
+
+    def new_master(self):
+        self.count += 1
+        return ProductMaster(
+            name='Master %s' % self.count, slug='master-%s' % self.count,
+            code='M%s' % self.count, barcode='B%s' % self.count,
+            product_template=self.template, status=Status.ACTIVE.value)
+
+    def get_original(self, instance):
+        return {
+            field.attname: get_field_value(instance, field)
+            for field in ProductMaster._meta.concrete_fields
+        }
+
+    def search(self, word):
+        return ProductMaster.objects.filter(
+            search_vector=SearchQuery(word, config=SEARCH_CONFIG))
+
+    def test_create(self):
+        masters = [self.new_master() for _ in range(3)]
+        bulk_save_masters([(master, None) for master in masters])
+        saved = ProductMaster.objects.filter(product_template=self.template)
+        self.assertEqual(saved.count(), 3)
+        self.assertEqual(len({master.tree_id for master in saved}), 3)
+        self.assertEqual(ProductMaster.history.filter(history_type='+').count(), 3)
+        self.assertEqual(self.search('master').count(), 3)
+
+    def test_update(self):
+        masters = [self.new_master() for _ in range(2)]
+        bulk_save_masters([(master, None) for master in masters])
+        master = ProductMaster.objects.get(pk=masters[0].pk)
+        original = self.get_original(master)
+        master.name = 'Renamed'
+        bulk_save_masters([(master, original)])
+        master.refresh_from_db()
+        self.assertEqual(master.name, 'Renamed')
+        self.assertEqual(
+            list(master.history.values_list('history_type', flat=True)), ['~', '+'])
+        self.assertEqual(list(self.search('renamed')), [master])
+
+    def test_unchanged_masters_are_not_written(self):
+        master = self.new_master()
+        bulk_save_masters([(master, None)])
+        master = ProductMaster.objects.get(pk=master.pk)
+        with CaptureQueriesContext(connection) as queries:
+            bulk_save_masters([(master, self.get_original(master))])
+        self.assertEqual(len(queries), 0)
+
+    def test_query_count_does_not_grow_with_masters(self):
+        counts = []
+        for size in (2, 10):
+            existing = [self.new_master() for _ in range(size)]
+            bulk_save_masters([(master, None) for master in existing])
+            rows = [(self.new_master(), None) for _ in range(size)]
+            for master in ProductMaster.objects.filter(pk__in=[master.pk for master in existing]):
+                original = self.get_original(master)
+                master.sub_name = 'Changed'
+                rows.append((master, original))
+            with CaptureQueriesContext(connection) as queries:
+                bulk_save_masters(rows)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+
+class FacetsTest(TestCase):
+
+    def setUp(self):
+        self.department = Department.objects.create(
+            name='Fresh', slug='fresh', code='D1', status=Status.ACTIVE.value)
+        self.fruits = Category.objects.create(
+            name='Fruits', slug='fruits', code='C1', department=self.department,
+            default_image='', status=Status.ACTIVE.value)
+        self.vegetables = Category.objects.create(
+            name='Vegetables', slug='vegetables', code='C2', department=self.department,
+            default_image='', status=Status.ACTIVE.value)
+        self.brand = Brand.objects.create(
+            name='Farm', slug='farm', code='B1', status=Status.ACTIVE.value)
+        self.templates = [create_template('T%s' % index) for index in range(3)]
+        for template in self.templates:
+            ProductCategoryRelation.objects.create(product_template=template, category=self.fruits)
+        ProductCategoryRelation.objects.create(
+            product_template=self.templates[0], category=self.vegetables)
+        ProductBrandRelation.objects.create(product_template=self.templates[0], brand=self.brand)
+
+    def counts(self, facets):
+        return {
+            facet: {value['name']: value['count'] for value in values}
+            for facet, values in facets.items()
+        }
+
+    def test_counts_per_facet(self):
+        facets = compute_facets(ProductTemplate.objects.all())
+        self.assertEqual(self.counts(facets), {
+            'categories': {'Fruits': 3, 'Vegetables': 1},
+            'brands': {'Farm': 1},
+            # Templates in two categories of a department count once
+            'departments': {'Fresh': 3},
+        })
+        self.assertEqual([value['name'] for value in facets['categories']], ['Fruits', 'Vegetables'])
+
+    def test_counts_follow_the_filtered_rows(self):
+        queryset = ProductTemplate.objects.filter(pk__in=[template.pk for template in self.templates[1:]])
+        self.assertEqual(self.counts(compute_facets(queryset)), {
+            'categories': {'Fruits': 2}, 'brands': {}, 'departments': {'Fresh': 2}})
+
+    def test_master_counts(self):
+        for index, template in enumerate(self.templates[:2]):
+            for number in range(2):
+                ProductMaster.objects.create(
+                    code='M%s%s' % (index, number), product_template=template,
+                    status=Status.ACTIVE.value)
+        facets = compute_facets(ProductMaster.objects.all())
+        self.assertEqual(self.counts(facets)['categories'], {'Fruits': 4, 'Vegetables': 2})
+
+    def test_deleted_relations_are_not_counted(self):
+        ProductBrandRelation.objects.update(status=Status.DELETED.value)
+        self.vegetables.status = Status.DELETED.value
+        self.vegetables.save()
+        facets = self.counts(compute_facets(ProductTemplate.objects.all()))
+        self.assertEqual(facets['categories'], {'Fruits': 3})
+        self.assertEqual(facets['brands'], {})
+
+    def test_pages_of_the_search_backend_have_no_facets(self):
+        root = SimpleNamespace(queryset=None, args={'item_length': 3})
+        self.assertIsNone(FacetedConnection.resolve_facets(root, None))
+
+    def test_cache_key_ignores_pagination(self):
+        filter = {'categories': ['b', 'a']}
+        key = get_facet_key(ProductTemplate, {'filter': filter, 'first': 10})
+        self.assertEqual(key, get_facet_key(ProductTemplate, {
+            'filter': {'categories': ['a', 'b']}, 'after': 'cursor', 'estimate_count': True}))
+        self.assertNotEqual(key, get_facet_key(ProductTemplate, {'filter': {'categories': ['a']}}))
+
+
+
+
+class AutocompleteIndexTest(TestCase):
+
+    def setUp(self):
+        self.shoe = ProductTemplate.objects.create(
+            name='Red Shoe', slug='red-shoe', code='T1', default_image='',
+            status=Status.ACTIVE.value)
+        self.scarf = ProductTemplate.objects.create(
+            name='Écharpe Rouge', slug='echarpe-rouge', code='T2', default_image='',
+            status=Status.ACTIVE.value)
+        self.brand = Brand.objects.create(
+            name='Shoeco', slug='shoeco', code='B1', default_image='',
+            status=Status.ACTIVE.value)
+
+    def search(self, index, query, **kwargs):
+        return sorted((kind, pk) for kind, pk, _ in index.search(query, **kwargs))
+
+    def test_word_prefixes_match(self):
+        index = AutocompleteIndex.load(1)
+        self.assertEqual(
+            self.search(index, 'SHO'), [('brand', self.brand.pk), ('template', self.shoe.pk)])
+        self.assertEqual(self.search(index, 'rouge'), [('template', self.scarf.pk)])
+        self.assertEqual(self.search(index, 'echarpe r'), [('template', self.scarf.pk)])
+        self.assertEqual(self.search(index, 'sho', kinds=['brand']), [('brand', self.brand.pk)])
+        self.assertEqual(len(index.search('sho', limit=1)), 1)
+        self.assertEqual(index.search(' '), [])
+
+    def test_update_reloads_only_the_changed_rows(self):
+        index = AutocompleteIndex.load(1)
+        ProductTemplate.objects.filter(pk=self.shoe.pk).update(name='Blue Boot')
+        ProductTemplate.objects.filter(pk=self.scarf.pk).update(status=Status.DELETED.value)
+        Brand.objects.filter(pk=self.brand.pk).update(name='Bootco')
+
+        updated = index.update({'template': [self.shoe.pk, self.scarf.pk]}, 2)
+        self.assertEqual(updated.version, 2)
+        self.assertEqual(self.search(updated, 'boot'), [('template', self.shoe.pk)])
+        self.assertEqual(self.search(updated, 'sho'), [('brand', self.brand.pk)])
+        self.assertEqual(self.search(updated, 'rouge'), [])
+        # The old index keeps answering from the rows it was built with
+        self.assertEqual(self.search(index, 'rouge'), [('template', self.scarf.pk)])
+
+class BarcodeIndexTest(TestCase):
+
+    def setUp(self):
+        template = create_template('T1')
+        for index, barcode in enumerate(['100', '200', None, '']):
+            ProductMaster.objects.create(
+                code='M%s' % index, barcode=barcode, product_template=template,
+                status=Status.ACTIVE.value)
+
+    def test_load(self):
+        index = BarcodeIndex.load(1)
+        self.assertEqual((index.version, len(index)), (1, 2))
+        self.assertIn('100', index)
+        self.assertIn('200', index)
+        self.assertNotIn('300', index)
+
+    def test_add_returns_a_new_index(self):
+        index = BarcodeIndex.load(1)
+        added = index.add(3, [[get_barcode_hash('300')], [get_barcode_hash('100'), get_barcode_hash('400')]])
+        self.assertEqual((added.version, len(added)), (3, 4))
+        self.assertIn('300', added)
+        self.assertIn('400', added)
+        self.assertEqual(list(added.hashes), sorted(added.hashes))
+        self.assertNotIn('300', index)
+        self.assertEqual(index.version, 1)
+
+class CatalogImporterTest(TransactionTestCase):
+    # Code sequences are created outside of the test transaction, so the
+    # chunk transactions of the importer are committed for real
+
+    def setUp(self):
+        Category.objects.create(
+            name='Category', slug='category', code='C1', default_image='',
+            status=Status.ACTIVE.value)
+
+    def run_import(self, lines, chunk_size):
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines))
+        catalog_import = CatalogImport.objects.create(
+            file=path, file_format=ImportFormat.JSONL.value)
+        return CatalogImporter(catalog_import, chunk_size=chunk_size).run()
+
+    def get_lines(self):
+        return [
+            json.dumps({'name': 'Alpha', 'categories': ['category'],
+                        'masters': [{'name': 'Alpha master', 'barcode': '100'}]}),
+            # Passes validation but is rejected by the database
+            json.dumps({'name': 'Too long', 'model': 'x' * 65,
+                        'masters': [{'name': 'Too long master'}]}),
+            '{"name": ',
+            json.dumps({'name': 'Missing', 'categories': ['unknown']}),
+            json.dumps({'name': 'Beta', 'categories': ['C1'],
+                        'masters': [{'name': 'Beta master', 'barcode': '200'}]}),
+        ]
+
+    def assert_imported(self, catalog_import):
+        self.assertEqual(catalog_import.status, ImportStatus.COMPLETED.value)
+        self.assertEqual(
+            (catalog_import.processed_rows, catalog_import.imported_rows, catalog_import.failed_rows),
+            (5, 2, 3))
+        self.assertEqual(
+            sorted(catalog_import.errors.values_list('row', 'field')),
+            [(2, 'db'), (3, None), (4, 'categories')])
+        self.assertCountEqual(
+            ProductTemplate.objects.values_list('name', flat=True), ['Alpha', 'Beta'])
+        self.assertCountEqual(
+            ProductMaster.objects.values_list('product_template__name', 'barcode'),
+            [('Alpha', '100'), ('Beta', '200')])
+        self.assertEqual(
+            ProductCategoryRelation.objects.filter(category__slug='category').count(), 2)
+
+    def test_failed_chunk_is_retried_row_by_row(self):
+        self.assert_imported(self.run_import(self.get_lines(), chunk_size=10))
+
+    def test_progress_adds_up_over_chunks(self):
+        self.assert_imported(self.run_import(self.get_lines(), chunk_size=2))
@@ -1,11 +1,12 @@
-from django.db.models import Q
+from django.db.models import Q, QuerySet
 import graphene
 import graphene_django_optimizer as gql_optimizer
 from graphene import relay
 from graphene_federation import key
 
-from core.utils.connection import CountableDjangoObjectType
+from core.utils.connection import CountableConnection, CountableDjangoObjectType
 from core.custom.get_thumbnails import get_thumbnail
+from core.custom.translations import translate
 from core.types.meta import MetadataObjectType
 from refs.types import AttributeType
 from uom.types import UOM
@@ -13,6 +14,68 @@ from store_products.types import StoreProduct
 from core.enums.enum import Status, ProductPackingType
 from store_products import models as store_product_model
 from . import models
+from .dataloaders import (
+    BrandsByTemplateIdLoader,
+    CategoriesByTemplateIdLoader,
+    DepartmentsByTemplateIdLoader,
+    StoreProductByStoreAndMasterIdLoader,
+    UnitByTemplateIdLoader
+)
+from .utils.facets import get_facets
+
+class FacetValue(graphene.ObjectType):
+    id = graphene.ID(description='Global ID of the category, brand or department')
+    name = graphene.String(description='Name of the category, brand or department')
+    count = graphene.Int(description='Number of items of the current selection')
+
+    class Meta:
+        description = 'Represent a facet value and its count'
+
+
+class Facets(graphene.ObjectType):
+    categories = graphene.List(FacetValue, description='Counts per category')
+    brands = graphene.List(FacetValue, description='Counts per brand')
+    departments = graphene.List(FacetValue, description='Counts per department')
+
+    class Meta:
+        description = 'Represent counts of the filtered items per facet'
+
+    @staticmethod
+    def get_values(type_name, values):
+        return [
+            FacetValue(
+                id=graphene.Node.to_global_id(type_name, value['pk']),
+                name=value['name'], count=value['count'])
+            for value in values
+        ]
+
+    def resolve_categories(self, info):
+        return Facets.get_values('Category', self['categories'])
+
+    def resolve_brands(self, info):
+        return Facets.get_values('Brand', self['brands'])
+
+    def resolve_departments(self, info):
+        return Facets.get_values('Department', self['departments'])
+
+
+class FacetedConnection(CountableConnection):
+    class Meta:
+        abstract = True
+
+    facets = graphene.Field(
+        Facets, description=(
+            'Counts of the filtered items per category, brand and department. '
+            'Not available for results paginated by the search backend.'))
+
+    @staticmethod
+    def resolve_facets(root, info):
+        # Only set for the whole filtered list, never for a page of it
+        queryset = getattr(root, 'queryset', None)
+        if not isinstance(queryset, QuerySet):
+            return None
+        return get_facets(queryset, root.args)
+
 
 class ProductTemplateMedia(CountableDjangoObjectType):
     media = graphene.String(
@@ -104,6 +167,12 @@ class Department(CountableDjangoObjectType):
         exclude_fields = []
         model = models.Department
 
+    def resolve_name(self, info):
+        return translate(info, self, 'name')
+
+    def resolve_note(self, info):
+        return translate(info, self, 'note')
+
     def resolve_default_image(self, info, *, size=None):
         return info.context.build_absolute_uri(self.default_image.url)
 
@@ -124,6 +193,12 @@ class Brand(CountableDjangoObjectType):
         exclude_fields = []
         model = models.Brand
 
+    def resolve_name(self, info):
+        return translate(info, self, 'name')
+
+    def resolve_note(self, info):
+        return translate(info, self, 'note')
+
     @gql_optimizer.resolver_hints(prefetch_related='images')
     def resolve_default_image(self, info, *, size=None):
         if not size:
@@ -148,6 +223,12 @@ class Category(CountableDjangoObjectType):
         exclude_fields = []
         model = models.Category
 
+    def resolve_name(self, info):
+        return translate(info, self, 'name')
+
+    def resolve_note(self, info):
+        return translate(info, self, 'note')
+
     @gql_optimizer.resolver_hints(prefetch_related='images')
     def resolve_default_image(self, info, *, size=None):
         return info.context.build_absolute_uri(self.default_image.url)
@@ -236,6 +317,13 @@ class ProductTemplate(CountableDjangoObjectType, MetadataObjectType):
         interfaces = [relay.Node]
         exclude_fields = []
         model = models.ProductTemplate
+        connection_class = FacetedConnection
+
+    def resolve_name(self, info):
+        return translate(info, self, 'name')
+
+    def resolve_description(self, info):
+        return translate(info, self, 'description')
 
     @gql_optimizer.resolver_hints(prefetch_related='images')
     def resolve_default_image(self, info, *, size=None):
@@ -252,8 +340,7 @@ class ProductTemplate(CountableDjangoObjectType, MetadataObjectType):
         return self.attribute_groups.all()
 
     def resolve_departments(self, info):
-        categories = self.categories.values_list('category')
-        return models.Department.objects.filter(categories__pk__in=categories).distinct()
+        return DepartmentsByTemplateIdLoader(info.context).load(self.id)
 
     def resolve_related(self, info):
         return models.ProductTemplateRelatedProduct.objects.filter(Q(product_template=self.id)|Q(related=self.id))
@@ -446,13 +533,17 @@ class ProductMaster(CountableDjangoObjectType):
         interfaces = [relay.Node]
         exclude_fields = []
         model = models.ProductMaster
+        connection_class = FacetedConnection
 
     @gql_optimizer.resolver_hints(prefetch_related='images')
     def resolve_default_image(self, info, *, size=None):
         if not size:
             size = 255
 
-        if self.default_image:
+        listing = self.get_listing()
+        if listing is not None:
+            default_image = listing.image
+        elif self.default_image:
             default_image = self.default_image
         else:
             default_image = self.product_template.default_image
@@ -461,16 +552,29 @@ class ProductMaster(CountableDjangoObjectType):
         return info.context.build_absolute_uri(url)
 
     def resolve_description(self, info):
-        if self.description == '' or not self.description:
-            return self.product_template.description
-        return self.description
+        listing = self.get_listing()
+        if listing is not None:
+            description = listing.description
+        elif self.description == '' or not self.description:
+            description = self.product_template.description
+        else:
+            description = self.description
+        return translate(info, self, 'description', description)
 
     def resolve_name(self, info):
-        if self.name == '' or not self.name:
-            return self.product_template.name
-        return self.name
+        listing = self.get_listing()
+        if listing is not None:
+            name = listing.name
+        elif self.name == '' or not self.name:
+            name = self.product_template.name
+        else:
+            name = self.name
+        return translate(info, self, 'name', name)
 
     def resolve_sub_name(self, info):
+        listing = self.get_listing()
+        if listing is not None:
+            return listing.sub_name
         return self.get_sub_name()
 
     def resolve_self_description(self, info):
@@ -480,31 +584,33 @@ class ProductMaster(CountableDjangoObjectType):
         return self.name
 
     def resolve_departments(self, info):
-        categories = self.product_template.categories.values_list('category', flat=True)
-        return models.Department.objects.filter(categories__pk__in=categories).distinct()
+        if not self.product_template_id:
+            return []
+        return DepartmentsByTemplateIdLoader(info.context).load(self.product_template_id)
 
     def resolve_categories(self, info):
-        categories = self.product_template.categories.values_list('category', flat=True)
-        return models.Category.objects.filter(pk__in=categories).distinct()
+        if not self.product_template_id:
+            return []
+        return CategoriesByTemplateIdLoader(info.context).load(self.product_template_id)
 
     def resolve_pack_items(self, info):
         return self.product_master_pack_items.all()
 
     def resolve_brands(self, info):
-        brands = self.product_template.brands.values_list('brand', flat=True)
-        return models.Brand.objects.filter(pk__in=brands).distinct()
+        if not self.product_template_id:
+            return []
+        return BrandsByTemplateIdLoader(info.context).load(self.product_template_id)
 
     def resolve_unit(self, info):
-        return self.product_template.uom
+        if not self.product_template_id:
+            return None
+        return UnitByTemplateIdLoader(info.context).load(self.product_template_id)
 
     def resolve_store_product(self, info):
-        try:
-            user = info.context.user
-            store = user.get_store()
-            master = store_product_model.StoreProduct.all_objects.get(store=store.id, product_master=self.id)
-        except store_product_model.StoreProduct.DoesNotExist:
+        store = info.context.user.get_store()
+        if not store:
             return None
-        return master
+        return StoreProductByStoreAndMasterIdLoader(info.context).load((store.id, self.id))
 
 
 class ProductTemplateRelatedProduct(CountableDjangoObjectType):
@@ -530,5 +636,19 @@ class Product(CountableDjangoObjectType):
         model = models.Product
 
 
+class AutocompleteSuggestion(graphene.ObjectType):
+    kind = graphene.String(description='Kind of entity: template, master, brand or category')
+    id = graphene.ID(description='Global ID of the entity')
+    label = graphene.String(description='Matched name')
+
+    class Meta:
+        description = 'Represent a search box suggestion'
 
 
+class BarcodeExist(graphene.ObjectType):
+    barcode = graphene.String(description='Checked barcode')
+    exist = graphene.Boolean(description='Is barcode is existing')
+    product_masters = graphene.List(graphene.ID, description='Global IDs of the masters with the barcode')
+
+    class Meta:
+        description = 'Represent the result of a barcode check'
@@ -0,0 +1,239 @@
+import threading
+import time
+import unicodedata
+from bisect import bisect_left
+from functools import partial
+
+from django.conf import settings
+from django.db import transaction
+
+from core.enums.enum import Status
+from core.utils.memcached import bump_version, client, get_version, reset_version
+from ..models import (
+    Brand,
+    BrandTranslation,
+    Category,
+    CategoryTranslation,
+    ProductMaster,
+    ProductMasterTranslation,
+    ProductTemplate,
+    ProductTemplateTranslation
+)
+
+VERSION_KEY = 'autocomplete_version'
+CHANGE_KEY = 'autocomplete_change_%s'
+CHANGE_TIMEOUT = 3600
+# Processes further behind than this rebuild instead of replaying changes
+MAX_CHANGES = 500
+# Seconds between version checks against memcached
+CHECK_INTERVAL = 1
+
+# kind: (model, translation model, translation foreign key)
+KINDS = {
+    'template': (ProductTemplate, ProductTemplateTranslation, 'product_template_id'),
+    'master': (ProductMaster, ProductMasterTranslation, 'product_master_id'),
+    'brand': (Brand, BrandTranslation, 'brand_id'),
+    'category': (Category, CategoryTranslation, 'category_id'),
+}
+MODEL_KINDS = {model: kind for kind, (model, _, _) in KINDS.items()}
+TRANSLATION_KINDS = {
+    translation_model: (kind, field) for kind, (_, translation_model, field) in KINDS.items()
+}
+
+
+def normalize(value):
+    value = unicodedata.normalize('NFKD', value or '')
+    value = ''.join(char for char in value if not unicodedata.combining(char))
+    return ' '.join(value.casefold().split())
+
+
+def get_terms(label):
+    """The label and every suffix of it starting at a word, so a prefix
+    matches the start of any word"""
+    words = normalize(label).split(' ')
+    return {' '.join(words[index:]) for index in range(len(words)) if words[index]}
+
+
+class PrefixShard:
+    """Sorted array of (term, kind, pk) keys of one locale. Matches of a
+    prefix are the contiguous run of keys starting at its bisect position."""
+
+    def __init__(self):
+        self.keys = []
+        self.labels = {}
+
+    def replace(self, items, labels):
+        """New shard without the (kind, pk) `items`, with the
+        {(kind, pk): label} `labels` added, sorted once"""
+        shard = PrefixShard()
+        shard.labels = {item: label for item, label in self.labels.items() if item not in items}
+        shard.keys = [key for key in self.keys if key[1:] not in items]
+        for (kind, pk), label in labels.items():
+            shard.labels[(kind, pk)] = label
+            shard.keys.extend((term, kind, pk) for term in get_terms(label))
+        shard.keys.sort()
+        return shard
+
+    def search(self, prefix, limit, kinds=None, exclude=()):
+        results = []
+        seen = set(exclude)
+        position = bisect_left(self.keys, (prefix,))
+        while position < len(self.keys) and len(results) < limit:
+            term, kind, pk = self.keys[position]
+            if not term.startswith(prefix):
+                break
+            position += 1
+            if (kind, pk) in seen or (kinds and kind not in kinds):
+                continue
+            seen.add((kind, pk))
+            results.append((kind, pk, self.labels[(kind, pk)]))
+        return results
+
+
+class AutocompleteIndex:
+    """In-memory prefix index of active template, master, brand and category
+    names, one shard per locale. Base names live in the LANGUAGE_CODE shard
+    and translations in the shard of their language code.
+    An index is never changed once built, updates return a new index with
+    copies of the changed shards, so searches need no lock."""
+
+    def __init__(self, version=None, shards=None):
+        self.version = version
+        self.checked = time.monotonic()
+        self.shards = shards or {}
+
+    @classmethod
+    def load(cls, version=None):
+        return cls().update({kind: None for kind in KINDS}, version)
+
+    def get_entries(self, kind, pks=None):
+        """(locale, pk, label) of the rows of `pks`, or of every row"""
+        model, translation_model, field = KINDS[kind]
+        rows = model.objects.filter(status=Status.ACTIVE.value)
+        translations = translation_model.objects.all()
+        if pks is not None:
+            rows = rows.filter(pk__in=pks)
+            translations = translations.filter(**{'%s__in' % field: pks})
+
+        active = set()
+        for pk, name in rows.values_list('pk', 'name').iterator():
+            active.add(pk)
+            # Masters without a name are listed through their template
+            if name:
+                yield settings.LANGUAGE_CODE, pk, name
+        translations = translations.values_list(field, 'language_code', 'name')
+        for pk, language_code, name in translations.iterator():
+            if pk in active and name:
+                yield language_code, pk, name
+
+    def update(self, changes, version=None):
+        """New index with the entries of the changed rows reloaded, from
+        {kind: pks} where None stands for every row. Every changed shard is
+        copied and sorted once, however many changes there are."""
+        items, labels = set(), {}
+        for kind, pks in changes.items():
+            if pks is not None:
+                items.update((kind, pk) for pk in pks)
+            for locale, pk, label in self.get_entries(kind, pks):
+                labels.setdefault(locale, {})[(kind, pk)] = label
+
+        shards = dict(self.shards)
+        changed = set(labels)
+        changed.update(
+            locale for locale, shard in shards.items()
+            if any(item in shard.labels for item in items))
+        for locale in changed:
+            shard = shards.get(locale) or PrefixShard()
+            shards[locale] = shard.replace(items, labels.get(locale, {}))
+        return AutocompleteIndex(version, shards)
+
+    def search(self, query, locale=None, limit=10, kinds=None):
+        """(kind, pk, label) of the entries matching `query` as a word
+        prefix, from the shard of `locale` first and then the default one"""
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        results = []
+        shards = self.shards
+        for shard_locale in (locale, settings.LANGUAGE_CODE):
+            shard = shards.get(shard_locale)
+            if shard is None:
+                continue
+            exclude = [(kind, pk) for kind, pk, _ in results]
+            results.extend(shard.search(prefix, limit - len(results), kinds, exclude))
+            if len(results) >= limit:
+                break
+        return results
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_autocomplete_index():
+    """Return the process index, applying the changes other processes
+    published since it was built, or rebuilding it when too far behind.
+    The new index is built without holding the lock, which only guards
+    the swap, so threads keep searching the old index."""
+    global _index
+    index = _index
+    if index is not None and time.monotonic() - index.checked < CHECK_INTERVAL:
+        return index
+    version = get_version(VERSION_KEY)
+    if index is not None and index.version == version:
+        index.checked = time.monotonic()
+        return index
+    changes = None
+    if index is not None and 0 < version - index.version <= MAX_CHANGES:
+        keys = [CHANGE_KEY % number for number in range(index.version + 1, version + 1)]
+        found = client.get_many(keys)
+        if len(found) == len(keys):
+            changes = {}
+            for key in keys:
+                kind, pks = found[key]
+                changes.setdefault(kind, set()).update(pks)
+    if changes is None:
+        index = AutocompleteIndex.load(version)
+    else:
+        index = index.update(changes, version)
+    with _lock:
+        # Versions only grow, keep an index another thread built for a newer one
+        if _index is None or _index.version < version:
+            _index = index
+        return _index
+
+
+def publish_change(kind, pks):
+    version = bump_version(VERSION_KEY)
+    if version is None:
+        # No version yet, every process rebuilds
+        return
+    client.set(CHANGE_KEY % version, [kind, sorted(pks)], CHANGE_TIMEOUT)
+
+
+def schedule_autocomplete_update(kind, pks):
+    """Publish changed rows once the transaction commits, for writes which
+    do not send signals"""
+    pks = list(pks)
+    if pks:
+        transaction.on_commit(partial(publish_change, kind, pks))
+
+
+def invalidate_autocomplete():
+    """Make every process rebuild its index, after large bulk writes"""
+    transaction.on_commit(partial(reset_version, VERSION_KEY))
+
+
+def autocomplete_receiver(sender, instance=None, pks=None, **kwargs):
+    """post_save, post_delete and status_changed receiver of indexed models
+    and their translations"""
+    if sender in TRANSLATION_KINDS:
+        kind, field = TRANSLATION_KINDS[sender]
+        pks = [getattr(instance, field)]
+    else:
+        kind = MODEL_KINDS[sender]
+        pks = [instance.pk] if instance is not None else list(pks or [])
+    schedule_autocomplete_update(kind, pks)
+
+
+AUTOCOMPLETE_SENDERS = tuple(MODEL_KINDS) + tuple(TRANSLATION_KINDS)
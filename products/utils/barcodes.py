@@ -0,0 +1,141 @@
+import hashlib
+import threading
+from array import array
+from bisect import bisect_left
+from functools import partial
+
+from django.db import transaction
+
+from core.utils.memcached import bump_version, client, get_version, reset_version
+from ..models import ProductMaster
+
+VERSION_KEY = 'barcode_index_version'
+CHANGE_KEY = 'barcode_index_change_%s'
+CHANGE_TIMEOUT = 3600
+# Processes further behind than this rebuild instead of replaying changes
+MAX_CHANGES = 500
+# Barcodes per query confirming index hits
+LOOKUP_CHUNK_SIZE = 1000
+
+
+def get_barcode_hash(barcode):
+    """Signed 64 bit hash of a barcode, the index stores only these"""
+    digest = hashlib.blake2b(barcode.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+class BarcodeIndex:
+    """Sorted array of the barcode hashes of product masters, 8 bytes per
+    master. A miss means no master has the barcode. A hit may come from a
+    hash collision or a removed master, so hits are confirmed in the
+    database. Barcodes are never removed from the index, only added, and
+    an index is never changed once built: adding returns a new index which
+    replaces the process index, so lookups need no lock."""
+
+    def __init__(self, version=None, hashes=()):
+        self.version = version
+        self.hashes = array('q', sorted(set(hashes)))
+
+    @classmethod
+    def load(cls, version=None):
+        barcodes = ProductMaster.objects.exclude(barcode__isnull=True).exclude(
+            barcode='').values_list('barcode', flat=True)
+        return cls(version, (get_barcode_hash(barcode) for barcode in barcodes.iterator()))
+
+    def __len__(self):
+        return len(self.hashes)
+
+    def __contains__(self, barcode):
+        hashes = self.hashes
+        value = get_barcode_hash(barcode)
+        position = bisect_left(hashes, value)
+        return position < len(hashes) and hashes[position] == value
+
+    def add(self, version, changes):
+        """New index with the hashes of `changes` merged in"""
+        hashes = set(self.hashes)
+        for values in changes:
+            hashes.update(values)
+        return BarcodeIndex(version, hashes)
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_barcode_index():
+    """Return the process index, adding the barcodes other processes
+    published since it was built, or rebuilding it when too far behind.
+    The new index is built without holding the lock, which only guards
+    the swap, so threads keep answering lookups from the old index."""
+    global _index
+    version = get_version(VERSION_KEY)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    changes = None
+    if index is not None and 0 < version - index.version <= MAX_CHANGES:
+        keys = [CHANGE_KEY % number for number in range(index.version + 1, version + 1)]
+        found = client.get_many(keys)
+        if len(found) == len(keys):
+            changes = [found[key] for key in keys]
+    if changes is None:
+        index = BarcodeIndex.load(version)
+    else:
+        index = index.add(version, changes)
+    with _lock:
+        # Versions only grow, keep an index another thread built for a newer one
+        if _index is None or _index.version < version:
+            _index = index
+        return _index
+
+
+def lookup_barcodes(barcodes):
+    """{barcode: [ids of the masters with it]} of every given barcode.
+    Barcodes missing from the index are answered without a query."""
+    barcodes = {barcode for barcode in barcodes if barcode}
+    index = get_barcode_index()
+    candidates = [barcode for barcode in barcodes if barcode in index]
+    result = {barcode: [] for barcode in barcodes}
+    for start in range(0, len(candidates), LOOKUP_CHUNK_SIZE):
+        masters = ProductMaster.objects.filter(
+            barcode__in=candidates[start:start + LOOKUP_CHUNK_SIZE]).order_by('pk')
+        for barcode, pk in masters.values_list('barcode', 'pk'):
+            result[barcode].append(pk)
+    return result
+
+
+def publish_barcodes(barcodes):
+    hashes = sorted({get_barcode_hash(barcode) for barcode in barcodes if barcode})
+    if not hashes:
+        return
+    version = bump_version(VERSION_KEY)
+    if version is None:
+        # No version yet, every process rebuilds
+        return
+    client.set(CHANGE_KEY % version, hashes, CHANGE_TIMEOUT)
+
+
+def schedule_barcode_update(barcodes):
+    """Add barcodes to the index of every process once the transaction
+    commits, for writes which do not send signals"""
+    barcodes = [barcode for barcode in barcodes if barcode]
+    if barcodes:
+        transaction.on_commit(partial(publish_barcodes, barcodes))
+
+
+def invalidate_barcodes():
+    """Make every process rebuild its index, after large bulk writes"""
+    transaction.on_commit(partial(reset_version, VERSION_KEY))
+
+
+def barcode_receiver(sender, instance=None, pks=None, raw=False, **kwargs):
+    """post_save and status_changed receiver of product masters, restored
+    masters are published again"""
+    if raw:
+        return
+    if instance is not None:
+        schedule_barcode_update([instance.barcode])
+    elif pks:
+        schedule_barcode_update(
+            ProductMaster.all_objects.filter(pk__in=pks).values_list('barcode', flat=True))
@@ -0,0 +1,42 @@
+import zlib
+
+from django.db import connections, router
+
+from core.models import SearchVectorModel
+from core.utils.db_search import update_search_vectors
+
+
+def lock_tree_ids(model):
+    """Serialize tree id allocation of `model` until the transaction ends,
+    concurrent bulk writes would otherwise read the same next tree id"""
+    key = zlib.crc32(('tree_id:%s' % model._meta.db_table).encode('utf-8'))
+    with connections[router.db_for_write(model)].cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
+
+
+def set_tree_roots(model, instances):
+    """Fill the MPTT fields of new instances as separate root nodes, which
+    `bulk_create` does not do. Must run in the transaction inserting them."""
+    opts = model._mptt_meta
+    lock_tree_ids(model)
+    tree_id = model._tree_manager._get_next_tree_id()
+    for instance in instances:
+        setattr(instance, opts.left_attr, 1)
+        setattr(instance, opts.right_attr, 2)
+        setattr(instance, opts.level_attr, 0)
+        setattr(instance, opts.tree_id_attr, tree_id)
+        tree_id += 1
+    return instances
+
+
+def bulk_create(model, instances):
+    """`bulk_create` writing the matching history rows in one insert and
+    the search vectors in one update"""
+    if not instances:
+        return instances
+    instances = model.objects.bulk_create(instances)
+    if hasattr(model, 'history'):
+        model.history.bulk_history_create(instances)
+    if issubclass(model, SearchVectorModel):
+        update_search_vectors(model, [instance.pk for instance in instances])
+    return instances
@@ -0,0 +1,98 @@
+import threading
+from bisect import bisect_right
+from functools import partial
+
+from django.db import transaction
+
+from core.utils.memcached import bump_version, get_version
+
+VERSION_KEY = 'category_tree_version'
+
+
+class CategoryTreeIndex:
+    """Process local snapshot of the category tree.
+    Categories are kept in (tree_id, lft) order, so the descendants of a node
+    are the contiguous slice up to its `rght` value and every lookup is
+    answered without a query."""
+
+    def __init__(self, rows, version=None):
+        self.version = version
+        self.ids = []
+        self.keys = []
+        self.rights = []
+        self.parents = []
+        self.departments = []
+        self.positions = {}
+        for position, (pk, parent_id, left, right, tree_id, department_id) in enumerate(rows):
+            self.ids.append(pk)
+            self.keys.append((tree_id, left))
+            self.rights.append(right)
+            self.parents.append(parent_id)
+            self.departments.append(department_id)
+            self.positions[pk] = position
+
+    @classmethod
+    def load(cls, version=None):
+        from ..models import Category
+
+        rows = Category._tree_manager.order_by('tree_id', 'lft').values_list(
+            'id', 'parent_id', 'lft', 'rght', 'tree_id', 'department_id')
+        return cls(list(rows), version)
+
+    def __contains__(self, pk):
+        return pk in self.positions
+
+    def get_descendants(self, pk, include_self=True):
+        position = self.positions.get(pk)
+        if position is None:
+            return []
+        tree_id = self.keys[position][0]
+        end = bisect_right(self.keys, (tree_id, self.rights[position]), lo=position)
+        start = position if include_self else position + 1
+        return self.ids[start:end]
+
+    def get_ancestors(self, pk, include_self=False):
+        ancestors = []
+        position = self.positions.get(pk)
+        if position is not None and include_self:
+            ancestors.append(pk)
+        while position is not None:
+            parent_id = self.parents[position]
+            if parent_id is None:
+                break
+            ancestors.append(parent_id)
+            position = self.positions.get(parent_id)
+        ancestors.reverse()
+        return ancestors
+
+    def get_department_id(self, pk):
+        """Department of a category, inherited from its closest ancestor"""
+        for category_id in reversed(self.get_ancestors(pk, include_self=True)):
+            department_id = self.departments[self.positions[category_id]]
+            if department_id is not None:
+                return department_id
+        return None
+
+
+_index = None
+_lock = threading.Lock()
+
+
+def get_category_tree():
+    """Return the category tree index, reloaded only when the version in
+    memcached differs from the one it was built with"""
+    global _index
+    version = get_version(VERSION_KEY)
+    index = _index
+    if index is not None and index.version == version:
+        return index
+    with _lock:
+        if _index is None or _index.version != version:
+            _index = CategoryTreeIndex.load(version)
+        return _index
+
+
+def invalidate_category_tree(*args, **kwargs):
+    """Bump the tree version once the transaction commits, every process
+    reloads its index on next use. Usable as a signal receiver."""
+    transaction.on_commit(partial(bump_version, VERSION_KEY))
@@ -0,0 +1,7 @@
+from core.utils.codes import CodeAllocator
+
+brand_codes = CodeAllocator('B', 'products.Brand')
+category_codes = CodeAllocator('C', 'products.Category')
+department_codes = CodeAllocator('D', 'products.Department')
+master_codes = CodeAllocator('M', 'products.ProductMaster')
+template_codes = CodeAllocator('T', 'products.ProductTemplate')
@@ -0,0 +1,109 @@
+import hashlib
+import json
+
+from django.db import connection
+from django.db.models import F
+
+from core.enums.enum import Status
+from core.utils.memcached import client, get_version
+from ..models import (
+    Brand,
+    Category,
+    Department,
+    ProductBrandRelation,
+    ProductCategoryRelation,
+    ProductMaster
+)
+
+TIMEOUT = 600
+VERSION_KEY = 'catalog_facets_version'
+FACETS_KEY = 'facets_%s_%s_%s'
+# Connection arguments which do not change the filtered rows
+PAGINATION_ARGS = (
+    'first', 'last', 'after', 'before', 'offset', 'limit', 'sort_by', 'item_length',
+    'estimate_count')
+
+FACETS_SQL = """
+WITH items AS ({items})
+SELECT 'categories', category.id, category.name, COUNT(DISTINCT items.id)
+FROM items
+JOIN {category_relation} relation ON relation.product_template_id = items.template_id
+JOIN {category} category ON category.id = relation.category_id
+WHERE relation.status <> %s AND category.status <> %s
+GROUP BY category.id, category.name
+UNION ALL
+SELECT 'brands', brand.id, brand.name, COUNT(DISTINCT items.id)
+FROM items
+JOIN {brand_relation} relation ON relation.product_template_id = items.template_id
+JOIN {brand} brand ON brand.id = relation.brand_id
+WHERE relation.status <> %s AND brand.status <> %s
+GROUP BY brand.id, brand.name
+UNION ALL
+SELECT 'departments', department.id, department.name, COUNT(DISTINCT items.id)
+FROM items
+JOIN {category_relation} relation ON relation.product_template_id = items.template_id
+JOIN {category} category ON category.id = relation.category_id
+JOIN {department} department ON department.id = category.department_id
+WHERE relation.status <> %s AND category.status <> %s AND department.status <> %s
+GROUP BY department.id, department.name
+"""
+
+
+def get_facet_key(model, args):
+    """Cache key of the facets of a connection, from its filtering arguments
+    with list values sorted so equal selections share an entry"""
+    def normalize(value):
+        if isinstance(value, dict):
+            return {key: normalize(item) for key, item in value.items()}
+        if isinstance(value, (list, tuple)):
+            return sorted(
+                (normalize(item) for item in value),
+                key=lambda item: json.dumps(item, sort_keys=True, default=str))
+        return value
+
+    selection = {
+        key: normalize(value) for key, value in (args or {}).items()
+        if key not in PAGINATION_ARGS and value not in (None, '', [], {})
+    }
+    digest = hashlib.sha1(
+        json.dumps(selection, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+    return FACETS_KEY % (model._meta.model_name, get_version(VERSION_KEY), digest)
+
+
+def compute_facets(queryset):
+    """Counts of the rows of `queryset` per category, brand and department
+    of their template, with one grouped query over the filtered ids"""
+    if queryset.model is ProductMaster:
+        items = queryset.order_by().values('pk', template_id=F('product_template_id'))
+    else:
+        items = queryset.order_by().values('pk', template_id=F('pk'))
+    items_sql, items_params = items.query.sql_with_params()
+    sql = FACETS_SQL.format(
+        items=items_sql,
+        category_relation=connection.ops.quote_name(ProductCategoryRelation._meta.db_table),
+        brand_relation=connection.ops.quote_name(ProductBrandRelation._meta.db_table),
+        category=connection.ops.quote_name(Category._meta.db_table),
+        brand=connection.ops.quote_name(Brand._meta.db_table),
+        department=connection.ops.quote_name(Department._meta.db_table))
+    deleted = Status.DELETED.value
+    params = list(items_params) + [deleted] * 7
+
+    facets = {'categories': [], 'brands': [], 'departments': []}
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for facet, pk, name, count in cursor.fetchall():
+            facets[facet].append({'pk': pk, 'name': name, 'count': count})
+    for values in facets.values():
+        values.sort(key=lambda value: (-value['count'], value['name'] or ''))
+    return facets
+
+
+def get_facets(queryset, args=None):
+    """Facet counts of a filtered connection, cached per normalized filter
+    until the catalog changes"""
+    key = get_facet_key(queryset.model, args)
+    facets = client.get(key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        client.set(key, facets, TIMEOUT)
+    return facets
@@ -0,0 +1,277 @@
+import random
+from itertools import islice
+
+from django.db import transaction
+
+from core.enums.enum import ProductPackingType, Status
+from refs.models import AttributeType
+from ..models import (
+    Attribute,
+    AttributeValue,
+    Brand,
+    Category,
+    Department,
+    ProductBrandRelation,
+    ProductCategoryRelation,
+    ProductMaster,
+    ProductMasterAttributeValue,
+    ProductMasterMedia,
+    ProductMasterTranslation,
+    ProductTemplate,
+    ProductTemplateAttribute,
+    ProductTemplateMedia,
+    ProductTemplateTranslation
+)
+from .category_tree import invalidate_category_tree
+from .autocomplete import invalidate_autocomplete
+from .barcodes import invalidate_barcodes
+from .bulk import bulk_create, set_tree_roots
+from .codes import (
+    brand_codes,
+    category_codes,
+    department_codes,
+    master_codes,
+    template_codes
+)
+from .listing import schedule_listing_refresh
+
+WORDS = [
+    'fresh', 'organic', 'classic', 'premium', 'daily', 'family', 'natural', 'golden',
+    'crispy', 'smart', 'ultra', 'mini', 'royal', 'green', 'pure', 'spicy', 'sweet',
+    'wireless', 'compact', 'deluxe', 'instant', 'herbal', 'super', 'light'
+]
+NOUNS = [
+    'rice', 'oil', 'tea', 'coffee', 'biscuit', 'soap', 'shampoo', 'juice', 'milk',
+    'flour', 'phone', 'charger', 'speaker', 'kettle', 'towel', 'noodles', 'butter',
+    'honey', 'detergent', 'toothpaste', 'cereal', 'chocolate', 'sauce', 'spread'
+]
+MEDIA_PATH = 'benchmark/product.jpg'
+
+
+class CatalogGenerator:
+    """Builds a synthetic catalog for benchmarks: departments, a category tree
+    per department, brands, attributes with values, and templates with
+    masters, attribute values, translations and media.
+    Every object gets a `bench` slug prefix, rows are written with
+    `bulk_create` in chunks of templates."""
+
+    def __init__(self, departments=5, categories=4, depth=3, brands=50,
+                 attributes=6, values=5, templates=1000, masters=3,
+                 languages=('ar',), media=1, seed=None, chunk_size=500):
+        self.departments = departments
+        self.categories = categories
+        self.depth = depth
+        self.brands = brands
+        self.attributes = attributes
+        self.values = values
+        self.templates = templates
+        self.masters = masters
+        self.languages = list(languages)
+        self.media = media
+        self.chunk_size = chunk_size
+        self.random = random.Random(seed)
+        self.counts = {}
+
+    def run(self):
+        with transaction.atomic():
+            departments = self.create_departments()
+            leaves = self.create_categories(departments)
+            brands = self.create_brands()
+            attributes = self.create_attributes()
+
+        templates = iter(range(self.templates))
+        while True:
+            chunk = list(islice(templates, self.chunk_size))
+            if not chunk:
+                break
+            with transaction.atomic():
+                self.create_templates(len(chunk), leaves, brands, attributes)
+        invalidate_autocomplete()
+        invalidate_barcodes()
+        return self.counts
+
+    def count(self, model, instances):
+        name = model._meta.verbose_name_plural
+        self.counts[name] = self.counts.get(name, 0) + len(instances)
+        return instances
+
+    def name(self):
+        return '%s %s' % (self.random.choice(WORDS), self.random.choice(NOUNS))
+
+    def create_departments(self):
+        codes = department_codes.allocate(self.departments)
+        return self.count(Department, bulk_create(Department, [
+            Department(
+                name='Department %s' % code, slug='bench-%s' % code.lower(),
+                code=code, default_image='', status=Status.ACTIVE.value)
+            for code in codes
+        ]))
+
+    def create_categories(self, departments):
+        """Create `categories` children per node down to `depth` levels for each
+        department and return the leaf categories.
+        Nested set values are computed in memory, one tree per department."""
+        trees = []
+        next_tree_id = Category._tree_manager._get_next_tree_id()
+        for tree_id, department in enumerate(departments, next_tree_id):
+            counter = [0]
+
+            def build(level):
+                node = {'level': level, 'left': counter[0] + 1, 'children': []}
+                counter[0] += 1
+                if level < self.depth - 1:
+                    node['children'] = [build(level + 1) for _ in range(self.categories)]
+                counter[0] += 1
+                node['right'] = counter[0]
+                return node
+
+            trees.append((department, tree_id, build(0)))
+
+        opts = Category._mptt_meta
+        leaves = []
+        level = [(department, tree_id, tree, None) for department, tree_id, tree in trees]
+        while level:
+            codes = category_codes.allocate(len(level))
+            instances = []
+            for (department, tree_id, node, parent), code in zip(level, codes):
+                instance = Category(
+                    name='%s %s' % (self.name().title(), code), slug='bench-%s' % code.lower(),
+                    code=code, parent=parent, department=department,
+                    status=Status.ACTIVE.value)
+                setattr(instance, opts.left_attr, node['left'])
+                setattr(instance, opts.right_attr, node['right'])
+                setattr(instance, opts.level_attr, node['level'])
+                setattr(instance, opts.tree_id_attr, tree_id)
+                instances.append(instance)
+            instances = self.count(Category, bulk_create(Category, instances))
+
+            next_level = []
+            for (department, tree_id, node, _), instance in zip(level, instances):
+                if not node['children']:
+                    leaves.append(instance)
+                for child in node['children']:
+                    next_level.append((department, tree_id, child, instance))
+            level = next_level
+        invalidate_category_tree()
+        return leaves
+
+    def create_brands(self):
+        codes = brand_codes.allocate(self.brands)
+        return self.count(Brand, bulk_create(Brand, [
+            Brand(
+                name='Brand %s' % code, slug='bench-%s' % code.lower(), code=code,
+                status=Status.ACTIVE.value)
+            for code in codes
+        ]))
+
+    def create_attributes(self):
+        attribute_type = AttributeType.objects.first()
+        if attribute_type is None or not self.attributes:
+            return []
+        attributes = self.count(Attribute, bulk_create(Attribute, [
+            Attribute(
+                name='Attribute %s' % index, slug='bench-attribute-%s' % index,
+                attribute_type=attribute_type)
+            for index in range(self.attributes)
+        ]))
+        values = self.count(AttributeValue, bulk_create(AttributeValue, [
+            AttributeValue(
+                attribute=attribute, name='Value %s' % index, value=str(index),
+                slug='bench-value-%s' % index, sort_order=index)
+            for attribute in attributes
+            for index in range(self.values)
+        ]))
+        return [
+            (attribute, [value for value in values if value.attribute_id == attribute.pk])
+            for attribute in attributes
+        ]
+
+    def create_templates(self, count, leaves, brands, attributes):
+        codes = template_codes.allocate(count)
+        templates = []
+        for code in codes:
+            name = self.name()
+            templates.append(ProductTemplate(
+                name=name.title(), slug='bench-%s' % code.lower(), code=code,
+                description='%s from the synthetic catalog' % name, default_image=MEDIA_PATH,
+                status=Status.ACTIVE.value))
+        templates = self.count(ProductTemplate, bulk_create(ProductTemplate, templates))
+
+        category_relations = []
+        brand_relations = []
+        template_attributes = []
+        template_media = []
+        template_translations = []
+        for template in templates:
+            category_relations.append(ProductCategoryRelation(
+                product_template=template, category=self.random.choice(leaves),
+                status=Status.ACTIVE.value))
+            if brands:
+                brand_relations.append(ProductBrandRelation(
+                    product_template=template, brand=self.random.choice(brands),
+                    status=Status.ACTIVE.value))
+            # One template in five is a simple product without variants
+            if attributes and self.random.random() >= 0.2:
+                for attribute, values in self.random.sample(
+                        attributes, min(2, len(attributes))):
+                    template_attributes.append(ProductTemplateAttribute(
+                        product_template=template, attribute=attribute))
+            for index in range(self.media):
+                template_media.append(ProductTemplateMedia(
+                    product_template=template, media=MEDIA_PATH, sort_order=index))
+            for language in self.languages:
+                template_translations.append(ProductTemplateTranslation(
+                    product_template=template, language_code=language,
+                    name='%s %s' % (template.name, template.code),
+                    description=template.description))
+
+        self.count(ProductCategoryRelation, bulk_create(ProductCategoryRelation, category_relations))
+        self.count(ProductBrandRelation, bulk_create(ProductBrandRelation, brand_relations))
+        template_attributes = self.count(
+            ProductTemplateAttribute, bulk_create(ProductTemplateAttribute, template_attributes))
+        self.count(ProductTemplateMedia, bulk_create(ProductTemplateMedia, template_media))
+        self.count(ProductTemplateTranslation, bulk_create(
+            ProductTemplateTranslation, template_translations))
+
+        attributes_by_template = {}
+        for template_attribute in template_attributes:
+            attributes_by_template.setdefault(
+                template_attribute.product_template_id, []).append(template_attribute)
+        values_by_attribute = {attribute.pk: values for attribute, values in attributes}
+
+        master_code_list = iter(master_codes.allocate(count * self.masters))
+        masters = []
+        for template in templates:
+            for index in range(self.masters):
+                code = next(master_code_list)
+                masters.append(ProductMaster(
+                    name='%s %s' % (template.name, index + 1), slug='bench-%s' % code.lower(),
+                    code=code, product_template=template, barcode=code,
+                    weight=self.random.choice([100, 250, 500, 1000]),
+                    packing_type=ProductPackingType.SINGLE.value,
+                    status=Status.ACTIVE.value))
+        masters = self.count(ProductMaster, bulk_create(
+            ProductMaster, set_tree_roots(ProductMaster, masters)))
+        schedule_listing_refresh(master.pk for master in masters)
+
+        master_values = []
+        master_media = []
+        master_translations = []
+        for master in masters:
+            for template_attribute in attributes_by_template.get(master.product_template_id, []):
+                master_values.append(ProductMasterAttributeValue(
+                    product_master=master, product_template_attribute=template_attribute,
+                    attribute_value=self.random.choice(
+                        values_by_attribute[template_attribute.attribute_id])))
+            for index in range(self.media):
+                master_media.append(ProductMasterMedia(
+                    product_master=master, media=MEDIA_PATH, sort_order=index))
+            for language in self.languages:
+                master_translations.append(ProductMasterTranslation(
+                    product_master=master, language_code=language, name=master.name))
+
+        self.count(ProductMasterAttributeValue, bulk_create(
+            ProductMasterAttributeValue, master_values))
+        self.count(ProductMasterMedia, bulk_create(ProductMasterMedia, master_media))
+        self.count(ProductMasterTranslation, bulk_create(
+            ProductMasterTranslation, master_translations))
@@ -0,0 +1,421 @@
+import csv
+import json
+from itertools import islice
+
+from django.db import Error as DBError, transaction
+from django.db.models import F, Q
+from django.template.defaultfilters import slugify
+from django.utils import timezone
+
+from core.enums.enum import ImportFormat, ImportStatus, ProductPackingType, Status
+from ..models import (
+    Attribute,
+    AttributeValue,
+    Brand,
+    CatalogImport,
+    CatalogImportError,
+    Category,
+    ProductBrandRelation,
+    ProductCategoryRelation,
+    ProductMaster,
+    ProductMasterAttributeValue,
+    ProductTemplate,
+    ProductTemplateAttribute
+)
+from .autocomplete import schedule_autocomplete_update
+from .barcodes import schedule_barcode_update
+from .bulk import bulk_create, set_tree_roots
+from .codes import master_codes, template_codes
+from .listing import schedule_listing_refresh
+
+DEFAULT_CHUNK_SIZE = 500
+LIST_SEPARATOR = '|'
+PACKING_TYPES = [packing_type.value for packing_type in ProductPackingType]
+
+
+class RowError(Exception):
+
+    def __init__(self, field, message):
+        super().__init__(message)
+        self.field = field
+        self.message = message
+
+
+def split_list(value):
+    return [item.strip() for item in (value or '').split(LIST_SEPARATOR) if item.strip()]
+
+
+def csv_row_to_template(row):
+    """A CSV row holds one template with a single master, list columns are
+    separated by `|` and attributes are written as `attribute:value`"""
+    attributes = []
+    for item in split_list(row.get('attributes')):
+        attribute, _, value = item.partition(':')
+        attributes.append({'attribute': attribute.strip(), 'value': value.strip()})
+    return {
+        'name': row.get('name'),
+        'model': row.get('model') or None,
+        'description': row.get('description') or None,
+        'categories': split_list(row.get('categories')),
+        'brands': split_list(row.get('brands')),
+        'masters': [{
+            'name': row.get('master_name') or None,
+            'sub_name': row.get('master_sub_name') or None,
+            'model': row.get('master_model') or None,
+            'barcode': row.get('barcode') or None,
+            'weight': row.get('weight') or None,
+            'packing_type': row.get('packing_type') or None,
+            'attributes': attributes
+        }]
+    }
+
+
+# A JSONL row is one template:
+# {"name": "", "model": "", "description": "", "categories": [slug or code],
+#  "brands": [slug or code], "masters": [{"name": "", "sub_name": "",
+#  "model": "", "barcode": "", "weight": 0, "packing_type": "SINGLE",
+#  "attributes": [{"attribute": slug, "value": slug}]}]}
+def read_rows(file, file_format):
+    """Yield (row number, template data, error) for every row of a file"""
+    if file_format == ImportFormat.CSV.value:
+        for number, row in enumerate(csv.DictReader(file), 1):
+            yield number, csv_row_to_template(row), None
+        return
+
+    for number, line in enumerate(file, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as e:
+            yield number, None, RowError(None, 'Invalid JSON: %s' % e)
+            continue
+        if not isinstance(data, dict):
+            yield number, None, RowError(None, 'Row must be a JSON object.')
+            continue
+        yield number, data, None
+
+
+class CatalogImporter:
+    """Imports product templates with their masters, category and brand
+    relations and attribute values from a JSONL or CSV file.
+    The file is streamed in chunks, references of a chunk are resolved with
+    one query per model and every chunk is written with `bulk_create` in its
+    own transaction. Rows failing validation are recorded as
+    `CatalogImportError` and do not stop the import."""
+
+    def __init__(self, catalog_import, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.catalog_import = catalog_import
+        self.chunk_size = chunk_size
+
+    def run(self):
+        catalog_import = self.catalog_import
+        catalog_import.status = ImportStatus.RUNNING.value
+        catalog_import.save(update_fields=['status', 'updated'])
+        try:
+            with open(catalog_import.file, newline='', encoding='utf-8') as file:
+                rows = read_rows(file, catalog_import.file_format)
+                while True:
+                    chunk = list(islice(rows, self.chunk_size))
+                    if not chunk:
+                        break
+                    self.import_chunk(chunk)
+        except Exception as e:
+            CatalogImport.objects.filter(pk=catalog_import.pk).update(
+                status=ImportStatus.FAILED.value, note=str(e), updated=timezone.now())
+            raise
+        CatalogImport.objects.filter(pk=catalog_import.pk).update(
+            status=ImportStatus.COMPLETED.value, updated=timezone.now())
+        catalog_import.refresh_from_db()
+        return catalog_import
+
+    def import_chunk(self, chunk):
+        errors = []
+        rows = []
+        for number, data, error in chunk:
+            if error:
+                errors.append((number, error))
+            else:
+                rows.append((number, data))
+
+        references = self.load_references([data for _, data in rows])
+        cleaned_rows = []
+        for number, data in rows:
+            try:
+                cleaned_rows.append((number, self.clean_row(data, references)))
+            except RowError as e:
+                errors.append((number, e))
+
+        imported = 0
+        if cleaned_rows:
+            try:
+                with transaction.atomic():
+                    self.save([cleaned for _, cleaned in cleaned_rows])
+                imported = len(cleaned_rows)
+            except DBError:
+                imported = self.save_rows(cleaned_rows, errors)
+
+        self.record_progress(len(chunk), imported, errors)
+
+    def save_rows(self, rows, errors):
+        """Save the rows of a failed chunk one by one in savepoints, so only
+        the rows the database rejects are reported"""
+        imported = 0
+        with transaction.atomic():
+            for number, cleaned in rows:
+                try:
+                    with transaction.atomic():
+                        self.save([cleaned])
+                    imported += 1
+                except DBError as e:
+                    errors.append((number, RowError('db', str(e))))
+        return imported
+
+    def load_references(self, rows):
+        """Resolve every category, brand, attribute, slug and barcode used by
+        the rows of a chunk with a single query per model"""
+        category_refs, brand_refs, attribute_slugs, value_slugs = set(), set(), set(), set()
+        master_slugs, barcodes = set(), set()
+        for data in rows:
+            category_refs.update(data.get('categories') or [])
+            brand_refs.update(data.get('brands') or [])
+            for master in data.get('masters') or []:
+                if master.get('name'):
+                    master_slugs.add(slugify(master['name']))
+                if master.get('barcode'):
+                    barcodes.add(master['barcode'])
+                for attribute in master.get('attributes') or []:
+                    attribute_slugs.add(attribute.get('attribute'))
+                    value_slugs.add(attribute.get('value'))
+
+        categories = {}
+        for category in Category.objects.filter(
+                Q(slug__in=category_refs) | Q(code__in=category_refs)):
+            categories[category.slug] = category
+            categories[category.code] = category
+
+        brands = {}
+        for brand in Brand.objects.filter(Q(slug__in=brand_refs) | Q(code__in=brand_refs)):
+            brands[brand.slug] = brand
+            brands[brand.code] = brand
+
+        attributes = {
+            attribute.slug: attribute
+            for attribute in Attribute.objects.filter(slug__in=attribute_slugs)
+        }
+        values = {
+            (value.attribute.slug, value.slug): value
+            for value in AttributeValue.objects.filter(
+                attribute__slug__in=attribute_slugs, slug__in=value_slugs
+            ).select_related('attribute')
+        }
+
+        template_slugs = {
+            self.get_template_slug(data, brands) for data in rows
+        }
+        return {
+            'categories': categories,
+            'brands': brands,
+            'attributes': attributes,
+            'values': values,
+            'template_slugs': set(ProductTemplate.all_objects.filter(
+                slug__in=template_slugs).values_list('slug', flat=True)),
+            'master_slugs': set(ProductMaster.all_objects.filter(
+                slug__in=master_slugs).values_list('slug', flat=True)),
+            'barcodes': set(ProductMaster.objects.filter(
+                barcode__in=barcodes).values_list('barcode', flat=True)),
+        }
+
+    def clean_row(self, data, references):
+        name = (data.get('name') or '').strip()
+        if not name:
+            raise RowError('name', 'This field cannot be blank.')
+
+        categories = []
+        for ref in data.get('categories') or []:
+            category = references['categories'].get(ref)
+            if category is None:
+                raise RowError('categories', 'Category %s not found.' % ref)
+            if category not in categories:
+                categories.append(category)
+
+        brands = []
+        for ref in data.get('brands') or []:
+            brand = references['brands'].get(ref)
+            if brand is None:
+                raise RowError('brands', 'Brand %s not found.' % ref)
+            if brand not in brands:
+                brands.append(brand)
+
+        slug = self.get_template_slug(data, references['brands'])
+        if slug in references['template_slugs']:
+            raise RowError('name', 'Product template already exists with this name.')
+
+        masters = []
+        for master_data in data.get('masters') or []:
+            master = self.clean_master(master_data, references)
+            for field in ['slug', 'barcode']:
+                if master[field] and any(master[field] == item[field] for item in masters):
+                    raise RowError(field, 'Duplicated master %s %s.' % (field, master[field]))
+            masters.append(master)
+
+        # Reserve unique values only once the whole row is valid
+        references['template_slugs'].add(slug)
+        for master in masters:
+            if master['slug']:
+                references['master_slugs'].add(master['slug'])
+            if master['barcode']:
+                references['barcodes'].add(master['barcode'])
+
+        return {
+            'name': name,
+            'slug': slug,
+            'model': data.get('model'),
+            'description': data.get('description'),
+            'categories': categories,
+            'brands': brands,
+            'masters': masters
+        }
+
+    def get_template_slug(self, data, brands):
+        """Template slug as built by the create mutation, prefixed with the
+        slug of the first brand"""
+        slug = slugify(data.get('name') or '')
+        for ref in data.get('brands') or []:
+            brand = brands.get(ref)
+            if brand is not None:
+                return brand.slug + slug
+            break
+        return slug
+
+    def clean_master(self, data, references):
+        name = data.get('name')
+        slug = slugify(name) if name else None
+        if slug and slug in references['master_slugs']:
+            raise RowError('masters', 'Product master already exists with this name.')
+
+        barcode = data.get('barcode')
+        if barcode and barcode in references['barcodes']:
+            raise RowError('barcode', 'Product master already exists with this barcode.')
+
+        packing_type = data.get('packing_type') or ProductPackingType.SINGLE.value
+        if packing_type not in PACKING_TYPES:
+            raise RowError('packing_type', 'Invalid packing type %s.' % packing_type)
+
+        weight = data.get('weight')
+        if weight is not None:
+            try:
+                weight = float(weight)
+            except (TypeError, ValueError):
+                raise RowError('weight', 'Invalid weight %s.' % weight)
+
+        attributes = []
+        for item in data.get('attributes') or []:
+            attribute = references['attributes'].get(item.get('attribute'))
+            if attribute is None:
+                raise RowError('attributes', 'Attribute %s not found.' % item.get('attribute'))
+            value = references['values'].get((attribute.slug, item.get('value')))
+            if value is None:
+                raise RowError('attributes', 'Attribute value %s not found.' % item.get('value'))
+            attributes.append((attribute, value))
+
+        return {
+            'name': name,
+            'sub_name': data.get('sub_name'),
+            'slug': slug,
+            'model': data.get('model'),
+            'barcode': barcode,
+            'weight': weight,
+            'description': data.get('description'),
+            'packing_type': packing_type,
+            'attributes': attributes
+        }
+
+    def save(self, rows):
+        template_code_list = template_codes.allocate(len(rows))
+        master_code_list = master_codes.allocate(
+            sum(len(row['masters']) for row in rows))
+
+        templates = bulk_create(ProductTemplate, [
+            ProductTemplate(
+                name=row['name'],
+                slug=row['slug'],
+                code=code,
+                model=row['model'],
+                description=row['description'],
+                default_image='',
+                status=Status.ACTIVE.value)
+            for row, code in zip(rows, template_code_list)
+        ])
+
+        category_relations = []
+        brand_relations = []
+        template_attributes = {}
+        for row, template in zip(rows, templates):
+            for category in row['categories']:
+                category_relations.append(ProductCategoryRelation(
+                    product_template=template, category=category,
+                    status=Status.ACTIVE.value))
+            for brand in row['brands']:
+                brand_relations.append(ProductBrandRelation(
+                    product_template=template, brand=brand,
+                    status=Status.ACTIVE.value))
+            for master in row['masters']:
+                for attribute, _ in master['attributes']:
+                    key = (template.pk, attribute.pk)
+                    if key not in template_attributes:
+                        template_attributes[key] = ProductTemplateAttribute(
+                            product_template=template, attribute=attribute)
+        bulk_create(ProductCategoryRelation, category_relations)
+        bulk_create(ProductBrandRelation, brand_relations)
+        bulk_create(ProductTemplateAttribute, list(template_attributes.values()))
+
+        masters = []
+        master_rows = []
+        codes = iter(master_code_list)
+        for row, template in zip(rows, templates):
+            for master in row['masters']:
+                code = next(codes)
+                instance = ProductMaster(
+                    name=master['name'],
+                    sub_name=master['sub_name'],
+                    slug=master['slug'] or code,
+                    code=code,
+                    product_template=template,
+                    model=master['model'],
+                    barcode=master['barcode'] or code,
+                    weight=master['weight'],
+                    description=master['description'],
+                    packing_type=master['packing_type'],
+                    status=Status.ACTIVE.value)
+                masters.append(instance)
+                master_rows.append((template, master))
+        masters = bulk_create(ProductMaster, set_tree_roots(ProductMaster, masters))
+        schedule_listing_refresh(instance.pk for instance in masters)
+        schedule_autocomplete_update('template', [template.pk for template in templates])
+        schedule_autocomplete_update('master', [instance.pk for instance in masters])
+        schedule_barcode_update(instance.barcode for instance in masters)
+
+        bulk_create(ProductMasterAttributeValue, [
+            ProductMasterAttributeValue(
+                product_master=instance,
+                product_template_attribute=template_attributes[(template.pk, attribute.pk)],
+                attribute_value=value)
+            for instance, (template, master) in zip(masters, master_rows)
+            for attribute, value in master['attributes']
+        ])
+
+    def record_progress(self, processed, imported, errors):
+        CatalogImportError.objects.bulk_create([
+            CatalogImportError(
+                catalog_import=self.catalog_import,
+                row=number, field=error.field, message=error.message)
+            for number, error in errors
+        ])
+        CatalogImport.objects.filter(pk=self.catalog_import.pk).update(
+            processed_rows=F('processed_rows') + processed,
+            imported_rows=F('imported_rows') + imported,
+            failed_rows=F('failed_rows') + len({number for number, _ in errors}),
+            updated=timezone.now())
+
@@ -0,0 +1,176 @@
+from functools import partial
+
+from django.db import transaction
+
+from core.enums.enum import Status
+from core.utils.db_search import update_search_vectors
+from core.utils.memcached import bump_version
+from core.utils.side_effects import defer_items
+from ..models import (
+    Brand,
+    Category,
+    Department,
+    ProductBrandRelation,
+    ProductCategoryRelation,
+    ProductMaster,
+    ProductMasterListing,
+    ProductPackItem,
+    ProductTemplate
+)
+from .facets import VERSION_KEY as FACETS_VERSION_KEY
+from .packs import refresh_pack_summaries
+
+# Larger refreshes are handed to a celery task after commit
+SYNC_LIMIT = 200
+BATCH_SIZE = 500
+
+
+def build_listings(master_ids):
+    """Listing rows of the given masters, with a fixed number of queries"""
+    masters = list(ProductMaster.all_objects.filter(
+        pk__in=master_ids).select_related('product_template'))
+    template_ids = {master.product_template_id for master in masters if master.product_template_id}
+
+    categories, departments = {}, {}
+    relations = ProductCategoryRelation.objects.filter(
+        product_template_id__in=template_ids
+    ).exclude(
+        category__status=Status.DELETED.value
+    ).values_list(
+        'product_template_id', 'category_id', 'category__department_id',
+        'category__department__status'
+    ).order_by('id')
+    for template_id, category_id, department_id, department_status in relations:
+        categories.setdefault(template_id, []).append(category_id)
+        if department_id and department_status != Status.DELETED.value:
+            template_departments = departments.setdefault(template_id, [])
+            if department_id not in template_departments:
+                template_departments.append(department_id)
+
+    brands = {}
+    relations = ProductBrandRelation.objects.filter(
+        product_template_id__in=template_ids
+    ).exclude(
+        brand__status=Status.DELETED.value
+    ).values_list('product_template_id', 'brand_id').order_by('id')
+    for template_id, brand_id in relations:
+        brands.setdefault(template_id, []).append(brand_id)
+
+    listings = []
+    for master in masters:
+        template = master.product_template
+        name = master.name
+        description = master.description
+        image = master.default_image
+        if template is not None:
+            name = name or template.name
+            description = description or template.description
+            image = image or template.default_image
+        listings.append(ProductMasterListing(
+            product_master_id=master.pk,
+            product_template_id=master.product_template_id,
+            code=master.code,
+            barcode=master.barcode,
+            name=name,
+            sort_name=(name or '').lower(),
+            description=description,
+            sub_name=master.sub_name or master.pack_summary or '',
+            image=image.name if image else None,
+            unit_id=template.uom_id if template is not None else None,
+            category_ids=categories.get(master.product_template_id, []),
+            brand_ids=brands.get(master.product_template_id, []),
+            department_ids=departments.get(master.product_template_id, []),
+            status=master.status,
+            updated=master.updated))
+    return listings
+
+
+@transaction.atomic
+def refresh_listings(master_ids):
+    """Rebuild the pack summaries, search vectors and listing rows of the
+    given masters, rows of masters which no longer exist are removed"""
+    master_ids = list(set(master_ids))
+    for start in range(0, len(master_ids), BATCH_SIZE):
+        batch = master_ids[start:start + BATCH_SIZE]
+        refresh_pack_summaries(batch)
+        update_search_vectors(ProductMaster, batch)
+        listings = build_listings(batch)
+        ProductMasterListing.objects.filter(product_master_id__in=batch).delete()
+        ProductMasterListing.objects.bulk_create(listings, batch_size=BATCH_SIZE)
+    transaction.on_commit(partial(bump_version, FACETS_VERSION_KEY))
+
+
+def flush_listing_refresh(master_ids):
+    if len(master_ids) > SYNC_LIMIT:
+        from ..tasks import refresh_master_listings
+        refresh_master_listings.delay(sorted(master_ids))
+    else:
+        refresh_listings(master_ids)
+
+
+def schedule_listing_refresh(master_ids):
+    """Refresh the listing rows of masters once the current transaction
+    commits. Masters scheduled within one transaction are refreshed together."""
+    defer_items(flush_listing_refresh, master_ids)
+
+
+def get_template_ids(model, pks, instances=()):
+    if model is ProductTemplate:
+        return set(pks)
+    if model in (ProductCategoryRelation, ProductBrandRelation):
+        # Deleted rows are only known from the signal instance
+        template_ids = {instance.product_template_id for instance in instances}
+        template_ids.update(model.all_objects.filter(
+            pk__in=pks).values_list('product_template_id', flat=True))
+        return template_ids
+    if model is Category:
+        relations = ProductCategoryRelation.all_objects.filter(category_id__in=pks)
+    elif model is Department:
+        relations = ProductCategoryRelation.all_objects.filter(category__department_id__in=pks)
+    elif model is Brand:
+        relations = ProductBrandRelation.all_objects.filter(brand_id__in=pks)
+    else:
+        return set()
+    return set(relations.values_list('product_template_id', flat=True))
+
+
+def get_affected_master_ids(model, pks, instances=()):
+    """Masters whose listing rows or pack summaries depend on the given rows
+    of `model`, including the packs those masters are items of"""
+    if model is ProductMaster:
+        master_ids = set(pks)
+    elif model is ProductPackItem:
+        master_ids = {instance.product_master_id for instance in instances}
+        master_ids.update(ProductPackItem.objects.filter(
+            pk__in=pks).values_list('product_master_id', flat=True))
+    else:
+        template_ids = get_template_ids(model, pks, instances)
+        if not template_ids:
+            return set()
+        master_ids = set(ProductMaster.all_objects.filter(
+            product_template_id__in=template_ids).values_list('pk', flat=True))
+    if master_ids:
+        master_ids.update(ProductPackItem.objects.filter(
+            item_id__in=master_ids).values_list('product_master_id', flat=True))
+    return master_ids
+
+
+def refresh_listings_receiver(sender, instance=None, pks=None, **kwargs):
+    """post_save, post_delete and status_changed receiver"""
+    if instance is not None:
+        master_ids = get_affected_master_ids(sender, [instance.pk], [instance])
+    else:
+        master_ids = get_affected_master_ids(sender, pks or [])
+    schedule_listing_refresh(master_ids)
+
+
+LISTING_SENDERS = (
+    ProductMaster,
+    ProductTemplate,
+    ProductCategoryRelation,
+    ProductBrandRelation,
+    ProductPackItem,
+    Category,
+    Department,
+    Brand,
+)
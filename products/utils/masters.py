@@ -0,0 +1,105 @@
+from collections import defaultdict
+
+from django.utils import timezone
+
+from core.enums.enum import Status
+from core.models import bulk_history_update
+from core.utils.db_search import update_search_vectors
+from core.utils.mutations import get_changed_fields
+from ..models import (
+    Product,
+    ProductMaster,
+    ProductMasterAttributeValue,
+    ProductTemplate,
+    ProductTemplateAttribute
+)
+from .bulk import bulk_create, set_tree_roots
+
+
+class MasterBatch:
+    """Rows referenced by a list of product master inputs. Every global ID
+    is resolved before cleaning and the template attributes, attribute
+    values and countries of the masters are loaded with one query each, so
+    the items are validated in memory."""
+
+    def __init__(self, nodes):
+        self.nodes = nodes
+        master_ids = [node.pk for node in nodes.values() if isinstance(node, ProductMaster)]
+        template_ids = [node.pk for node in nodes.values() if isinstance(node, ProductTemplate)]
+
+        self.template_attributes = defaultdict(set)
+        template_attributes = ProductTemplateAttribute.objects.filter(
+            product_template_id__in=template_ids).values_list('product_template_id', 'pk')
+        for template_id, pk in template_attributes:
+            self.template_attributes[template_id].add(pk)
+
+        self.master_attributes = defaultdict(set)
+        master_attributes = ProductMasterAttributeValue.objects.filter(
+            product_master_id__in=master_ids).values_list(
+                'product_master_id', 'product_template_attribute_id')
+        for master_id, template_attribute_id in master_attributes:
+            self.master_attributes[master_id].add(template_attribute_id)
+
+        self.master_countries = defaultdict(set)
+        products = Product.objects.filter(
+            product_master_id__in=master_ids).values_list('product_master_id', 'country_id')
+        for master_id, country_id in products:
+            self.master_countries[master_id].add(country_id)
+
+    def get(self, global_id):
+        if not global_id:
+            return None
+        return self.nodes.get(global_id)
+
+
+def bulk_save_masters(rows):
+    """Save (instance, original values) pairs of product masters. New root
+    masters are inserted with one statement, each in a tree of its own, and
+    changed masters are written with one UPDATE, each with a single batch of
+    history rows and search vector updates. Masters which move in the tree
+    go through save() so the tree is maintained."""
+    opts = ProductMaster._mptt_meta
+    tree_fields = (opts.tree_id_attr, opts.left_attr, opts.right_attr, opts.level_attr)
+    created, updated, update_fields = [], [], set()
+    for instance, original in rows:
+        if original is None:
+            if instance.parent_id is None:
+                created.append(instance)
+            else:
+                instance.save()
+        elif instance.parent_id != original['parent_id']:
+            instance.save()
+        else:
+            changed = [name for name in get_changed_fields(instance, original) if name not in tree_fields]
+            if changed:
+                updated.append(instance)
+                update_fields.update(changed)
+
+    if created:
+        bulk_create(ProductMaster, set_tree_roots(ProductMaster, created))
+
+    if updated:
+        fields = [
+            field for field in ProductMaster._meta.concrete_fields
+            if field.name in update_fields or getattr(field, 'auto_now', False)
+        ]
+        for instance in updated:
+            # Sets auto_now values and stores new uploads
+            for field in fields:
+                setattr(instance, field.attname, field.pre_save(instance, False))
+        ProductMaster.objects.bulk_update(updated, [field.name for field in fields])
+        bulk_history_update(ProductMaster, updated, timezone.now())
+        update_search_vectors(ProductMaster, [instance.pk for instance in updated])
+
+
+def get_attribute_combinations(template):
+    """Attribute value combinations of the masters of a template, as
+    frozensets of (template attribute id, attribute value id)"""
+    combinations = defaultdict(set)
+    values = ProductMasterAttributeValue.objects.filter(
+        product_master__product_template=template).exclude(
+            product_master__status=Status.DELETED.value).values_list(
+            'product_master_id', 'product_template_attribute_id', 'attribute_value_id')
+    for master_id, template_attribute_id, value_id in values:
+        combinations[master_id].add((template_attribute_id, value_id))
+    return {frozenset(combination) for combination in combinations.values()}
@@ -0,0 +1,41 @@
+from core.enums.enum import ProductPackingType
+from ..models import ProductMaster, ProductPackItem
+
+SUMMARY_LENGTH = ProductMaster._meta.get_field('pack_summary').max_length
+
+
+def build_pack_summaries(master_ids):
+    """Pack summaries of the pack and combo masters among `master_ids`,
+    with one query for the masters and one for their items"""
+    pack_ids = list(ProductMaster.all_objects.filter(
+        pk__in=master_ids
+    ).exclude(
+        packing_type=ProductPackingType.SINGLE.value
+    ).values_list('pk', flat=True))
+    items = {pk: [] for pk in pack_ids}
+    if pack_ids:
+        pack_items = ProductPackItem.objects.filter(
+            product_master_id__in=pack_ids
+        ).select_related('item__product_template').order_by('id')
+        for item in pack_items:
+            items[item.product_master_id].append(item)
+    return {
+        pk: ProductMaster.format_pack_items(pack_items)[:SUMMARY_LENGTH]
+        for pk, pack_items in items.items()
+    }
+
+
+def refresh_pack_summaries(master_ids):
+    """Store the pack summaries of the given masters, only changed rows are
+    written"""
+    summaries = build_pack_summaries(master_ids)
+    if not summaries:
+        return 0
+    masters = ProductMaster.all_objects.filter(pk__in=summaries).only('pk', 'pack_summary')
+    changed = []
+    for master in masters:
+        if master.pack_summary != summaries[master.pk]:
+            master.pack_summary = summaries[master.pk]
+            changed.append(master)
+    ProductMaster.all_objects.bulk_update(changed, ['pack_summary'], batch_size=500)
+    return len(changed)
@@ -1,6 +1,9 @@
 from celery import task
 
+from core.custom.thumbnails import can_warm
 from core.custom.utils import create_thumbnails
+from core.tasks import warm_thumbnails
+from core.utils.side_effects import defer_batch
 from ..models import (
     Category,
     CategoryMedia,
@@ -82,3 +85,13 @@ def create_product_master_thumbnails(image_id):
 def create_product_template_addon_thumbnails(id, type):
     create_thumbnails(pk=id, model=type, size_set='image', image_attr='image')
 
+
+def schedule_thumbnails(instance, *image_attrs):
+    """Queue the renditions of image fields of a row. Images scheduled
+    within a transaction are sent as one deduplicated task on commit."""
+    if not can_warm():
+        return
+    defer_batch(warm_thumbnails, [
+        (instance._meta.label, image_attr, getattr(instance, image_attr).name)
+        for image_attr in image_attrs if getattr(instance, image_attr)
+    ])